@@ -0,0 +1,56 @@
+"""seed frequency_limit rule
+
+Revision ID: 3f6a9c1d2b7e
+Revises: 75059ed192e6
+Create Date: 2025-10-02 19:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import datetime
+import json
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a9c1d2b7e'
+down_revision: Union[str, Sequence[str], None] = '75059ed192e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Seed the frequency_limit rule with an empty limit list (limits are edited in config_json)."""
+    conn = op.get_bind()
+    now = datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    # Example limit entries:
+    #   {"code": "15802", "max": 1, "window": "day"}          tumbling: day | week | month | periode
+    #   {"code": "00103", "max": 2, "window": "sliding", "days": 7}
+    config = {"limits": []}
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO rules (code, name, description, category, severity, is_active, config_json, created_at, updated_at)
+            VALUES (:code, :name, :description, :category, :severity, :is_active, :config_json, :created_at, :updated_at)
+            ON CONFLICT(code) DO NOTHING
+            """
+        ),
+        {
+            "code": "frequency_limit",
+            "name": "Code frequency limits",
+            "description": "Limits how many units of a code can be billed per patient per day, week, month, Periode or sliding window.",
+            "category": "logic",
+            "severity": "error",
+            "is_active": True,
+            "config_json": json.dumps(config, ensure_ascii=False),
+            "created_at": now,
+            "updated_at": now,
+        },
+    )
+
+
+def downgrade() -> None:
+    """Remove the frequency_limit rule."""
+    conn = op.get_bind()
+    conn.execute(sa.text("DELETE FROM rules WHERE code = 'frequency_limit'"))
@@ -0,0 +1,33 @@
+"""unique establishment number
+
+Revision ID: 9b2e4f7a1c3d
+Revises: 3f6a9c1d2b7e
+Create Date: 2025-10-06 21:04:52.337190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e4f7a1c3d'
+down_revision: Union[str, Sequence[str], None] = '3f6a9c1d2b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Make establishments.number unique so the bulk importer can upsert on it.
+
+    Fails if the table already holds duplicate numbers; remove them first.
+    """
+    op.drop_index(op.f('ix_establishments_number'), table_name='establishments')
+    op.create_index(op.f('ix_establishments_number'), 'establishments', ['number'], unique=True)
+
+
+def downgrade() -> None:
+    """Back to a non-unique index on establishments.number."""
+    op.drop_index(op.f('ix_establishments_number'), table_name='establishments')
+    op.create_index(op.f('ix_establishments_number'), 'establishments', ['number'], unique=False)
@@ -0,0 +1,44 @@
+"""catalog content hash and sync manifest
+
+Revision ID: c47d1e8b2a90
+Revises: 9b2e4f7a1c3d
+Create Date: 2025-10-08 22:41:17.902614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d1e8b2a90'
+down_revision: Union[str, Sequence[str], None] = '9b2e4f7a1c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('codes', 'contexts', 'establishments')
+
+
+def upgrade() -> None:
+    """Per-row content hashes and a per-file manifest for delta catalog syncs.
+
+    Existing rows start without a hash; the first sync rewrites them once.
+    """
+    for table in CATALOG_TABLES:
+        op.add_column(table, sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.create_table('sync_manifests',
+    sa.Column('catalog', sa.String(length=50), nullable=False),
+    sa.Column('file_sha256', sa.String(length=64), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('synced_at', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('catalog')
+    )
+
+
+def downgrade() -> None:
+    """Drop the sync manifest and content hashes."""
+    op.drop_table('sync_manifests')
+    for table in CATALOG_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('content_hash')
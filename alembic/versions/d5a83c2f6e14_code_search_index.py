@@ -0,0 +1,73 @@
+"""code search index
+
+Revision ID: d5a83c2f6e14
+Revises: c47d1e8b2a90
+Create Date: 2025-10-10 20:15:33.581027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a83c2f6e14'
+down_revision: Union[str, Sequence[str], None] = 'c47d1e8b2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match the expression queried in app/services/code_search.py for the index to be used
+PG_TSVECTOR = (
+    "to_tsvector('french', coalesce(code, '') || ' ' || coalesce(name, '') || ' ' || coalesce(description, ''))"
+)
+
+
+def upgrade() -> None:
+    """Full-text index for GET /codes/search.
+
+    SQLite: FTS5 table over codes (external content) kept in sync by triggers.
+    PostgreSQL: tsvector expression index plus a trigram index on name (pg_trgm).
+    """
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE codes_fts USING fts5("
+            "code, name, description, content='codes', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO codes_fts(codes_fts) VALUES ('rebuild')")
+        op.execute(
+            "CREATE TRIGGER codes_fts_ai AFTER INSERT ON codes BEGIN "
+            "INSERT INTO codes_fts(rowid, code, name, description) VALUES (new.id, new.code, new.name, new.description); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER codes_fts_ad AFTER DELETE ON codes BEGIN "
+            "INSERT INTO codes_fts(codes_fts, rowid, code, name, description) "
+            "VALUES ('delete', old.id, old.code, old.name, old.description); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER codes_fts_au AFTER UPDATE ON codes BEGIN "
+            "INSERT INTO codes_fts(codes_fts, rowid, code, name, description) "
+            "VALUES ('delete', old.id, old.code, old.name, old.description); "
+            "INSERT INTO codes_fts(rowid, code, name, description) VALUES (new.id, new.code, new.name, new.description); "
+            "END"
+        )
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX ix_codes_search_tsv ON codes USING gin ({PG_TSVECTOR})")
+        op.execute("CREATE INDEX ix_codes_name_trgm ON codes USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Drop the code search index."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("codes_fts_ai", "codes_fts_ad", "codes_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS codes_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_codes_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_codes_search_tsv")
@@ -0,0 +1,97 @@
+"""rule set version and change log
+
+Revision ID: e8b41f6d9a27
+Revises: d5a83c2f6e14
+Create Date: 2025-10-12 18:27:09.114863
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b41f6d9a27'
+down_revision: Union[str, Sequence[str], None] = 'd5a83c2f6e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RULE_TABLES = ('rules', 'required_companion_codes')
+OPERATIONS = (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD'))
+
+
+def upgrade() -> None:
+    """Version stamp and change feed for the DB-driven rules (see app/services/rule_versions.py).
+
+    Every inserted, updated or deleted row of rules / required_companion_codes bumps the single
+    rule_set_version row and logs (version, table, row id, operation) in rule_changes, from
+    triggers so that manual edits are tracked too.
+    """
+    op.create_table('rule_set_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.CheckConstraint('id = 1', name='ck_rule_set_version_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('rule_changes',
+    sa.Column('version', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=1), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('version')
+    )
+    op.execute("INSERT INTO rule_set_version (id, version, changed_at) VALUES (1, 0, CURRENT_TIMESTAMP)")
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for table in RULE_TABLES:
+            for event, operation, ref in OPERATIONS:
+                op.execute(
+                    f"CREATE TRIGGER {table}_{operation.lower()}_version AFTER {event} ON {table} BEGIN "
+                    "UPDATE rule_set_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1; "
+                    "INSERT INTO rule_changes (version, table_name, row_id, operation, changed_at) "
+                    f"SELECT version, '{table}', {ref}.id, '{operation}', changed_at FROM rule_set_version WHERE id = 1; "
+                    "END"
+                )
+    elif dialect == "postgresql":
+        # The row lock on rule_set_version serializes concurrent rule writes, keeping versions gapless
+        op.execute(
+            """
+            CREATE FUNCTION record_rule_change() RETURNS trigger AS $$
+            DECLARE
+              v bigint;
+              rid integer;
+            BEGIN
+              UPDATE rule_set_version SET version = version + 1, changed_at = now() WHERE id = 1
+                RETURNING version INTO v;
+              IF TG_OP = 'DELETE' THEN rid := OLD.id; ELSE rid := NEW.id; END IF;
+              INSERT INTO rule_changes (version, table_name, row_id, operation, changed_at)
+                VALUES (v, TG_TABLE_NAME, rid, left(TG_OP, 1), now());
+              RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+        for table in RULE_TABLES:
+            op.execute(
+                f"CREATE TRIGGER {table}_record_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                "FOR EACH ROW EXECUTE FUNCTION record_rule_change()"
+            )
+
+
+def downgrade() -> None:
+    """Drop the rule change triggers, change log and version stamp."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for table in RULE_TABLES:
+            for _, operation, _ in OPERATIONS:
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_{operation.lower()}_version")
+    elif dialect == "postgresql":
+        for table in RULE_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_record_change ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS record_rule_change()")
+    op.drop_table('rule_changes')
+    op.drop_table('rule_set_version')
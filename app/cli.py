@@ -0,0 +1,170 @@
+"""
+Command-line batch validation, for reprocessing archives without going through HTTP.
+
+    python -m app.cli validate data/exports/2025 "archives/*.csv.gz" --workers 8 --output results.jsonl
+
+Each file is parsed and validated in a worker process with the same helpers and rules as
+/ingest. DB-backed rules are loaded once in the parent (or skipped with --no-db).
+One JSON line per file is written as soon as that file is done; throughput stats go to stderr.
+gzip and single-file ZIP archives are decompressed while they are parsed.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from app.routers.ingest import REQUIRED_HEADERS, _read_csv_stream
+from app.validators import (
+    FrequencyLimit,
+    load_frequency_limits,
+    load_required_companion_map,
+    run_all_validations,
+)
+
+# Rules shared by every file, set once per worker process by _init_worker
+_companion_map: Dict[str, Set[str]] = {}
+_frequency_limits: List[FrequencyLimit] = []
+
+# Files picked up when a directory is given
+DIRECTORY_PATTERNS = ("*.csv", "*.csv.gz", "*.zip")
+
+
+def _init_worker(companion_map: Dict[str, Set[str]], frequency_limits: List[FrequencyLimit]) -> None:
+    global _companion_map, _frequency_limits
+    _companion_map = companion_map
+    _frequency_limits = frequency_limits
+
+
+def _collect_files(targets: Sequence[str]) -> List[str]:
+    """
+    Expand directories (recursively, *.csv, *.csv.gz, *.zip) and glob patterns; keep plain
+    paths as given.
+    """
+    files: List[str] = []
+    for target in targets:
+        if os.path.isdir(target):
+            found: List[str] = []
+            for pattern in DIRECTORY_PATTERNS:
+                found.extend(glob.glob(os.path.join(target, "**", pattern), recursive=True))
+            files.extend(sorted(found))
+        elif glob.has_magic(target):
+            files.extend(sorted(glob.glob(target, recursive=True)))
+        else:
+            files.append(target)
+    # Same file listed twice (e.g. dir + glob) is validated once
+    return list(dict.fromkeys(files))
+
+
+def validate_file(path: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    size = 0
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            hint, headers, rows = _read_csv_stream(f)
+        amount_totals: Dict[str, Any] = {}
+        errors = run_all_validations(
+            rows=rows,
+            headers=headers,
+            required_headers=REQUIRED_HEADERS,
+            required_companion_map=_companion_map,
+            amount_totals=amount_totals,
+            frequency_limits=_frequency_limits,
+            source=os.path.basename(path),
+        )
+        return {
+            "file": path,
+            "bytes": size,
+            "delimiter_hint": hint,
+            "row_count": len(rows),
+            "error_count": len(errors),
+            "errors": errors,
+            "amount_totals": {"file": amount_totals.get("file")},
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+    except Exception as exc:
+        return {
+            "file": path,
+            "bytes": size,
+            "row_count": 0,
+            "error": f"{type(exc).__name__}: {exc}",
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+
+
+def _load_db_rules() -> tuple:
+    # Imported here: app.database needs DATABASE_URL, which --no-db runs do not have
+    from app.database import ReadSessionLocal
+
+    with ReadSessionLocal() as db:
+        return dict(load_required_companion_map(db)), load_frequency_limits(db)
+
+
+def cmd_validate(args: argparse.Namespace) -> int:
+    files = _collect_files(args.paths)
+    if not files:
+        print("No files to validate.", file=sys.stderr)
+        return 1
+
+    companion_map, frequency_limits = ({}, []) if args.no_db else _load_db_rules()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+    started = time.perf_counter()
+    total_rows = 0
+    total_bytes = 0
+    failed = 0
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(companion_map, frequency_limits),
+        ) as pool:
+            futures = [pool.submit(validate_file, path) for path in files]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                total_rows += result["row_count"]
+                total_bytes += result["bytes"]
+                failed += "error" in result
+                if not args.quiet:
+                    status = result.get("error") or f"{result['row_count']} rows, {result['error_count']} errors"
+                    print(f"[{done}/{len(files)}] {result['file']}: {status}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Files: {len(files)} ({failed} failed) | Rows: {total_rows} | "
+        f"MB: {total_bytes / 1e6:.1f} | Elapsed: {elapsed:.2f}s | "
+        f"{total_rows / elapsed:,.0f} rows/s | {total_bytes / 1e6 / elapsed:.1f} MB/s",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="DashValidator batch tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    validate = sub.add_parser("validate", help="Validate CSV files offline")
+    validate.add_argument("paths", nargs="+", help="Files, directories (recursive *.csv, *.csv.gz, *.zip) or glob patterns")
+    validate.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    validate.add_argument("--output", default="-", help="JSONL output path (default: stdout)")
+    validate.add_argument("--no-db", action="store_true", help="Skip DB-backed rules (companion codes, frequency limits)")
+    validate.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    validate.set_defaults(func=cmd_validate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
 ﻿import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 
 # Load environment variables from .env in project root
 load_dotenv()
@@ -10,11 +15,109 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not found in environment variables. Ensure it is set in .env")
 
+# Optional replica / read-only URL for read paths (reference tables, rule loading)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def engine_options(url: str, read_only: bool = False) -> Dict[str, Any]:
+    """
+    create_engine() keyword arguments for a URL, from the DB_POOL_* environment variables:
+
+        DB_POOL_SIZE (5)        connections kept open per worker process
+        DB_MAX_OVERFLOW (10)    extra connections allowed during bursts
+        DB_POOL_RECYCLE (1800)  seconds before a connection is replaced (server idle timeouts)
+        DB_POOL_TIMEOUT (30)    seconds to wait for a free connection before failing
+
+    In-memory SQLite gets a single shared connection instead of a pool.
+    """
+    parsed = make_url(url)
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    if parsed.get_backend_name() == "sqlite":
+        # Sessions may be used from threadpool threads other than the one that opened them
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+            return options
+    elif read_only and parsed.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": "-c default_transaction_read_only=on"}
+
+    options.update(
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+    )
+    return options
+
+
+def _apply_sqlite_pragmas(engine: Engine, read_only: bool) -> None:
+    """
+    WAL lets readers run while an import writes; busy_timeout makes writers wait for the lock
+    instead of failing immediately with 'database is locked'.
+    """
+    busy_timeout_ms = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+_engines: Dict[Tuple[str, bool], Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(url: Optional[str] = None, read_only: bool = False) -> Engine:
+    """
+    Process-wide engine registry: one pooled Engine per (URL, read_only), so every router,
+    service and script shares the same connection pool instead of creating its own.
+
+    read_only=True uses DATABASE_READ_URL when set (with read-only sessions enforced);
+    without it, reads share the primary engine.
+    """
+    if read_only and url is None:
+        if DATABASE_READ_URL is None:
+            return get_engine()
+        url = DATABASE_READ_URL
+    url = url or DATABASE_URL
+    key = (url, read_only)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(url, **engine_options(url, read_only))
+            if engine.dialect.name == "sqlite":
+                _apply_sqlite_pragmas(engine, read_only)
+            _engines[key] = engine
+        return engine
+
+
+def dispose_engines() -> None:
+    """
+    Close every pooled connection (e.g. after fork, or at the end of a script).
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+
+
 # Sync SQLAlchemy engine (psycopg2)
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = get_engine()
+read_engine = get_engine(read_only=True)
 
-# Session factory
+# Session factories; use ReadSessionLocal for queries that never write
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for models
 Base = declarative_base()
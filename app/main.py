@@ -1,15 +1,76 @@
-﻿from fastapi import FastAPI, status, Response
-from sqlalchemy import text
+﻿from contextlib import asynccontextmanager
+from fastapi import FastAPI, status, Response
 import time
 
 from app.routes import codes, contexts, establishments
-from app.database import SessionLocal  # corrected path
-from app.routers import metrics
+from app.database import SessionLocal, engine  # corrected path
+from app.routers import metrics, stats
 from app.routers.ingest import router as ingest_router
+from app.routers.uploads import UPLOADS, router as uploads_router
+from app.services.admission import AdmissionController, AdmissionMiddleware
+from app.services.claim_index import get_claim_index
+from app.services.health import HealthProber
+from app.services.rule_cache import RULE_CACHES
+from app.services.profiling import ProfilingMiddleware, profiling_options_from_env
+from app.services.stats import STATS, instrument_engine, label_key
 
 
-app = FastAPI()
+# Background DB probe; /health and /healthz serve its cached result
+prober = HealthProber.from_env(SessionLocal, engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prober.start()
+    UPLOADS.start()
+    yield
+    await UPLOADS.stop()
+    await prober.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Upload admission control (size cap, per-endpoint concurrency, worker memory budget)
+admission = AdmissionController.from_env()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+# Rows of chunked uploads parsed ahead of their finalize count against the same budget
+admission.track(UPLOADS.held_bytes)
+
+# On-demand profiling of single upload requests (only when PROFILING_TOKEN/PROFILING_ENABLED is set)
+profiling_options = profiling_options_from_env()
+if profiling_options:
+    app.add_middleware(ProfilingMiddleware, **profiling_options)
+
+# Stats for the internal scrape endpoint (/internal/stats)
+instrument_engine(engine)
+
+def _admission_gauges():
+    snap = admission.snapshot()
+    values = {
+        label_key(stat="reserved_bytes"): snap["reserved_bytes"],
+        label_key(stat="held_bytes"): snap["held_bytes"],
+    }
+    for endpoint_class, n in snap["in_flight"].items():
+        values[label_key(stat="in_flight", endpoint=endpoint_class)] = n
+    for status_code, n in snap["rejected"].items():
+        values[label_key(stat="rejected", status=str(status_code))] = n
+    return values
+
+def _claim_index_gauges():
+    index = get_claim_index()
+    if index is None:
+        return {}
+    # Share of lookups the Bloom filter could not rule out (lower is better)
+    return {
+        label_key(stat="lookups"): index.lookups,
+        label_key(stat="bloom_passed"): index.bloom_passed,
+    }
+
+STATS.gauge("dash_admission", _admission_gauges, "Upload admission control state.")
+STATS.gauge("dash_claim_index", _claim_index_gauges, "Cross-file duplicate index lookups.")
+STATS.gauge(
+    "dash_rule_cache_age_seconds",
+    lambda: {label_key(cache=name): c.age_seconds() for name, c in RULE_CACHES.items() if c.age_seconds() is not None},
+    "Age of each cached rule set.",
+)
 
 
 # Register routers
@@ -18,6 +79,8 @@ app.include_router(contexts.router)
 app.include_router(establishments.router)
 app.include_router(metrics.router)
 app.include_router(ingest_router)
+app.include_router(uploads_router)
+app.include_router(stats.router)
 
 
 @app.get("/")
@@ -25,44 +88,21 @@ def root():
     return {"message": "API is running"}
 
 @app.get("/health", status_code=status.HTTP_200_OK)
-def health_check():
+async def health_check():
     """
-    Extended health check:
+    Extended health check, answered from the background prober's cache:
     - Confirms app is running
-    - Attempts DB connection and reports latency
+    - Last DB probe (status, latency, age) and recent latency history
+    - Connection pool occupancy and rule cache ages
+    Served on the event loop, so probes never queue behind ingest work for a threadpool slot.
     """
     started = time.perf_counter()
-
-    db_status = "unknown"
-    db_latency_ms = None
-    db_error = None
-
-    try:
-        session = SessionLocal()
-        t0 = time.perf_counter()
-        session.execute(text("SELECT 1"))
-        session.close()
-        db_latency_ms = round((time.perf_counter() - t0) * 1000, 2)
-        db_status = "ok"
-    except Exception as exc:
-        db_status = "error"
-        db_error = str(exc)
-
-    overall = "ok" if db_status == "ok" else "degraded"
-
-    return {
-        "status": overall,
-        "uptime_check": "ok",
-        "db": {
-            "status": db_status,
-            "latency_ms": db_latency_ms,
-            "error": db_error,
-        },
-        "total_latency_ms": round((time.perf_counter() - started) * 1000, 2),
-    }
+    payload = await prober.status_async()
+    payload["total_latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return payload
 
 @app.head("/health", status_code=status.HTTP_200_OK)
-def health_head():
+async def health_head():
     """
     Lightweight health check for load balancers.
     Returns headers only (no JSON body).
@@ -70,8 +110,8 @@ def health_head():
     return Response(status_code=status.HTTP_200_OK)
 
 @app.get("/healthz", status_code=status.HTTP_200_OK)
-def healthz():
+async def healthz():
     """
     Alias to /health for compatibility with common monitoring systems.
     """
-    return health_check()
+    return await health_check()
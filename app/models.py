@@ -1,4 +1,4 @@
-﻿from sqlalchemy import Column, Integer, String, Boolean, Text
+﻿from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, CheckConstraint, DateTime
 from .database import Base
 
 # --- Existing example model (kept) ---
@@ -18,16 +18,18 @@ class Code(Base):
     name = Column(String(200), nullable=False)                           # short label
     description = Column(Text, nullable=True)                            # optional long text
     is_active = Column(Boolean, nullable=False, default=True)
+    content_hash = Column(String(32), nullable=True)                     # set by the catalog sync
 
 class Establishment(Base):
     __tablename__ = "establishments"
 
     id = Column(Integer, primary_key=True, index=True)
-    number = Column(String(20), nullable=False, index=True)              # e.g., "54055"
+    number = Column(String(20), nullable=False, unique=True, index=True) # e.g., "54055"
     name = Column(String(200), nullable=False)
     city = Column(String(100), nullable=True)
     region_code = Column(String(5), nullable=True)                       # e.g., "08"
     is_active = Column(Boolean, nullable=False, default=True)
+    content_hash = Column(String(32), nullable=True)
 
 class Context(Base):
     __tablename__ = "contexts"
@@ -36,3 +38,32 @@ class Context(Base):
     key = Column(String(100), nullable=False, unique=True, index=True)   # e.g., "after_hours"
     value = Column(String(200), nullable=False)                           # e.g., "Y"
     description = Column(Text, nullable=True)
+    content_hash = Column(String(32), nullable=True)
+
+class SyncManifest(Base):
+    """Last synced source file per reference catalog (see scripts/bulk_import.py)."""
+    __tablename__ = "sync_manifests"
+
+    catalog = Column(String(50), primary_key=True)                        # e.g., "codes"
+    file_sha256 = Column(String(64), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    synced_at = Column(String, nullable=False)                            # ISO-8601 UTC
+
+class RuleSetVersion(Base):
+    """Single row (id = 1) bumped by the triggers on rules and required_companion_codes."""
+    __tablename__ = "rule_set_version"
+    __table_args__ = (CheckConstraint("id = 1", name="ck_rule_set_version_single_row"),)
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)                          # +1 per changed row
+    changed_at = Column(DateTime(timezone=True), nullable=True)
+
+class RuleChange(Base):
+    """One row per change to rules / required_companion_codes, keyed by the version it produced."""
+    __tablename__ = "rule_changes"
+
+    version = Column(BigInteger, primary_key=True, autoincrement=False)
+    table_name = Column(String(50), nullable=False)                      # "rules" | "required_companion_codes"
+    row_id = Column(Integer, nullable=False)
+    operation = Column(String(1), nullable=False)                        # I | U | D
+    changed_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,20 +1,69 @@
 # C:\Users\monti\Projects\DashValidator\app\routers\ingest.py
 from __future__ import annotations
 
-from fastapi import APIRouter, File, UploadFile
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Tuple
+from fastapi import APIRouter, File, Header, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterable, List, Dict, Optional, Tuple
+from collections import Counter
 from io import StringIO
+from itertools import islice
+import asyncio
 import csv
+import json
+import os
+import time
 
-from app.database import SessionLocal  # your existing session factory
+from app.services.admission import ReservationRejected, reservation_grower
+from app.services.claim_index import get_claim_index
+from app.services.compressed import (
+    DecompressedSizeError,
+    detect_compression,
+    open_decompressed,
+    open_text,
+    peek_text,
+)
+from app.services.header_rule import validate_headers
+from app.services.precheck import (
+    PRECHECK_DEFAULT_ROWS,
+    PRECHECK_MAX_BYTES,
+    Sample,
+    check_column_types,
+    decode_sample,
+    read_sample,
+    sample_bytes,
+    sniff_column_types,
+)
+from app.services.profiling import diagnostics_allowed
+from app.services.progress import PROGRESS, Progress
+from app.services.rule_cache import RulesUnavailable, load_rule_set
+from app.services.stats import STATS, StageTimer, record_cache
 from app.validators import (
+    amount_parser_for,
     run_all_validations,
-    load_required_companion_map,
+    validate_required_headers,
 )
 
 router = APIRouter(tags=["ingestion"])
 
+# Required headers list (adjust to your canonical headers)
+REQUIRED_HEADERS = [
+    "#","Facture","ID RAMQ","Date de Service","Début","Fin","Periode",
+    "Lieu de pratique","Secteur d'activité","Diagnostic","Code","Unités",
+    "Règle","Élément de contexte","Montant Preliminaire","Montant payé",
+    "Doctor Info"
+]
+
+# Progress streams: rows parsed between counter updates, poll interval, and keepalive period
+_PROGRESS_BATCH_ROWS = 8192
+PROGRESS_INTERVAL_SECONDS = int(os.getenv("PROGRESS_INTERVAL_MS", "500")) / 1000
+_PROGRESS_KEEPALIVE_SECONDS = 15.0
+# How long a stream waits for a client-chosen progress_id whose upload has not started yet
+_PROGRESS_WAIT_SECONDS = 30.0
+
+# Process-pool size for sharded validation of large files (1 = serial)
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "1"))
+
 def _detect_delimiter(sample_text: str) -> Tuple[str, str]:
     """
     Return (delimiter, hint) where delimiter is ',' or ';' and hint is 'comma'/'semicolon'.
@@ -36,64 +85,395 @@ def _read_csv(upload_text: str, delimiter: str) -> Tuple[List[str], List[Dict[st
     - headers: list of column names
     - rows: list of dicts mapping header -> value
     """
-    reader = csv.DictReader(StringIO(upload_text), delimiter=delimiter)
+    return _read_csv_lines(StringIO(upload_text), delimiter)
+
+def _read_csv_lines(
+    lines: Iterable[str],
+    delimiter: str,
+    fieldnames: Optional[List[str]] = None,
+    progress: Optional[Progress] = None,
+    position: Optional[Callable[[], int]] = None,
+) -> Tuple[List[str], List[Dict[str, str]]]:
+    """
+    Like _read_csv over any iterable of lines; with fieldnames, every line is a data row.
+    With progress, rows parsed (and position(), the bytes read) are reported per batch of rows.
+    """
+    reader = csv.DictReader(lines, fieldnames=fieldnames, delimiter=delimiter)
     headers = list(reader.fieldnames or [])
     rows: List[Dict[str, str]] = []
-    for row in reader:
+    while True:
+        before = len(rows)
         # Normalize None to empty string to avoid KeyErrors later
-        rows.append({k: (v if v is not None else "") for k, v in row.items()})
-    return headers, rows
+        rows.extend(
+            {k: (v if v is not None else "") for k, v in row.items()}
+            for row in islice(reader, _PROGRESS_BATCH_ROWS)
+        )
+        if progress is not None:
+            progress.parsed(len(rows), position() if position is not None else None)
+        if len(rows) - before < _PROGRESS_BATCH_ROWS:
+            return headers, rows
 
-@router.post("/ingest", summary="Upload CSV and run validations")
-async def ingest(file: UploadFile = File(...)) -> JSONResponse:
-    try:
-        raw = await file.read()
-        # Decode and trim BOM if present
+def _read_csv_stream(
+    fileobj: BinaryIO, progress: Optional[Progress] = None, on_read: Optional[Callable[[int], None]] = None
+) -> Tuple[str, List[str], List[Dict[str, str]]]:
+    """
+    (delimiter hint, headers, rows) of a possibly gzip/ZIP-compressed file, decompressed and
+    decoded while the CSV is parsed: the decompressed text is never held in memory as a whole.
+    `on_read` gets the decompressed byte count as it grows (see open_decompressed).
+    """
+    stream, _ = open_text(fileobj, on_read=on_read)
+    head, lines = peek_text(stream, 64 * 1024)
+    delimiter, hint = _detect_delimiter(head)
+    headers, rows = _read_csv_lines(lines, delimiter, progress=progress, position=fileobj.tell)
+    return hint, headers, rows
+
+def _read_head(fileobj: BinaryIO, size: int) -> Tuple[bytes, bool]:
+    """
+    First `size` bytes of a possibly compressed file, and whether that is the whole file.
+    """
+    stream, _ = open_decompressed(fileobj)
+    data = stream.read(size)
+    return data, len(data) < size or not stream.read(1)
+
+def _parse_text(
+    raw: bytes, timer: StageTimer, progress: Optional[Progress] = None
+) -> Tuple[str, List[str], List[Dict[str, str]]]:
+    """
+    (delimiter hint, headers, rows) of a plain CSV upload already read into memory.
+    """
+    # Decode and trim BOM if present
+    with timer.stage("decode"):
         text = raw.decode("utf-8-sig", errors="replace")
+        if progress is not None:
+            progress.rows_expected = max(text.count("\n") - 1, 1)
 
-        # Detect delimiter
+    # Detect delimiter
+    with timer.stage("detect_delimiter"):
         delimiter, hint = _detect_delimiter(text)
 
-        # Parse CSV
+    # Parse CSV
+    with timer.stage("parse"):
+        headers, rows = _read_csv_lines(StringIO(text), delimiter, progress=progress)
+    return hint, headers, rows
+
+async def _parse_upload(
+    file: UploadFile,
+    timer: StageTimer,
+    endpoint: str,
+    progress: Optional[Progress] = None,
+    grow: Optional[Callable[[int], None]] = None,
+) -> Tuple[str, List[str], List[Dict[str, str]]]:
+    """
+    (delimiter hint, headers, rows) of an uploaded CSV, plain or gzip/ZIP-compressed.
+    Decoding, decompression and parsing are CPU-bound: they run off the event loop.
+    A compressed upload grows the request's memory reservation (`grow`) as it is inflated.
+    """
+    with timer.stage("read"):
+        magic = await file.read(4)
+        await file.seek(0)
+    if progress is not None:
+        progress.bytes_total = file.size
+    if detect_compression(magic):
+        with timer.stage("decompress_parse"):
+            hint, headers, rows = await run_in_threadpool(_read_csv_stream, file.file, progress, grow)
+        STATS.inc("dash_bytes_ingested_total", file.size or 0, endpoint=endpoint)
+        return hint, headers, rows
+
+    with timer.stage("read"):
+        raw = await file.read()
+    STATS.inc("dash_bytes_ingested_total", len(raw), endpoint=endpoint)
+    if progress is not None:
+        progress.bytes_read = len(raw)
+    return await run_in_threadpool(_parse_text, raw, timer, progress)
+
+def _precheck_payload(sample: Sample, filename: Optional[str], timer: StageTimer) -> Dict[str, Any]:
+    """
+    Header, delimiter, encoding and column-type checks on the start of a file.
+    """
+    with timer.stage("decode"):
+        text, encoding = decode_sample(sample)
+    with timer.stage("detect_delimiter"):
+        delimiter, hint = _detect_delimiter(text)
+    with timer.stage("parse"):
         headers, rows = _read_csv(text, delimiter=delimiter)
 
-        # Prepare required headers list (adjust to your canonical headers)
-        required_headers = [
-            "#","Facture","ID RAMQ","Date de Service","Début","Fin","Periode",
-            "Lieu de pratique","Secteur d'activité","Diagnostic","Code","Unités",
-            "Règle","Élément de contexte","Montant Preliminaire","Montant payé",
-            "Doctor Info"
+    with timer.stage("check"):
+        errors = validate_required_headers(headers, REQUIRED_HEADERS)
+        warnings: List[Dict[str, str]] = []
+        if errors:
+            # Required headers present up to case, surrounding spaces or a BOM: say so
+            tolerant_ok, _ = validate_headers(headers, {"required_headers": REQUIRED_HEADERS})
+            if tolerant_ok:
+                errors[0]["message"] += " (present with different case or surrounding spaces)"
+        if len(headers) <= 1:
+            errors.append({
+                "rule": "delimiter",
+                "message": f"Header row has {len(headers)} column(s) with the detected {hint} delimiter",
+            })
+        if encoding == "cp1252":
+            warnings.append({
+                "rule": "encoding",
+                "message": "File is not UTF-8 (looks like Windows-1252): accented text will be garbled, re-export as UTF-8",
+            })
+        ragged = [
+            n for n, fields in enumerate(csv.reader(StringIO(text), delimiter=delimiter))
+            if n and fields and len(fields) != len(headers)
         ]
+        if ragged:
+            warnings.append({
+                "rule": "column_count",
+                "message": f"{len(ragged)} sampled row(s) do not have {len(headers)} fields (first: row {ragged[0]})",
+            })
+        column_types = sniff_column_types(headers, rows)
+        warnings.extend(check_column_types(column_types, rows))
+
+    return {
+        "filename": filename,
+        "ok": not errors,
+        "complete": sample.complete,
+        "encoding": encoding,
+        "delimiter_hint": hint,
+        "uploaded_headers": headers,
+        "sampled_rows": len(rows),
+        "bytes_read": sample.bytes_read,
+        "column_types": column_types,
+        "errors": errors,
+        "warnings": warnings,
+    }
+
+def _precheck_response(payload: Dict[str, Any], timer: StageTimer, timings: bool) -> JSONResponse:
+    if timings:
+        payload["meta"] = {"timings_ms": timer.as_meta()}
+    response = JSONResponse(status_code=200, content=payload)
+    timer.finish()
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+def _validation_response(
+    filename: Optional[str],
+    hint: str,
+    headers: List[str],
+    rows: List[Dict[str, str]],
+    timer: StageTimer,
+    timings: bool,
+    endpoint: str,
+    progress: Optional[Progress] = None,
+    record_claims: bool = False,
+) -> JSONResponse:
+    """
+    Validate parsed rows with the DB-driven rules and build the /ingest response.
+    With progress, validation steps are counted as they finish and the job is marked done.
+    With record_claims, the file's lines are recorded for cross-file duplicate detection.
+    """
+    timer.rows = len(rows)
+    STATS.inc("dash_rows_processed_total", len(rows), endpoint=endpoint)
 
-        # Open DB session and load DB-driven rules
-        with SessionLocal() as db:
-            companion_map = load_required_companion_map(db)
+    # DB-driven rules: shared snapshot file, else cached per worker (RULE_CACHE_TTL), else the
+    # local last-known-good snapshot while the DB is down
+    # Imported here: the CSV helpers of this module are also used by the CLI without a DB
+    from app.database import ReadSessionLocal
 
-        # Run all validators
+    with timer.stage("load_rules"):
+        rule_set = load_rule_set(ReadSessionLocal)
+
+    # Run all validators
+    with timer.stage("validate"):
+        amount_totals: Dict[str, Any] = {}
+        parser = amount_parser_for(rows)
+        claim_index = get_claim_index()
         errors = run_all_validations(
             rows=rows,
             headers=headers,
-            required_headers=required_headers,
-            required_companion_map=companion_map,
+            required_headers=REQUIRED_HEADERS,
+            required_companion_map=rule_set.companion_map,
             facture_field="Facture",
             doctor_field="Doctor Info",
             code_field="Code",
+            claim_index=claim_index,
+            source=filename or "upload",
+            record_claims=record_claims,
+            amount_totals=amount_totals,
+            frequency_limits=rule_set.frequency_limits,
+            workers=VALIDATION_WORKERS,
+            parser=parser,
+            progress=progress,
         )
+    for rule, count in Counter(e.get("rule", "unknown") for e in errors).items():
+        STATS.inc("dash_validation_errors_total", count, rule=rule)
+    record_cache("amount_parser", parser.hits, parser.misses)
 
-        payload = {
-            "filename": file.filename,
-            "delimiter_hint": hint,
-            "uploaded_headers": headers,
-            "row_count": len(rows),
-            "errors": errors,
-        }
-        return JSONResponse(status_code=200, content=payload)
+    payload = {
+        "filename": filename,
+        "delimiter_hint": hint,
+        "uploaded_headers": headers,
+        "row_count": len(rows),
+        "rules": {"source": rule_set.source, "version": rule_set.version},
+        "errors": errors,
+        # Per-invoice totals stay server-side: they can be as long as the file itself
+        "amount_totals": {
+            "file": amount_totals.get("file"),
+            "by_doctor": amount_totals.get("by_doctor"),
+        },
+    }
+    meta: Dict[str, Any] = {}
+    if timings:
+        meta["timings_ms"] = timer.as_meta()
+    if timer.track_memory:
+        meta["memory"] = timer.memory_meta()
+    if meta:
+        payload["meta"] = meta
+    with timer.stage("encode"):
+        response = JSONResponse(status_code=200, content=payload)
+    timer.finish()
+    response.headers["Server-Timing"] = timer.server_timing()
+    if progress is not None:
+        progress.finish(200, len(errors))
+    return response
 
+@router.post("/ingest/precheck", summary="Check the header row and a sample of a CSV before uploading it")
+async def precheck(
+    request: Request,
+    sample_rows: int = Query(PRECHECK_DEFAULT_ROWS, ge=1, le=10_000, description="Data rows to sample after the header"),
+    timings: bool = Query(False, description="Include per-stage timings (ms) in the response meta"),
+) -> JSONResponse:
+    """
+    Reads the request body (raw CSV or multipart/form-data with a file part) only up to the
+    header row and `sample_rows` rows, at most PRECHECK_MAX_BYTES, and answers without
+    receiving the rest.
+    """
+    timer = StageTimer("precheck")
+    try:
+        with timer.stage("read"):
+            sample = await read_sample(
+                request.stream(), request.headers.get("content-type", ""), sample_rows + 1, PRECHECK_MAX_BYTES
+            )
+        STATS.inc("dash_bytes_ingested_total", sample.bytes_read, endpoint="precheck")
+        filename = sample.filename or request.headers.get("x-filename")
+        return _precheck_response(_precheck_payload(sample, filename, timer), timer, timings)
     except Exception as exc:
+        return JSONResponse(status_code=400, content={"error": f"{type(exc).__name__}: {exc}"})
+    finally:
+        timer.close()
+
+def _error_response(
+    status_code: int,
+    filename: Optional[str],
+    error: str,
+    progress: Optional[Progress],
+    headers: Optional[Dict[str, str]] = None,
+) -> JSONResponse:
+    if progress is not None:
+        progress.finish(status_code)
+    return JSONResponse(status_code=status_code, content={"filename": filename, "error": error}, headers=headers)
+
+@router.post("/ingest", summary="Upload CSV and run validations")
+async def ingest(
+    request: Request,
+    file: UploadFile = File(...),
+    timings: bool = Query(False, description="Include per-stage timings (ms) in the response meta"),
+    memory: bool = Query(
+        False, description="Track peak memory per stage (slows the whole worker; needs X-Profiling-Token)"
+    ),
+    precheck: bool = Query(False, description="Only check the header row and a sample (see /ingest/precheck)"),
+    sample_rows: int = Query(PRECHECK_DEFAULT_ROWS, ge=1, le=10_000, description="Data rows sampled with precheck"),
+    accept: bool = Query(
+        False, description="The export is being billed: record its lines for cross-file duplicate detection"
+    ),
+    progress_id: Optional[str] = Query(
+        None, description="Job id to follow at /ingest/progress/{progress_id} (8-64 of A-Z a-z 0-9 _ -)"
+    ),
+    profiling_token: Optional[str] = Header(None, alias="X-Profiling-Token"),
+) -> JSONResponse:
+    if memory and not diagnostics_allowed(profiling_token):
         return JSONResponse(
-            status_code=400,
-            content={
-                "filename": getattr(file, "filename", None),
-                "error": f"{type(exc).__name__}: {exc}",
-            },
+            status_code=403, content={"error": "memory=true requires profiling to be enabled (X-Profiling-Token)."}
         )
+    timer = StageTimer("ingest", track_memory=memory)
+    progress: Optional[Progress] = None
+    filename = getattr(file, "filename", None)
+    try:
+        if precheck:
+            # The framework has already received the upload: only the start of it is read back
+            with timer.stage("read"):
+                head, complete = await run_in_threadpool(_read_head, file.file, PRECHECK_MAX_BYTES)
+            sample = sample_bytes(head, sample_rows + 1, complete)
+            return _precheck_response(_precheck_payload(sample, file.filename, timer), timer, timings)
+
+        if progress_id is not None:
+            progress = PROGRESS.start("ingest", progress_id)
+        hint, headers, rows = await _parse_upload(file, timer, "ingest", progress, reservation_grower(request.state))
+        # Validation runs off the event loop so progress streams keep being served meanwhile
+        response = await run_in_threadpool(
+            _validation_response, file.filename, hint, headers, rows, timer, timings, "ingest", progress, accept
+        )
+        if progress is not None:
+            response.headers["X-Progress-Id"] = progress.id
+        return response
+
+    except DecompressedSizeError as exc:
+        return _error_response(413, filename, str(exc), progress)
+    except ReservationRejected as exc:
+        headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+        return _error_response(exc.status_code, filename, exc.reason, progress, headers)
+    except RulesUnavailable as exc:
+        return _error_response(503, filename, str(exc), progress)
+    except Exception as exc:
+        return _error_response(400, filename, f"{type(exc).__name__}: {exc}", progress)
+    finally:
+        timer.close()
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _progress_events(request: Request, job_id: str) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one job: `progress` whenever its counters changed since the last
+    poll, `done` with the final state, and a comment line now and then to keep proxies open.
+    """
+    yield f"retry: {int(PROGRESS_INTERVAL_SECONDS * 1000)}\n\n"
+    deadline = time.monotonic() + _PROGRESS_WAIT_SECONDS
+    progress = PROGRESS.get(job_id)
+    while progress is None:
+        # The client may open the stream before sending the file under this progress_id
+        if time.monotonic() > deadline or await request.is_disconnected():
+            yield _sse("error", {"job_id": job_id, "error": f"Unknown job: {job_id}"})
+            return
+        await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+        progress = PROGRESS.get(job_id)
+
+    last: Optional[Dict[str, Any]] = None
+    last_sent = time.monotonic()
+    while True:
+        snapshot = progress.snapshot()
+        if progress.finished_at is not None:
+            yield _sse("done", snapshot)
+            return
+        # Elapsed time and ETA alone do not make a new event
+        counters = {k: v for k, v in snapshot.items() if k not in ("elapsed_s", "eta_s")}
+        if counters != last:
+            last = counters
+            last_sent = time.monotonic()
+            yield _sse("progress", snapshot)
+        elif time.monotonic() - last_sent > _PROGRESS_KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+        if await request.is_disconnected():
+            return
+
+@router.get("/ingest/progress/{job_id}", summary="Live progress of an /ingest request or chunked upload (SSE)")
+async def ingest_progress(request: Request, job_id: str) -> StreamingResponse:
+    """
+    text/event-stream of bytes read, rows parsed, validation steps done, errors so far,
+    percent and ETA. Pass the same id as progress_id to /ingest (or use a chunked upload's
+    upload_id); the stream may be opened before the upload starts. Any worker can serve it
+    when all workers share PROGRESS_DIR; with PROGRESS_DIR empty, only the worker running the
+    job knows it (run a single worker or route by job id).
+    """
+    if not PROGRESS.valid_id(job_id):
+        return JSONResponse(status_code=400, content={"error": f"Invalid job id: {job_id}"})
+    return StreamingResponse(
+        _progress_events(request, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,22 @@
 # C:\Users\monti\Projects\DashValidator\app\routers\metrics.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from typing import BinaryIO, Callable, Dict, Any, List, Optional
 from datetime import datetime
 import csv
 import io
 
+from app.services.admission import ReservationRejected, reservation_grower
+from app.services.compressed import (
+    CORRUPT_ARCHIVE_ERRORS,
+    DecompressedSizeError,
+    detect_compression,
+    open_text,
+    peek_text,
+)
+from app.services.profiling import diagnostics_allowed
+from app.services.stats import STATS, StageTimer
+
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 # Exact French headers
@@ -67,7 +79,15 @@ def _parse_date_to_yyyy_mm_dd(s: str) -> Optional[str]:
     return None
 
 @router.post("/unique-patients-by-day")
-async def unique_patients_by_day(file: UploadFile = File(...)) -> Dict[str, Any]:
+async def unique_patients_by_day(
+    request: Request,
+    file: UploadFile = File(...),
+    timings: bool = Query(False, description="Include per-stage timings (ms) in the response meta"),
+    memory: bool = Query(
+        False, description="Track peak memory per stage (slows the whole worker; needs X-Profiling-Token)"
+    ),
+    profiling_token: Optional[str] = Header(None, alias="X-Profiling-Token"),
+) -> Dict[str, Any]:
     """
     Upload a CSV (multipart/form-data, field 'file') that includes:
       - 'Date de Service' (date)
@@ -75,22 +95,69 @@ async def unique_patients_by_day(file: UploadFile = File(...)) -> Dict[str, Any]
     Returns per-day unique patient counts and meta info.
     Supports both comma- and semicolon-separated CSVs.
     """
+    if memory and not diagnostics_allowed(profiling_token):
+        raise HTTPException(status_code=403, detail="memory=true requires profiling to be enabled (X-Profiling-Token).")
+    timer = StageTimer("unique_patients_by_day", track_memory=memory)
     try:
-        raw = await file.read()
-    except Exception as e:
+        try:
+            with timer.stage("read"):
+                magic = await file.read(4)
+                await file.seek(0)
+                compressed = detect_compression(magic) is not None
+                raw = b"" if compressed else await file.read()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read upload: {e}")
+        STATS.inc("dash_bytes_ingested_total", file.size if compressed else len(raw), endpoint="unique_patients_by_day")
+
+        # Decompression, decoding and aggregation are CPU-bound: they run off the event loop
+        return await run_in_threadpool(
+            _count_unique_patients,
+            file.file if compressed else None,
+            raw,
+            timer,
+            timings,
+            reservation_grower(request.state),
+        )
+    except DecompressedSizeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ReservationRejected as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers=headers)
+    except CORRUPT_ARCHIVE_ERRORS as e:
         raise HTTPException(status_code=400, detail=f"Could not read upload: {e}")
-
-    text = _decode_bytes(raw)
+    finally:
+        timer.close()
+
+def _count_unique_patients(
+    compressed_file: Optional[BinaryIO],
+    raw: bytes,
+    timer: StageTimer,
+    timings: bool,
+    grow: Optional[Callable[[int], None]],
+) -> Dict[str, Any]:
+    """
+    Response of unique_patients_by_day for a plain upload read into `raw`, or a gzip/ZIP
+    upload streamed from `compressed_file` (growing the memory reservation as it inflates).
+    """
+    with timer.stage("decode"):
+        if compressed_file is not None:
+            # gzip / ZIP: decompressed and decoded (UTF-8) line by line while aggregating
+            stream, _ = open_text(compressed_file, on_read=grow)
+            head, lines = peek_text(stream, 2048)
+        else:
+            head = _decode_bytes(raw)
+            lines = io.StringIO(head)
 
     # Detect delimiter (explicitly test comma and semicolon). Fallback to ';'
-    sample = text[:2048]
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=[",", ";"])
-        delim = getattr(dialect, "delimiter", ";") or ";"
-    except csv.Error:
-        delim = ";"
+    with timer.stage("detect_delimiter"):
+        sample = head[:2048]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=[",", ";"])
+            delim = getattr(dialect, "delimiter", ";") or ";"
+        except csv.Error:
+            delim = ";"
 
-    reader = csv.DictReader(io.StringIO(text), delimiter=delim)
+    reader = csv.DictReader(lines, delimiter=delim)
     if not reader.fieldnames:
         raise HTTPException(status_code=400, detail="CSV appears to have no header row.")
 
@@ -108,23 +175,27 @@ async def unique_patients_by_day(file: UploadFile = File(...)) -> Dict[str, Any]
     rows_skipped = 0
     warnings: List[str] = []
 
-    for row in reader:
-        rows_total += 1
+    with timer.stage("parse_aggregate"):
+        for row in reader:
+            rows_total += 1
 
-        date_raw = (row.get(date_col) or "").strip()
-        patient_raw = (row.get(patient_col) or "").strip()
+            date_raw = (row.get(date_col) or "").strip()
+            patient_raw = (row.get(patient_col) or "").strip()
 
-        date_norm = _parse_date_to_yyyy_mm_dd(date_raw)
-        patient_key = patient_raw  # Patient-only dedup key (as requested)
+            date_norm = _parse_date_to_yyyy_mm_dd(date_raw)
+            patient_key = patient_raw  # Patient-only dedup key (as requested)
 
-        if not date_norm or not patient_key:
-            rows_skipped += 1
-            continue
+            if not date_norm or not patient_key:
+                rows_skipped += 1
+                continue
 
-        if date_norm not in totals:
-            totals[date_norm] = set()
-        totals[date_norm].add(patient_key)
-        rows_used += 1
+            if date_norm not in totals:
+                totals[date_norm] = set()
+            totals[date_norm].add(patient_key)
+            rows_used += 1
+    timer.rows = rows_total
+
+    STATS.inc("dash_rows_processed_total", rows_total, endpoint="unique_patients_by_day")
 
     results = [
         {"date": d, "unique_patients": len(pids)}
@@ -138,13 +209,19 @@ async def unique_patients_by_day(file: UploadFile = File(...)) -> Dict[str, Any]
     if delim == ";" and ";" not in sample and "," in sample:
         warnings.append("Delimiter detection fell back to ';'. Check source file formatting if results look off.")
 
+    meta: Dict[str, Any] = {
+        "rows_total": rows_total,
+        "rows_used": rows_used,
+        "rows_skipped": rows_skipped,
+        "delimiter": delim,
+        "warnings": warnings,
+    }
+    timer.finish()
+    if timings:
+        meta["timings_ms"] = timer.as_meta()
+    if timer.track_memory:
+        meta["memory"] = timer.memory_meta()
     return {
         "results": results,
-        "meta": {
-            "rows_total": rows_total,
-            "rows_used": rows_used,
-            "rows_skipped": rows_skipped,
-            "delimiter": delim,
-            "warnings": warnings,
-        },
+        "meta": meta,
     }
@@ -0,0 +1,16 @@
+# C:\Users\monti\Projects\DashValidator\app\routers\stats.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.stats import STATS
+
+# Internal scrape endpoint; kept off the public /metrics prefix (that one is business metrics)
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+@router.get("/stats", response_class=PlainTextResponse, summary="Prometheus-format process stats")
+def stats() -> PlainTextResponse:
+    """
+    Stage histograms, rows/bytes processed, errors per rule, DB pool and cache stats
+    for this worker process, in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(STATS.render_prometheus(), media_type="text/plain; version=0.0.4")
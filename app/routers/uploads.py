@@ -0,0 +1,333 @@
+# C:\Users\monti\Projects\DashValidator\app\routers\uploads.py
+from __future__ import annotations
+
+import codecs
+import csv
+import time
+import zlib
+from io import StringIO
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Body, Header, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app.routers.ingest import _detect_delimiter, _read_csv_lines, _validation_response
+from app.services.admission import ReservationRejected, reservation_grower
+from app.services.chunked_upload import (
+    UPLOAD_CHUNK_MAX_BYTES,
+    UPLOAD_DIR,
+    ChunkRejected,
+    ChunkedUpload,
+    UploadConflict,
+    UploadNotFound,
+    UploadStore,
+)
+from app.services.compressed import MAX_DECOMPRESSED_BYTES, DecompressedSizeError, detect_compression
+from app.services.progress import PROGRESS, Progress, PublishedProgress
+from app.services.rule_cache import RulesUnavailable
+from app.services.stats import STATS, StageTimer
+
+# Under /ingest so profiling covers uploads; admission control gives chunks their own
+# "upload" class and counts finalize (which runs the validators) as "ingest"
+router = APIRouter(prefix="/ingest/uploads", tags=["ingestion"])
+
+# Most decompressed bytes produced per zlib call, so one chunk cannot expand unchecked
+_INFLATE_STEP = 8 * 1024 * 1024
+
+
+class CsvChunkParser:
+    """
+    Parses an upload while its chunks arrive: gunzips (optional), decodes like /ingest
+    (UTF-8, BOM trimmed, undecodable bytes replaced) and turns every complete CSV record into
+    a row. A record is complete at a newline outside quotes; the rest waits for the next chunk.
+    `on_read`, when set, gets decompressed_bytes as it grows (and may raise to stop).
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._gunzip: Optional[Any] = None
+        self._started = False
+        self._pending = ""
+        self.decompressed_bytes = 0         # CSV bytes fed so far, after gunzip
+        self.on_read: Optional[Callable[[int], None]] = None
+        self.delimiter: Optional[str] = None
+        self.hint = "comma"
+        self.headers: Optional[List[str]] = None
+        self.rows: List[Dict[str, str]] = []
+        self.parse_seconds = 0.0
+
+    def feed(self, data: bytes) -> None:
+        started = time.perf_counter()
+        if not self._started:
+            self._started = True
+            compression = detect_compression(data[:4])
+            if compression == "zip":
+                raise ValueError("ZIP archives cannot be uploaded in chunks: send a gzip or plain CSV.")
+            if compression == "gzip":
+                self._gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gunzip is None:
+            self.decompressed_bytes += len(data)
+            if self.on_read is not None:
+                self.on_read(self.decompressed_bytes)
+            self._consume(self._decoder.decode(data))
+        else:
+            while data:
+                out = self._gunzip.decompress(data, _INFLATE_STEP)
+                self.decompressed_bytes += len(out)
+                if self.decompressed_bytes > MAX_DECOMPRESSED_BYTES:
+                    raise DecompressedSizeError(
+                        f"Decompressed upload exceeds {MAX_DECOMPRESSED_BYTES / (1024 * 1024):g} MB."
+                    )
+                if self.on_read is not None:
+                    self.on_read(self.decompressed_bytes)
+                self._consume(self._decoder.decode(out))
+                data = self._gunzip.unconsumed_tail
+        self.parse_seconds += time.perf_counter() - started
+
+    def close(self) -> None:
+        """
+        End of file: parse the last record (which may lack a trailing newline).
+        """
+        started = time.perf_counter()
+        if self._gunzip is not None and not self._gunzip.eof:
+            raise ValueError("gzip stream is truncated.")
+        self._pending += self._decoder.decode(b"", final=True)
+        if self._pending:
+            self._parse(self._pending)
+            self._pending = ""
+        if self.headers is None:
+            self.headers = []
+        self.parse_seconds += time.perf_counter() - started
+
+    def _consume(self, text: str) -> None:
+        text = self._pending + text
+        end = text.rfind("\n")
+        # Back up to a newline outside quoted fields (those may contain newlines)
+        while end >= 0 and text.count('"', 0, end) % 2:
+            end = text.rfind("\n", 0, end)
+        if end < 0:
+            self._pending = text
+            return
+        self._pending = text[end + 1:]
+        self._parse(text[:end + 1])
+
+    def _parse(self, text: str) -> None:
+        if self.headers is None:
+            self.delimiter, self.hint = _detect_delimiter(text)
+            self.headers, rows = _read_csv_lines(StringIO(text), self.delimiter)
+        else:
+            _, rows = _read_csv_lines(StringIO(text), self.delimiter, fieldnames=self.headers)
+        self.rows.extend(rows)
+
+
+UPLOADS = UploadStore(UPLOAD_DIR, CsvChunkParser)
+
+
+def _get_upload(upload_id: str) -> ChunkedUpload:
+    try:
+        return UPLOADS.get(upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown upload: {upload_id}")
+
+
+def _gone(upload_id: str) -> HTTPException:
+    # Finalized by another worker, or expired: forget this worker's copy
+    UPLOADS.discard(upload_id)
+    return HTTPException(status_code=404, detail=f"Unknown upload: {upload_id}")
+
+
+def _upload_progress(upload: ChunkedUpload) -> Progress:
+    """
+    Progress of an upload (streamed at /ingest/progress/{upload_id}), brought up to date with
+    what the parser has consumed. Re-registered if this process did not create the upload,
+    keeping the size announced to the worker that did.
+    """
+    progress = PROGRESS.get(upload.id)
+    if not isinstance(progress, Progress) or progress.finished_at is not None:
+        published = progress.snapshot() if isinstance(progress, PublishedProgress) else {}
+        progress = PROGRESS.start("upload", upload.id)
+        progress.bytes_total = published.get("bytes_total")
+    parser: CsvChunkParser = upload.consumer
+    progress.parsed(len(parser.rows), upload.bytes_consumed)
+    return progress
+
+
+@router.post("", status_code=201, summary="Start a chunked, resumable upload")
+def create_upload(
+    filename: Optional[str] = Body(None, embed=True),
+    size: Optional[int] = Body(None, embed=True, ge=0, description="File size in bytes, for progress percent and ETA"),
+) -> Dict[str, Any]:
+    """
+    Returns an upload_id. Then PUT the file's chunks (numbered from 1, in any order, retried
+    as needed) and POST .../finalize for the /ingest results. Progress can be followed at
+    /ingest/progress/{upload_id}.
+    """
+    upload = UPLOADS.create(filename)
+    PROGRESS.start("upload", upload.id).bytes_total = size
+    return {**upload.status(), "max_chunk_bytes": UPLOAD_CHUNK_MAX_BYTES}
+
+
+async def _read_chunk(request: Request) -> bytes:
+    """
+    Body of a chunk PUT, refused (413) from its Content-Length, or as soon as a body sent
+    without one grows past UPLOAD_CHUNK_MAX_BYTES, instead of being buffered first.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Chunk exceeds {UPLOAD_CHUNK_MAX_BYTES // (1024 * 1024)} MB.")
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > UPLOAD_CHUNK_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > UPLOAD_CHUNK_MAX_BYTES:
+            raise too_large
+    return bytes(body)
+
+
+def _store_chunk(upload: ChunkedUpload, number: int, data: bytes, sha256: str) -> Dict[str, Any]:
+    try:
+        status = upload.put_chunk(number, data, sha256, UPLOADS.parse_allowance(upload))
+    except UploadNotFound:
+        raise _gone(upload.id)
+    except ChunkRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except UploadConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if isinstance(upload.failure, DecompressedSizeError):
+        # The chunk is stored, but the upload can no longer be finalized
+        raise HTTPException(status_code=413, detail=str(upload.failure))
+    _upload_progress(upload)
+    return status
+
+
+def _rejected(filename: Optional[str], exc: ReservationRejected) -> JSONResponse:
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status_code, content={"filename": filename, "error": exc.reason}, headers=headers)
+
+
+@router.put("/{upload_id}/chunks/{number}", summary="Send one chunk of a chunked upload")
+async def put_chunk(
+    request: Request,
+    upload_id: str,
+    number: int = Path(..., ge=1),
+    sha256: str = Header(..., alias="X-Chunk-SHA256", description="Hex SHA-256 of the chunk body"),
+) -> Dict[str, Any]:
+    """
+    Stores the chunk and parses it (with any following chunks already received) right away,
+    while the worker's parse-ahead budget allows. Re-sending a received chunk with the same
+    content is a no-op.
+    """
+    # Rebuilding an upload this worker has not seen yet reads its directory: off the event loop
+    upload = await run_in_threadpool(_get_upload, upload_id)
+    data = await _read_chunk(request)
+    STATS.inc("dash_bytes_ingested_total", len(data), endpoint="upload_chunk")
+    return await run_in_threadpool(_store_chunk, upload, number, data, sha256)
+
+
+@router.get("/{upload_id}", summary="Chunks received so far (to resume an upload)")
+def upload_status(upload_id: str) -> Dict[str, Any]:
+    upload = _get_upload(upload_id)
+    status = upload.status()
+    parser: CsvChunkParser = upload.consumer
+    status["rows_parsed"] = len(parser.rows)
+    return status
+
+
+@router.post("/{upload_id}/finalize", summary="Finish a chunked upload and return the validation results")
+async def finalize_upload(
+    request: Request,
+    upload_id: str,
+    total_chunks: int = Body(..., embed=True, ge=1),
+    sha256: Optional[str] = Body(None, embed=True, description="Hex SHA-256 of the whole file (optional)"),
+    timings: bool = Query(False, description="Include per-stage timings (ms) in the response meta"),
+    accept: bool = Query(
+        False, description="The export is being billed: record its lines for cross-file duplicate detection"
+    ),
+) -> JSONResponse:
+    """
+    Rows were parsed as the chunks arrived (within the parse-ahead budget): only the rest of
+    the file and the validators are left to run. Same response as /ingest; the upload is
+    deleted afterwards.
+    """
+    upload = await run_in_threadpool(_get_upload, upload_id)
+    try:
+        await run_in_threadpool(upload.refresh)
+    except UploadNotFound:
+        raise _gone(upload_id)
+    parser: CsvChunkParser = upload.consumer
+
+    # This request's own body is tiny: reserve the assembled file in the admission budget,
+    # growing while the rest of a gzip upload is inflated
+    grow = reservation_grower(request.state)
+    if grow is not None:
+        try:
+            grow(max(upload.bytes_received, parser.decompressed_bytes))
+        except ReservationRejected as exc:
+            return _rejected(upload.filename, exc)
+
+    progress = await run_in_threadpool(_upload_progress, upload)
+    return await run_in_threadpool(_finalize, upload, total_chunks, sha256, timings, accept, progress, grow)
+
+
+def _finalize(
+    upload: ChunkedUpload,
+    total_chunks: int,
+    sha256: Optional[str],
+    timings: bool,
+    accept: bool,
+    progress: Progress,
+    grow: Optional[Callable[[int], None]],
+) -> JSONResponse:
+    timer = StageTimer("upload_finalize")
+    parser: CsvChunkParser = upload.consumer
+    # The request's reservation covers the upload from here on (see UploadStore.held_bytes)
+    upload.finalizing = True
+    parser.on_read = grow
+    try:
+        try:
+            upload.finalize(total_chunks, sha256)
+        except UploadNotFound:
+            raise _gone(upload.id)
+        except ChunkRejected as exc:
+            if isinstance(upload.failure, ReservationRejected):
+                # The parser stopped inside a chunk: drop it, a retry parses the chunks again
+                UPLOADS.evict(upload.id)
+                progress.finish(upload.failure.status_code)
+                return _rejected(upload.filename, upload.failure)
+            if isinstance(upload.failure, DecompressedSizeError):
+                raise HTTPException(status_code=413, detail=str(upload.failure))
+            raise HTTPException(status_code=400, detail=str(exc))
+        except UploadConflict as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+        try:
+            with timer.stage("parse"):
+                parser.close()
+            progress.parsed(len(parser.rows), upload.bytes_consumed)
+            response = _validation_response(
+                upload.filename, parser.hint, parser.headers, parser.rows, timer, timings, "upload_finalize",
+                progress, accept,
+            )
+        except DecompressedSizeError as exc:
+            progress.finish(413)
+            return JSONResponse(status_code=413, content={"filename": upload.filename, "error": str(exc)})
+        except RulesUnavailable as exc:
+            # Rules may come back: keep the upload so finalize can be retried
+            upload.reopen()
+            progress.finish(503)
+            return JSONResponse(status_code=503, content={"filename": upload.filename, "error": str(exc)})
+        except (ValueError, csv.Error) as exc:
+            progress.finish(400)
+            return JSONResponse(
+                status_code=400,
+                content={"filename": upload.filename, "error": f"{type(exc).__name__}: {exc}"},
+            )
+        response.headers["X-Parse-While-Uploading-Ms"] = f"{parser.parse_seconds * 1000:.1f}"
+        return response
+    finally:
+        parser.on_read = None
+        upload.finalizing = False
+        timer.close()
+        if upload.finalized:
+            UPLOADS.discard(upload.id)
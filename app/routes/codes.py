@@ -1,14 +1,15 @@
-﻿from fastapi import APIRouter, Depends
+﻿from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import ReadSessionLocal
 from app.models import Code
 from app.schemas import CodeOut
+from app.services.code_search import CODE_SEARCH
 
 router = APIRouter(prefix="/codes", tags=["codes"])
 
 # Dependency: get a session and close it after the request
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -18,3 +19,13 @@ def get_db():
 def list_codes(db: Session = Depends(get_db)):
     """Return all codes as JSON."""
     return db.query(Code).all()
+
+@router.get("/search", response_model=list[CodeOut])
+def search_codes(
+    q: str = Query(..., min_length=1, max_length=100, description="Code number prefix or words from name/description"),
+    limit: int = Query(20, ge=1, le=100),
+    include_inactive: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Type-ahead search: code-number prefix matches first, then ranked full-text matches."""
+    return [hit._asdict() for hit in CODE_SEARCH.search(db, q, limit=limit, active_only=not include_inactive)]
@@ -1,13 +1,13 @@
 ﻿from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import ReadSessionLocal
 from app.models import Context
 from app.schemas import ContextOut
 
 router = APIRouter(prefix="/contexts", tags=["contexts"])
 
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
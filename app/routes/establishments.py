@@ -1,13 +1,13 @@
 ﻿from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import ReadSessionLocal
 from app.models import Establishment
 from app.schemas import EstablishmentOut
 
 router = APIRouter(prefix="/establishments", tags=["establishments"])
 
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,310 @@
+# C:\Users\monti\Projects\DashValidator\app\services\admission.py
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.chunked_upload import UPLOAD_CHUNK_MAX_BYTES
+from app.services.precheck import PRECHECK_MAX_BYTES
+
+MB = 1024 * 1024
+# Query values FastAPI reads as a true bool
+_TRUE = {"1", "true", "on", "yes", "t", "y"}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class UploadTooLarge(HTTPException):
+    """
+    Raised from the wrapped `receive` when a body without Content-Length grows past the limit.
+    Subclassing HTTPException lets FastAPI's body parsing re-raise it untouched, so the
+    client gets a 413 instead of a generic 400.
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {limit // MB} MB limit.")
+
+
+class ReservationRejected(Exception):
+    """
+    An admitted request turned out to need more memory than the budget has left (see
+    reservation_grower). status_code is 413 or 429, like admission itself.
+    """
+
+    def __init__(self, status_code: int, reason: str, retry_after: Optional[int] = None):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    endpoint_class: str
+    reserved_bytes: int
+
+
+class AdmissionController:
+    """
+    Per-worker admission control for upload endpoints.
+
+    - max_upload_bytes: hard cap on a request body (413)
+    - concurrency: max in-flight requests per endpoint class, e.g. {"ingest": 2} (429)
+    - memory_budget_bytes: bytes this worker may commit to uploads in flight; each request
+      reserves Content-Length * memory_factor (decoded text + parsed rows weigh several times
+      the raw CSV). Requests that can never fit get 413, requests that must wait get 429.
+    - read_limits: classes that read at most this many bytes of their body whatever its size
+      (prechecks, upload chunks); they reserve read_limit * memory_factor instead
+
+    Memory held between requests (uploads parsed ahead of finalize) is registered with
+    track() and counted against the same budget.
+
+    A compressed body can inflate far beyond its Content-Length: handlers grow the reservation
+    while decompressing (resize), from worker threads, so the bookkeeping takes a lock.
+    """
+
+    def __init__(
+        self,
+        max_upload_bytes: int,
+        memory_budget_bytes: int,
+        memory_factor: float,
+        concurrency: Dict[str, int],
+        prefixes: Dict[str, str],
+        retry_after_seconds: int = 5,
+        read_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.max_upload_bytes = max_upload_bytes
+        self.memory_budget_bytes = memory_budget_bytes
+        self.memory_factor = memory_factor
+        self.concurrency = dict(concurrency)
+        self.prefixes = dict(prefixes)
+        self.retry_after_seconds = retry_after_seconds
+        self.read_limits = dict(read_limits or {})
+        self.in_flight: Dict[str, int] = {name: 0 for name in self.concurrency}
+        self.reserved_bytes = 0
+        self.rejected: Dict[int, int] = {413: 0, 429: 0}
+        self._held: List[Callable[[], int]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_upload_bytes=_env_int("UPLOAD_MAX_MB", 512) * MB,
+            memory_budget_bytes=_env_int("WORKER_MEMORY_BUDGET_MB", 2048) * MB,
+            memory_factor=_env_float("UPLOAD_MEMORY_FACTOR", 4.0),
+            concurrency={
+                "ingest": _env_int("INGEST_MAX_CONCURRENCY", 2),
+                "metrics": _env_int("METRICS_MAX_CONCURRENCY", 4),
+                "precheck": _env_int("PRECHECK_MAX_CONCURRENCY", 8),
+                "upload": _env_int("UPLOAD_MAX_CONCURRENCY", 8),
+            },
+            # First match wins: /ingest/precheck and /ingest/uploads before /ingest
+            prefixes={
+                "/ingest/precheck": "precheck",
+                "/ingest/uploads": "upload",
+                "/ingest": "ingest",
+                "/metrics/": "metrics",
+            },
+            retry_after_seconds=_env_int("ADMISSION_RETRY_AFTER", 5),
+            read_limits={"precheck": PRECHECK_MAX_BYTES, "upload": UPLOAD_CHUNK_MAX_BYTES},
+        )
+
+    def classify(self, path: str, query_string: str = "") -> Optional[str]:
+        for prefix, name in self.prefixes.items():
+            if path.startswith(prefix):
+                # /ingest?precheck=true only reads the start of the upload back
+                if path == "/ingest" and "precheck" in self.concurrency and query_string:
+                    flags = parse_qs(query_string).get("precheck")
+                    if flags and flags[0].lower() in _TRUE:
+                        return "precheck"
+                # Chunks and upload creation are light; finalizing runs the validators like /ingest
+                if name == "upload" and path.endswith("/finalize") and "ingest" in self.concurrency:
+                    return "ingest"
+                return name
+        return None
+
+    def try_admit(self, endpoint_class: str, content_length: Optional[int]) -> Tuple[Optional[Ticket], Optional[Tuple[int, str]]]:
+        """
+        Returns (ticket, None) when admitted, else (None, (status_code, reason)).
+        """
+        with self._lock:
+            ticket, rejection = self._admit(endpoint_class, content_length)
+            if rejection is not None:
+                self.rejected[rejection[0]] = self.rejected.get(rejection[0], 0) + 1
+            return ticket, rejection
+
+    def _admit(self, endpoint_class: str, content_length: Optional[int]) -> Tuple[Optional[Ticket], Optional[Tuple[int, str]]]:
+        if content_length is not None and content_length > self.max_upload_bytes:
+            return None, (413, f"Upload exceeds the {self.max_upload_bytes // MB} MB limit.")
+
+        # Unknown length (chunked transfer): assume the worst case allowed
+        size = content_length if content_length is not None else self.max_upload_bytes
+        if endpoint_class in self.read_limits:
+            size = min(size, self.read_limits[endpoint_class])
+        estimate = int(size * self.memory_factor)
+        if estimate > self.memory_budget_bytes:
+            return None, (413, "Upload is too large for this worker's memory budget.")
+
+        limit = self.concurrency.get(endpoint_class)
+        if limit is not None and self.in_flight[endpoint_class] >= limit:
+            return None, (429, f"Too many concurrent '{endpoint_class}' requests; retry later.")
+        if self.reserved_bytes + self._held_bytes() + estimate > self.memory_budget_bytes:
+            return None, (429, "Worker memory budget is committed to other uploads; retry later.")
+
+        if limit is not None:
+            self.in_flight[endpoint_class] += 1
+        self.reserved_bytes += estimate
+        return Ticket(endpoint_class, estimate), None
+
+    def resize(self, ticket: Ticket, size: int) -> Optional[Tuple[int, str]]:
+        """
+        Grow an admitted request's reservation to `size` bytes of CSV, for requests whose body
+        is not what they process: a compressed upload as it is inflated, or finalizing a
+        chunked upload that assembles its stored chunks. Never shrinks it.
+        Returns None once the ticket holds the reservation, else (status_code, reason).
+        """
+        rejection: Optional[Tuple[int, str]] = None
+        estimate = int(size * self.memory_factor)
+        with self._lock:
+            if estimate <= ticket.reserved_bytes:
+                return None
+            if size > self.max_upload_bytes:
+                rejection = (413, f"Upload exceeds the {self.max_upload_bytes // MB} MB limit.")
+            elif estimate > self.memory_budget_bytes:
+                rejection = (413, "Upload is too large for this worker's memory budget.")
+            elif self.reserved_bytes + self._held_bytes() - ticket.reserved_bytes + estimate > self.memory_budget_bytes:
+                rejection = (429, "Worker memory budget is committed to other uploads; retry later.")
+            if rejection is not None:
+                self.rejected[rejection[0]] = self.rejected.get(rejection[0], 0) + 1
+                return rejection
+            self.reserved_bytes += estimate - ticket.reserved_bytes
+            ticket.reserved_bytes = estimate
+            return None
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.endpoint_class in self.in_flight:
+                self.in_flight[ticket.endpoint_class] -= 1
+            self.reserved_bytes -= ticket.reserved_bytes
+
+    def track(self, held: Callable[[], int]) -> None:
+        """
+        Count the bytes of CSV that `held()` reports as kept outside requests against the
+        budget, like reservations (times memory_factor).
+        """
+        self._held.append(held)
+
+    def _held_bytes(self) -> int:
+        return int(sum(held() for held in self._held) * self.memory_factor)
+
+    def count_rejection(self, status_code: int) -> None:
+        with self._lock:
+            self.rejected[status_code] = self.rejected.get(status_code, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": dict(self.in_flight),
+            "concurrency": dict(self.concurrency),
+            "reserved_bytes": self.reserved_bytes,
+            "held_bytes": self._held_bytes(),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "rejected": dict(self.rejected),
+        }
+
+
+def reservation_grower(state: Any) -> Optional[Callable[[int], None]]:
+    """
+    For a request admitted by AdmissionMiddleware (pass request.state): a function growing
+    its reservation to a number of CSV bytes, which raises ReservationRejected when that does
+    not fit. Safe to call from worker threads. None when the request was not admitted here.
+    """
+    controller: Optional[AdmissionController] = getattr(state, "admission_controller", None)
+    ticket: Optional[Ticket] = getattr(state, "admission_ticket", None)
+    if controller is None or ticket is None:
+        return None
+
+    def grow(size: int) -> None:
+        rejection = controller.resize(ticket, size)
+        if rejection is not None:
+            status_code, reason = rejection
+            retry_after = controller.retry_after_seconds if status_code == 429 else None
+            raise ReservationRejected(status_code, reason, retry_after)
+
+    return grow
+
+
+def _content_length(scope: Scope) -> Optional[int]:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController before the body is read, so rejected
+    uploads are answered immediately instead of being parsed first.
+    """
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController.from_env()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+        endpoint_class = controller.classify(scope["path"], scope.get("query_string", b"").decode("latin-1"))
+        if endpoint_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        ticket, rejection = controller.try_admit(endpoint_class, _content_length(scope))
+        if ticket is None:
+            status_code, reason = rejection
+            headers = {"Retry-After": str(controller.retry_after_seconds)} if status_code == 429 else None
+            response = JSONResponse(status_code=status_code, content={"detail": reason}, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        # For endpoints that resize their reservation (see AdmissionController.resize)
+        state = scope.setdefault("state", {})
+        state["admission_controller"] = controller
+        state["admission_ticket"] = ticket
+
+        limit = controller.max_upload_bytes
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    controller.count_rejection(413)
+                    raise UploadTooLarge(limit)
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            controller.release(ticket)
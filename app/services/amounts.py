@@ -0,0 +1,126 @@
+# C:\Users\monti\Projects\DashValidator\app\services\amounts.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+from typing import Dict, Iterable, Optional
+
+# Spaces seen as thousands separators in Quebec exports: regular, no-break, narrow no-break
+_SPACES = " \xa0\u202f"
+_CURRENCY = "$"
+
+
+@dataclass(frozen=True)
+class AmountFormat:
+    """
+    Number format of an amount column: decimal separator and thousands separator.
+    """
+    decimal_sep: str
+    thousands_sep: str
+
+
+# "1 234,56 $" (fr-CA) and "1,234.56" (en-CA)
+FRENCH = AmountFormat(decimal_sep=",", thousands_sep=" ")
+ENGLISH = AmountFormat(decimal_sep=".", thousands_sep=",")
+
+
+def detect_amount_format(values: Iterable[str], limit: int = 500) -> AmountFormat:
+    """
+    Vote on the decimal separator using up to `limit` non-empty values.
+    A separator followed by exactly three digits is ambiguous (thousands or decimals) and
+    does not vote. Without any evidence, the Quebec convention (decimal comma) wins.
+    """
+    comma_votes = 0
+    dot_votes = 0
+    non_empty = (v for v in values if v and v.strip())
+    for raw in islice(non_empty, limit):
+        s = raw.strip().rstrip(_CURRENCY + _SPACES)
+        last_comma = s.rfind(",")
+        last_dot = s.rfind(".")
+        if last_comma >= 0 and last_dot >= 0:
+            if last_comma > last_dot:
+                comma_votes += 1
+            else:
+                dot_votes += 1
+        elif last_comma >= 0:
+            if len(s) - last_comma - 1 != 3:
+                comma_votes += 1
+        elif last_dot >= 0:
+            if len(s) - last_dot - 1 != 3:
+                dot_votes += 1
+    return ENGLISH if dot_votes > comma_votes else FRENCH
+
+
+class AmountParser:
+    """
+    Parse amount strings into integer cents for one number format.
+
+    Billing files repeat the same few amounts thousands of times, so results are memoized
+    per raw string (bounded by max_cache). Returns None for blank or unparseable values.
+    """
+
+    def __init__(self, fmt: AmountFormat = FRENCH, max_cache: int = 100_000):
+        self.format = fmt
+        self.max_cache = max_cache
+        group = fmt.thousands_sep if fmt.thousands_sep not in _SPACES else ""
+        self._strip = str.maketrans("", "", _CURRENCY + _SPACES + group)
+        self._cache: Dict[str, Optional[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_samples(cls, values: Iterable[str], **kwargs) -> "AmountParser":
+        return cls(detect_amount_format(values), **kwargs)
+
+    def cents(self, raw: str) -> Optional[int]:
+        try:
+            value = self._cache[raw]
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+        self.misses += 1
+        value = self._parse(raw)
+        if len(self._cache) < self.max_cache:
+            self._cache[raw] = value
+        return value
+
+    def _parse(self, raw: str) -> Optional[int]:
+        s = (raw or "").translate(self._strip)
+        if not s:
+            return None
+
+        negative = False
+        if s[0] == "(" and s[-1] == ")":
+            negative, s = True, s[1:-1]
+        if s[-1:] == "-":
+            negative, s = True, s[:-1]
+        if s[:1] in ("-", "+"):
+            negative, s = s[0] == "-", s[1:]
+
+        if self.format.decimal_sep != ".":
+            s = s.replace(self.format.decimal_sep, ".")
+        whole, _, frac = s.partition(".")
+        whole = whole or "0"
+        if not (whole.isascii() and whole.isdigit()):
+            return None
+        if frac and not (frac.isascii() and frac.isdigit()):
+            return None
+
+        if len(frac) <= 2:
+            cents = int(whole) * 100 + int(frac.ljust(2, "0"))
+        else:
+            cents = int((Decimal(f"{whole}.{frac}") * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        return -cents if negative else cents
+
+
+def cents_to_decimal(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents: int) -> str:
+    """
+    Render cents as '1234.56' for messages.
+    """
+    return f"{cents_to_decimal(cents):.2f}"
@@ -0,0 +1,363 @@
+# C:\Users\monti\Projects\DashValidator\app\services\chunked_upload.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+# Where chunks are kept until finalize; one directory per upload
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_MB", "32")) * 1024 * 1024
+# Uploads idle for longer are deleted
+UPLOAD_TTL_SECONDS = float(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+# CSV bytes a worker parses ahead of finalize, all uploads together; the rest waits for finalize
+UPLOAD_PARSE_AHEAD_BYTES = int(os.getenv("UPLOAD_PARSE_AHEAD_MB", "128")) * 1024 * 1024
+# Uploads idle for longer drop their parsed rows (re-parsed from disk if they resume)
+UPLOAD_IDLE_SECONDS = float(os.getenv("UPLOAD_IDLE_SECONDS", "300"))
+# How often the store expires and evicts uploads
+_SWEEP_SECONDS = 60.0
+
+_ID = re.compile(r"[0-9a-f]{32}")
+_META = "upload.json"
+# Created (exclusively) by the finalize that wins, so no two workers finalize one upload
+_FINALIZED = "finalized"
+
+
+class UploadNotFound(KeyError):
+    pass
+
+
+class ChunkRejected(ValueError):
+    """Bad chunk number, size or checksum."""
+
+
+class UploadConflict(RuntimeError):
+    """The upload is finalized, or a chunk was re-sent with different content."""
+
+
+class ChunkConsumer(Protocol):
+    """
+    Receives the file's bytes in order, chunk by chunk, as soon as they are contiguous.
+    decompressed_bytes (bytes of content fed so far, after any decompression) measures what
+    the consumer holds, for the store's parse-ahead bound.
+    """
+
+    decompressed_bytes: int
+
+    def feed(self, data: bytes) -> None: ...
+
+
+def _chunk_name(number: int) -> str:
+    return f"{number:08d}.chunk"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Unique temporary name: several workers may write the same chunk at once
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ChunkedUpload:
+    """
+    One resumable upload. Chunks (numbered from 1) may arrive in any order and be re-sent;
+    each is written to disk, and contiguous chunks starting at `next_chunk` are fed to the
+    consumer right away (up to the caller's parse_until), so the file is processed while the
+    rest is in flight. finalize feeds whatever is left.
+
+    The directory is the source of truth: each chunk has a .sha256 file written after it, and
+    every put_chunk/finalize first picks up chunks that other workers stored there.
+    """
+
+    def __init__(self, upload_id: str, directory: str, filename: Optional[str], consumer: ChunkConsumer):
+        self.id = upload_id
+        self.directory = directory
+        self.filename = filename
+        self.consumer = consumer
+        self.created_at = time.time()
+        self.touched_at = time.monotonic()
+        self.next_chunk = 1
+        self.bytes_consumed = 0
+        self.finalized = False
+        self.finalizing = False                # a finalize request holds (and reserved) it
+        self.error: Optional[str] = None       # set when the consumer failed
+        self.failure: Optional[Exception] = None
+        self._checksums: Dict[int, str] = {}
+        self._sizes: Dict[int, int] = {}
+        self._digest = hashlib.sha256()         # of the consumed bytes, in order
+        self._lock = threading.Lock()
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, _chunk_name(number))
+
+    @property
+    def bytes_received(self) -> int:
+        return sum(self._sizes.values())
+
+    def refresh(self) -> None:
+        """
+        Bring the chunk list up to date with the directory, without consuming anything.
+        """
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        """
+        Pick up chunks stored by other workers, and their finalize (caller holds the lock).
+        """
+        if not os.path.isfile(os.path.join(self.directory, _META)):
+            raise UploadNotFound(self.id)  # finalized and deleted elsewhere, or expired
+        self.finalized = os.path.exists(os.path.join(self.directory, _FINALIZED))
+        for name in os.listdir(self.directory):
+            if not name.endswith(".chunk"):
+                continue
+            number = int(name.split(".", 1)[0])
+            if number in self._checksums:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path + ".sha256", encoding="ascii") as f:
+                    checksum = f.read().strip()
+            except FileNotFoundError:
+                with open(path, "rb") as f:  # stored before checksum files existed
+                    checksum = hashlib.sha256(f.read()).hexdigest()
+            self._checksums[number] = checksum
+            self._sizes[number] = os.path.getsize(path)
+
+    def put_chunk(self, number: int, data: bytes, sha256: str, parse_until: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Store chunk `number`, then feed the consumer the chunks that became contiguous while its
+        decompressed_bytes stays below `parse_until` (None: no bound).
+        """
+        if number < 1:
+            raise ChunkRejected("Chunk numbers start at 1.")
+        if len(data) > UPLOAD_CHUNK_MAX_BYTES:
+            raise ChunkRejected(f"Chunk exceeds {UPLOAD_CHUNK_MAX_BYTES // (1024 * 1024)} MB.")
+        actual = hashlib.sha256(data).hexdigest()
+        if actual != sha256.strip().lower():
+            raise ChunkRejected(f"Checksum mismatch for chunk {number}: received data hashes to {actual}.")
+        with self._lock:
+            self.touched_at = time.monotonic()
+            self._sync()
+            if self.finalized:
+                raise UploadConflict("Upload is already finalized.")
+            known = self._checksums.get(number)
+            if known is not None:
+                if known != actual:
+                    raise UploadConflict(f"Chunk {number} was already received with different content.")
+                self._advance(parse_until)
+                return self.status()  # retried chunk: nothing to store
+            _write_atomic(self._path(number), data)
+            _write_atomic(self._path(number) + ".sha256", actual.encode("ascii"))
+            self._checksums[number] = actual
+            self._sizes[number] = len(data)
+            self._advance(parse_until)
+            return self.status()
+
+    def _advance(self, until: Optional[int] = None) -> None:
+        while self.error is None and self.next_chunk in self._checksums:
+            if until is not None and self.consumer.decompressed_bytes >= until:
+                return
+            with open(self._path(self.next_chunk), "rb") as f:
+                data = f.read()
+            try:
+                self.consumer.feed(data)
+            except Exception as exc:
+                # The file itself is unusable (e.g. a ZIP): reported by status() and finalize
+                self.failure = exc
+                self.error = f"{type(exc).__name__}: {exc}"
+                return
+            self._digest.update(data)
+            self.bytes_consumed += len(data)
+            self.next_chunk += 1
+
+    def finalize(self, total_chunks: int, sha256: Optional[str] = None) -> None:
+        """
+        Check that chunks 1..total_chunks (and no others) arrived and, if given, the SHA-256
+        of the whole file. The consumer has then seen the complete file.
+        """
+        with self._lock:
+            self.touched_at = time.monotonic()
+            self._sync()
+            if self.finalized:
+                raise UploadConflict("Upload is already finalized.")
+            self._advance()
+            if self.error is not None:
+                raise ChunkRejected(self.error)
+            missing = [n for n in range(1, total_chunks + 1) if n not in self._checksums]
+            if missing:
+                raise ChunkRejected(f"Missing chunk(s): {', '.join(map(str, missing[:20]))}.")
+            extra = sorted(n for n in self._checksums if n > total_chunks)
+            if extra:
+                raise ChunkRejected(f"Chunk(s) beyond total_chunks={total_chunks}: {', '.join(map(str, extra[:20]))}.")
+            if sha256 and self._digest.hexdigest() != sha256.strip().lower():
+                raise ChunkRejected("File checksum mismatch: re-send the chunks that differ.")
+            try:
+                os.close(os.open(os.path.join(self.directory, _FINALIZED), os.O_CREAT | os.O_EXCL))
+            except FileExistsError:
+                raise UploadConflict("Upload is already finalized.")
+            self.finalized = True
+
+    def reopen(self) -> None:
+        """
+        Undo finalize (e.g. the rules were unavailable) so it can be retried.
+        """
+        with self._lock:
+            try:
+                os.remove(os.path.join(self.directory, _FINALIZED))
+            except FileNotFoundError:
+                pass
+            self.finalized = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "received_chunks": sorted(self._checksums),
+            "next_chunk": self.next_chunk,
+            "bytes_received": self.bytes_received,
+            "bytes_consumed": self.bytes_consumed,
+            "finalized": self.finalized,
+            "error": self.error,
+        }
+
+
+class UploadStore:
+    """
+    Uploads of this process, with their chunks on disk under `root`. An upload unknown to the
+    process (after a restart, or created by another worker sharing `root`) is rebuilt from its
+    directory with a new consumer; its chunks are fed again by the next put_chunk or finalize.
+    Workers must share `root` (same host or a shared volume); any of them can take any chunk
+    or the finalize.
+
+    What consumers hold is bounded: uploads parse ahead of finalize only while all of them
+    together hold less than `parse_ahead_bytes`, give or take a chunk (see parse_allowance and
+    held_bytes), and sweep() drops the consumers of uploads idle for `idle_seconds`.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        consumer_factory: Callable[[], ChunkConsumer],
+        ttl: float = UPLOAD_TTL_SECONDS,
+        parse_ahead_bytes: int = UPLOAD_PARSE_AHEAD_BYTES,
+        idle_seconds: float = UPLOAD_IDLE_SECONDS,
+    ):
+        self.root = root
+        self.consumer_factory = consumer_factory
+        self.ttl = ttl
+        self.parse_ahead_bytes = parse_ahead_bytes
+        self.idle_seconds = idle_seconds
+        self._uploads: Dict[str, ChunkedUpload] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def create(self, filename: Optional[str]) -> ChunkedUpload:
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, _META), "w", encoding="utf-8") as f:
+            json.dump({"filename": filename}, f)
+        upload = ChunkedUpload(upload_id, directory, filename, self.consumer_factory())
+        with self._lock:
+            self._uploads[upload_id] = upload
+        return upload
+
+    def get(self, upload_id: str) -> ChunkedUpload:
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+            directory = os.path.join(self.root, upload_id)
+            if not _ID.fullmatch(upload_id) or not os.path.isfile(os.path.join(directory, _META)):
+                raise UploadNotFound(upload_id)
+            with open(os.path.join(directory, _META), encoding="utf-8") as f:
+                meta = json.load(f)
+            upload = ChunkedUpload(upload_id, directory, meta.get("filename"), self.consumer_factory())
+            upload._sync()
+            self._uploads[upload_id] = upload
+            return upload
+
+    def parse_allowance(self, upload: ChunkedUpload) -> int:
+        """
+        parse_until for a put_chunk of `upload`: what the other uploads leave of the budget.
+        """
+        with self._lock:
+            others = sum(u.consumer.decompressed_bytes for u in self._uploads.values() if u is not upload)
+        return self.parse_ahead_bytes - others
+
+    def held_bytes(self) -> int:
+        """
+        Bytes held by the consumers of uploads not being finalized (a finalize request reserves
+        its upload itself).
+        """
+        with self._lock:
+            return sum(u.consumer.decompressed_bytes for u in self._uploads.values() if not u.finalizing)
+
+    def evict(self, upload_id: str) -> None:
+        """
+        Forget this process's copy of an upload (and what its consumer holds); the chunks stay.
+        """
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+    def discard(self, upload_id: str) -> None:
+        self.evict(upload_id)
+        shutil.rmtree(os.path.join(self.root, upload_id), ignore_errors=True)
+
+    def sweep(self) -> None:
+        """
+        Evict uploads idle for `idle_seconds`, and expire those idle for the TTL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                uid for uid, u in self._uploads.items()
+                if not u.finalizing and now - u.touched_at > self.idle_seconds
+            ]
+        for upload_id in idle:
+            self.evict(upload_id)
+        self.expire()
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.sweep)
+
+    def start(self, interval: float = _SWEEP_SECONDS) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def expire(self) -> List[str]:
+        """
+        Delete uploads idle for longer than the TTL (in memory and on disk). Returns their ids.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [uid for uid, u in self._uploads.items() if now - u.touched_at > self.ttl]
+        if os.path.isdir(self.root):
+            cutoff = time.time() - self.ttl
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name not in self._uploads and _ID.fullmatch(name) and os.path.getmtime(path) < cutoff:
+                    stale.append(name)
+        for upload_id in stale:
+            self.discard(upload_id)
+        return stale
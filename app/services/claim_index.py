@@ -0,0 +1,251 @@
+# C:\Users\monti\Projects\DashValidator\app\services\claim_index.py
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+# SQLite's default host-parameter limit is 999 on older builds; stay well below it.
+_LOOKUP_BATCH = 500
+# Batches older than this are deleted; a process that has not refreshed since rebuilds its filter
+BATCH_KEEP_SECONDS = 600.0
+
+
+class BloomFilter:
+    """
+    Minimal Bloom filter over 64-bit fingerprints.
+    The fingerprints are already uniform hashes, so the k probe positions are derived
+    from their two 32-bit halves (double hashing) instead of re-hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.size_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size_bits / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fp: int) -> List[int]:
+        h = fp & 0xFFFFFFFFFFFFFFFF
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        m = self.size_bits
+        return [(h1 + i * h2) % m for i in range(self.hash_count)]
+
+    def add(self, fp: int) -> None:
+        bits = self._bits
+        for pos in self._positions(fp):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, fp: int) -> bool:
+        bits = self._bits
+        for pos in self._positions(fp):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class ClaimIndex:
+    """
+    Persistent index of billing-line fingerprints (see app.validators.claim_fingerprint).
+
+    Storage is a local SQLite file with one WITHOUT ROWID table keyed by the signed 64-bit
+    fingerprint, so a lookup is a primary-key probe. An in-memory Bloom filter is loaded at
+    open time and answers most "never seen" checks without touching SQLite at all.
+
+    Several processes (uvicorn workers) may share the file. Each add() also appends its
+    fingerprints as one packed batch to claim_fingerprint_batches; before trusting a Bloom
+    negative, lookup() folds in the batches other processes appended since its high-water mark.
+    Batches only carry news between processes (the fingerprints are already in the table):
+    add() deletes those older than `batch_keep_seconds` and records the highest deleted seq,
+    and a process whose mark is below it rebuilds its filter from the table instead.
+    """
+
+    def __init__(self, path: str, error_rate: float = 0.01, batch_keep_seconds: float = BATCH_KEEP_SECONDS):
+        self.path = path
+        self.error_rate = error_rate
+        self.batch_keep_seconds = batch_keep_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claim_fingerprints (
+                fp INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                first_seen TEXT NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claim_fingerprint_batches (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                fps BLOB NOT NULL,
+                added REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claim_index_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+        self._seen_seq = 0
+        self._own_batches: Set[int] = set()
+        self._bloom = self._build_bloom()
+        # Fingerprints checked, and how many got past the Bloom filter to SQLite
+        self.lookups = 0
+        self.bloom_passed = 0
+
+    def _build_bloom(self, minimum: int = 1_000_000) -> BloomFilter:
+        # One read transaction, so the high-water mark matches the rows scanned
+        self._conn.execute("BEGIN")
+        try:
+            self._seen_seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM claim_fingerprint_batches"
+            ).fetchone()[0]
+            total = self._conn.execute("SELECT COUNT(*) FROM claim_fingerprints").fetchone()[0]
+            bloom = BloomFilter(max(total * 2, minimum), self.error_rate)
+            for (fp,) in self._conn.execute("SELECT fp FROM claim_fingerprints"):
+                bloom.add(fp)
+        finally:
+            self._conn.commit()
+        self._own_batches.clear()
+        return bloom
+
+    def _refresh_bloom(self) -> None:
+        """
+        Add the fingerprints other processes recorded since the last refresh (caller holds the lock).
+        """
+        # One read transaction, so no prune can slip between the mark and the batches read
+        self._conn.execute("BEGIN")
+        try:
+            row = self._conn.execute("SELECT value FROM claim_index_meta WHERE key = 'pruned_seq'").fetchone()
+            pruned = row is not None and row[0] > self._seen_seq
+            batches = [] if pruned else self._conn.execute(
+                "SELECT seq, fps FROM claim_fingerprint_batches WHERE seq > ? ORDER BY seq",
+                (self._seen_seq,),
+            ).fetchall()
+        finally:
+            self._conn.commit()
+        if pruned:
+            # Batches this process had not folded in were deleted: only the table has them now
+            self._bloom = self._build_bloom(minimum=self._bloom.capacity)
+            return
+        for seq, blob in batches:
+            self._seen_seq = seq
+            if seq in self._own_batches:
+                self._own_batches.discard(seq)
+                continue
+            for fp in array("q", blob):
+                self._bloom.add(fp)
+
+    def lookup(self, fingerprints: Iterable[int]) -> Dict[int, str]:
+        """
+        Return {fingerprint: source} for the fingerprints already present in the index.
+        """
+        with self._lock:
+            self._refresh_bloom()
+            fingerprints = list(fingerprints)
+            candidates = [fp for fp in fingerprints if fp in self._bloom]
+            self.lookups += len(fingerprints)
+            self.bloom_passed += len(candidates)
+            found: Dict[int, str] = {}
+            for start in range(0, len(candidates), _LOOKUP_BATCH):
+                batch = candidates[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                cur = self._conn.execute(
+                    f"SELECT fp, source FROM claim_fingerprints WHERE fp IN ({placeholders})",
+                    batch,
+                )
+                found.update(cur.fetchall())
+            return found
+
+    def add(self, fingerprints: Iterable[int], source: str) -> int:
+        """
+        Record fingerprints as seen in `source`. Existing entries keep their original source.
+        Returns the number of new fingerprints stored.
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        fps = list(fingerprints)
+        if not fps:
+            return 0
+        with self._lock:
+            # Fold in the other processes' batches first, so pruning them does not force a rebuild
+            self._refresh_bloom()
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO claim_fingerprints (fp, source, first_seen) VALUES (?, ?, ?)",
+                ((fp, source, now) for fp in fps),
+            )
+            inserted = self._conn.total_changes - before
+            added = time.time()
+            cur = self._conn.execute(
+                "INSERT INTO claim_fingerprint_batches (fps, added) VALUES (?, ?)",
+                (array("q", fps).tobytes(), added),
+            )
+            self._prune_batches(added - self.batch_keep_seconds)
+            self._conn.commit()
+            self._own_batches.add(cur.lastrowid)
+
+            if self._bloom.count + len(fps) > self._bloom.capacity:
+                # Keep the false-positive rate near target as history grows
+                self._bloom = self._build_bloom(minimum=self._bloom.capacity * 2)
+            else:
+                for fp in fps:
+                    self._bloom.add(fp)
+            return inserted
+
+    def _prune_batches(self, cutoff: float) -> None:
+        """
+        Delete the batches added before `cutoff` and raise the pruned_seq mark (caller holds the
+        lock and commits).
+        """
+        pruned = self._conn.execute(
+            "SELECT MAX(seq) FROM claim_fingerprint_batches WHERE added < ?", (cutoff,)
+        ).fetchone()[0]
+        if pruned is None:
+            return
+        self._conn.execute("DELETE FROM claim_fingerprint_batches WHERE seq <= ?", (pruned,))
+        self._conn.execute(
+            "INSERT INTO claim_index_meta (key, value) VALUES ('pruned_seq', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (pruned,),
+        )
+        self._own_batches = {seq for seq in self._own_batches if seq > pruned}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_index: Optional[ClaimIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_claim_index() -> Optional[ClaimIndex]:
+    """
+    Process-wide ClaimIndex opened from CLAIM_INDEX_PATH.
+    Returns None when the variable is unset, which disables cross-file duplicate detection.
+    """
+    global _index
+    path = os.getenv("CLAIM_INDEX_PATH")
+    if not path:
+        return None
+    with _index_lock:
+        if _index is None or _index.path != path:
+            _index = ClaimIndex(path)
+        return _index
@@ -0,0 +1,195 @@
+# C:\Users\monti\Projects\DashValidator\app\services\code_search.py
+from __future__ import annotations
+
+import bisect
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.models import Code, SyncManifest
+from app.services.rule_snapshot import get_snapshot_watcher
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Seconds between checks of sync_manifests for a newer codes import
+CODE_INDEX_CHECK_SECONDS = float(os.getenv("CODE_INDEX_CHECK_SECONDS", "30"))
+
+
+class CodeHit(NamedTuple):
+    id: int
+    code: str
+    name: str
+    description: Optional[str]
+    is_active: bool
+
+
+class CodePrefixIndex:
+    """
+    Prefix lookup over code numbers. Codes are kept sorted, so all codes starting with a
+    prefix form one contiguous run that starts at a binary-search position: the same answers
+    as a trie, in far less memory and without per-node Python objects.
+    """
+
+    def __init__(self, hits: List[CodeHit]):
+        self._hits = sorted(hits, key=lambda h: h.code)
+        self._codes = [h.code for h in self._hits]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def search(self, prefix: str, limit: int, active_only: bool = True) -> List[CodeHit]:
+        """
+        Codes starting with `prefix` in code order (an exact match sorts first).
+        Stops after `limit` hits, so short prefixes cost no more than long ones.
+        """
+        hits: List[CodeHit] = []
+        i = bisect.bisect_left(self._codes, prefix)
+        while i < len(self._codes) and len(hits) < limit and self._codes[i].startswith(prefix):
+            hit = self._hits[i]
+            if hit.is_active or not active_only:
+                hits.append(hit)
+            i += 1
+        return hits
+
+
+class CodeSearch:
+    """
+    Type-ahead over the code catalog.
+
+    Queries that look like a code number are answered from the shared rule snapshot when
+    RULE_SNAPSHOT_PATH is set (one memory-mapped catalog for all workers), else from an
+    in-memory CodePrefixIndex, reloaded when sync_manifests shows a newer 'codes' import
+    (checked at most every `check_interval` seconds). Text is matched by the database index created in migration
+    d5a83c2f6e14: FTS5 with bm25 ranking on SQLite, tsvector + trigram similarity on PostgreSQL.
+    Databases without the index (e.g. created with create_all) fall back to LIKE.
+    """
+
+    def __init__(self, check_interval: float = CODE_INDEX_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._prefix: Optional[CodePrefixIndex] = None
+        self._version: Optional[Tuple[Any, ...]] = None
+        self._checked_at = 0.0
+
+    # ---- prefix index -------------------------------------------------
+
+    def _manifest_version(self, db: Session) -> Optional[Tuple[Any, ...]]:
+        table = SyncManifest.__table__
+        row = db.execute(
+            select(table.c.file_sha256, table.c.synced_at).where(table.c.catalog == "codes")
+        ).first()
+        return tuple(row) if row else None
+
+    def prefix_index(self, db: Session) -> CodePrefixIndex:
+        now = time.monotonic()
+        if self._prefix is not None and now - self._checked_at < self.check_interval:
+            return self._prefix
+        with self._lock:
+            if self._prefix is not None and now - self._checked_at < self.check_interval:
+                return self._prefix
+            try:
+                version = self._manifest_version(db)
+            except DBAPIError:
+                db.rollback()
+                version = None  # no manifest table yet: reload on every check
+            if self._prefix is None or version is None or version != self._version:
+                codes = Code.__table__
+                rows = db.execute(
+                    select(codes.c.id, codes.c.code, codes.c.name, codes.c.description, codes.c.is_active)
+                ).all()
+                self._prefix = CodePrefixIndex([CodeHit(*r) for r in rows])
+                self._version = version
+            self._checked_at = now
+            return self._prefix
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = 0.0
+            self._version = None
+
+    def _prefix_search(self, db: Session, prefix: str, limit: int, active_only: bool) -> List[CodeHit]:
+        watcher = get_snapshot_watcher()
+        snapshot = watcher.current() if watcher is not None else None
+        if snapshot is not None:
+            return [CodeHit(*r) for r in snapshot.codes_with_prefix(prefix, limit, active_only)]
+        return self.prefix_index(db).search(prefix, limit, active_only)
+
+    # ---- full text ----------------------------------------------------
+
+    def _fulltext(self, db: Session, tokens: List[str], limit: int, active_only: bool) -> List[CodeHit]:
+        dialect = db.get_bind().dialect.name
+        active = " AND c.is_active" if active_only else ""
+        if dialect == "sqlite":
+            # Every token must match; the last one also as a prefix ("consul" -> consultation)
+            match = " ".join(f'"{t}"*' for t in tokens)
+            sql = text(
+                "SELECT c.id, c.code, c.name, c.description, c.is_active "
+                "FROM codes_fts JOIN codes c ON c.id = codes_fts.rowid "
+                f"WHERE codes_fts MATCH :match{active} "
+                "ORDER BY bm25(codes_fts, 10.0, 5.0, 1.0) LIMIT :limit"
+            )
+            params: Dict[str, Any] = {"match": match, "limit": limit}
+        elif dialect == "postgresql":
+            sql = text(
+                "SELECT c.id, c.code, c.name, c.description, c.is_active "
+                "FROM codes c, to_tsquery('french', :tsq) AS q "
+                "WHERE (to_tsvector('french', coalesce(c.code, '') || ' ' || coalesce(c.name, '') || ' ' "
+                "|| coalesce(c.description, '')) @@ q OR c.name % :raw)"
+                f"{active} "
+                "ORDER BY greatest(ts_rank(to_tsvector('french', coalesce(c.code, '') || ' ' "
+                "|| coalesce(c.name, '') || ' ' || coalesce(c.description, '')), q), similarity(c.name, :raw)) DESC, "
+                "c.code LIMIT :limit"
+            )
+            params = {"tsq": " & ".join(f"{t}:*" for t in tokens), "raw": " ".join(tokens), "limit": limit}
+        else:
+            raise LookupError(dialect)
+        return [CodeHit(*r) for r in db.execute(sql, params)]
+
+    def _like(self, db: Session, tokens: List[str], limit: int, active_only: bool) -> List[CodeHit]:
+        codes = Code.__table__
+        query = select(codes.c.id, codes.c.code, codes.c.name, codes.c.description, codes.c.is_active)
+        for t in tokens:
+            pattern = f"%{t}%"
+            query = query.where(or_(
+                codes.c.code.ilike(pattern), codes.c.name.ilike(pattern), codes.c.description.ilike(pattern),
+            ))
+        if active_only:
+            query = query.where(codes.c.is_active.is_(True))
+        return [CodeHit(*r) for r in db.execute(query.order_by(codes.c.code).limit(limit))]
+
+    def _text_search(self, db: Session, tokens: List[str], limit: int, active_only: bool) -> List[CodeHit]:
+        try:
+            return self._fulltext(db, tokens, limit, active_only)
+        except (DBAPIError, LookupError):
+            # No search index in this database (or another dialect)
+            db.rollback()
+        return self._like(db, tokens, limit, active_only)
+
+    # ---- entry point --------------------------------------------------
+
+    def search(self, db: Session, q: str, limit: int = 20, active_only: bool = True) -> List[CodeHit]:
+        """
+        Ranked matches for `q`: code-number prefix matches first, then full-text matches.
+        """
+        q = q.strip()
+        hits: List[CodeHit] = []
+        if q and " " not in q:
+            hits = self._prefix_search(db, q, limit, active_only)
+        if len(hits) < limit:
+            tokens = _TOKEN.findall(q.lower())
+            if tokens:
+                seen = {h.id for h in hits}
+                for hit in self._text_search(db, tokens, limit, active_only):
+                    if hit.id not in seen and len(hits) < limit:
+                        hits.append(hit)
+                        seen.add(hit.id)
+        return hits
+
+
+CODE_SEARCH = CodeSearch()
@@ -0,0 +1,131 @@
+# C:\Users\monti\Projects\DashValidator\app\services\compressed.py
+from __future__ import annotations
+
+import gzip
+import io
+import os
+import zipfile
+import zlib
+from itertools import chain
+from typing import BinaryIO, Callable, Iterator, Optional, TextIO, Tuple
+
+# Largest decompressed CSV accepted from a gzip/ZIP upload (guards against zip bombs)
+MAX_DECOMPRESSED_BYTES = int(os.getenv("UPLOAD_MAX_DECOMPRESSED_MB", "2048")) * 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZIP_MAGIC = b"PK\x03\x04"
+_READ_BUFFER = 1024 * 1024
+
+
+class DecompressedSizeError(ValueError):
+    """The decompressed upload is larger than the configured limit."""
+
+
+class ArchiveMemberError(ValueError):
+    """A ZIP upload that does not hold exactly one file."""
+
+
+# Raised while reading a truncated, corrupt or (ZIP) multi-file upload
+CORRUPT_ARCHIVE_ERRORS = (EOFError, OSError, zlib.error, zipfile.BadZipFile, ArchiveMemberError)
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """
+    'gzip' or 'zip' from the first bytes of a file (magic numbers, not the file name), else None.
+    """
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_ZIP_MAGIC):
+        return "zip"
+    return None
+
+
+class _LimitedReader(io.RawIOBase):
+    """
+    Counts the bytes read from `raw` and raises DecompressedSizeError past `limit`, so a
+    bomb is stopped after at most `limit` bytes instead of being expanded in full. `on_read`
+    gets the running count after every read (and may raise to stop decompressing).
+    """
+
+    def __init__(self, raw: BinaryIO, limit: int, on_read: Optional[Callable[[int], None]] = None):
+        self._raw = raw
+        self._limit = limit
+        self._on_read = on_read
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        n = len(data)
+        self.bytes_read += n
+        if self.bytes_read > self._limit:
+            raise DecompressedSizeError(
+                f"Decompressed upload exceeds {self._limit / (1024 * 1024):g} MB."
+            )
+        if self._on_read is not None:
+            self._on_read(self.bytes_read)
+        buffer[:n] = data
+        return n
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def _zip_member(fileobj: BinaryIO, limit: int) -> BinaryIO:
+    archive = zipfile.ZipFile(fileobj)
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+    ]
+    if len(members) != 1:
+        raise ArchiveMemberError(f"ZIP upload must contain exactly one CSV file (found {len(members)}).")
+    # Declared sizes can lie: the reader still enforces the limit while decompressing
+    if members[0].file_size > limit:
+        raise DecompressedSizeError(f"Decompressed upload exceeds {limit / (1024 * 1024):g} MB.")
+    return archive.open(members[0])
+
+
+def open_decompressed(
+    fileobj: BinaryIO, limit: int = MAX_DECOMPRESSED_BYTES, on_read: Optional[Callable[[int], None]] = None
+) -> Tuple[BinaryIO, Optional[str]]:
+    """
+    (stream, compression) for an uploaded or local file positioned at its start.
+
+    Plain files are returned as is. gzip and single-member ZIP files are decompressed lazily
+    while the stream is read, at most `limit` bytes; `on_read` is called with the number of
+    decompressed bytes so far (e.g. to grow a memory reservation). ZIP needs a seekable file (uploads are
+    spooled to a temporary file, so they are).
+    """
+    head = fileobj.read(4)
+    fileobj.seek(0)
+    compression = detect_compression(head)
+    if compression == "gzip":
+        raw: BinaryIO = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    elif compression == "zip":
+        raw = _zip_member(fileobj, limit)
+    else:
+        return fileobj, None
+    return io.BufferedReader(_LimitedReader(raw, limit, on_read), _READ_BUFFER), compression
+
+
+def open_text(
+    fileobj: BinaryIO, limit: int = MAX_DECOMPRESSED_BYTES, on_read: Optional[Callable[[int], None]] = None
+) -> Tuple[TextIO, Optional[str]]:
+    """
+    Text stream over a possibly compressed CSV, decoded like plain uploads (UTF-8, BOM
+    trimmed, undecodable bytes replaced). newline="" as the csv module expects.
+    """
+    stream, compression = open_decompressed(fileobj, limit, on_read)
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=""), compression
+
+
+def peek_text(stream: TextIO, size: int) -> Tuple[str, Iterator[str]]:
+    """
+    (head, lines): the first `size` characters of `stream` completed to a full line, for
+    sniffing, and an iterator over all lines of the stream, head included.
+    """
+    head = stream.read(size) + stream.readline()
+    return head, chain(io.StringIO(head, newline=""), stream)
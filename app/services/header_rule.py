@@ -2,27 +2,35 @@
 from __future__ import annotations
 
 import json
-import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from app.services.rule_snapshot import RuleSnapshot, get_snapshot_watcher
+
+# Code of the header rule in the rules table (and in rule snapshots)
+HEADER_RULE_CODE = "required_headers"
+
 
 def _get_engine() -> Engine:
     """
-    Create an Engine from DATABASE_URL if present, else default to local SQLite app.db.
+    Shared read engine from the app's registry (DATABASE_READ_URL, else DATABASE_URL).
     """
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        # Default to local SQLite in project root
-        db_url = "sqlite:///app.db"
-    return create_engine(db_url, pool_pre_ping=True)
+    # Imported here: app.database requires DATABASE_URL at import time
+    from app.database import get_engine
+    return get_engine(read_only=True)
+
+
+def _current_snapshot() -> Optional[RuleSnapshot]:
+    watcher = get_snapshot_watcher()
+    return watcher.current() if watcher is not None else None
 
 
 def load_required_headers(engine: Engine | None = None) -> Dict[str, Any]:
     """
-    Load 'required_headers' rule from the rules table.
+    Load 'required_headers' rule from the rules table, or from the shared rule snapshot when
+    RULE_SNAPSHOT_PATH is set and no engine is given (workers then share one copy).
     Returns a dict with keys:
       - required_headers: List[str]
       - delimiter: str
@@ -31,17 +39,23 @@ def load_required_headers(engine: Engine | None = None) -> Dict[str, Any]:
       - trim_whitespace: bool
     Raises RuntimeError if rule not found or malformed.
     """
-    engine = engine or _get_engine()
-    with engine.connect() as conn:
-        row = conn.execute(
-            text("SELECT params FROM rules WHERE name = :n"),
-            {"n": "required_headers"},
-        ).fetchone()
-
-    if not row:
-        raise RuntimeError("Required Headers rule not found in DB (name='required_headers').")
-
-    params_text = row[0]
+    snapshot = _current_snapshot() if engine is None else None
+    if snapshot is not None:
+        params_text = snapshot.rule_configs.get(HEADER_RULE_CODE)
+        if params_text is None:
+            raise RuntimeError(f"Required Headers rule not found in rule snapshot {snapshot.path} (code='{HEADER_RULE_CODE}').")
+    else:
+        engine = engine or _get_engine()
+        with engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT config_json FROM rules WHERE code = :c AND is_active"),
+                {"c": HEADER_RULE_CODE},
+            ).fetchone()
+
+        if not row:
+            raise RuntimeError(f"Required Headers rule not found in DB (code='{HEADER_RULE_CODE}').")
+
+        params_text = row[0]
     try:
         params = json.loads(params_text)
     except Exception as e:
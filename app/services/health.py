@@ -0,0 +1,133 @@
+# C:\Users\monti\Projects\DashValidator\app\services\health.py
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.rule_cache import rule_cache_status
+from app.services.stats import pool_stats
+
+
+class ProbeResult(NamedTuple):
+    checked_at: float  # time.time()
+    ok: bool
+    latency_ms: float
+    error: Optional[str]
+
+
+class HealthProber:
+    """
+    Probes the database with SELECT 1 every `interval` seconds from a background task and keeps
+    the last `history` results, so health endpoints answer from memory instead of each probe
+    opening a session. The probe itself runs in a thread to keep the event loop free.
+
+    A result older than `stale_after` seconds (the prober stopped or the DB call hangs) is
+    reported as degraded.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        engine,
+        interval: float = 10.0,
+        history: int = 60,
+        stale_after: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else interval * 3
+        self.history: Deque[ProbeResult] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, session_factory: Callable[[], Session], engine) -> "HealthProber":
+        return cls(
+            session_factory,
+            engine,
+            interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "10")),
+            history=int(os.getenv("HEALTH_PROBE_HISTORY", "60")),
+        )
+
+    def probe_once(self) -> ProbeResult:
+        started = time.perf_counter()
+        try:
+            with self.session_factory() as session:
+                session.execute(text("SELECT 1"))
+            result = ProbeResult(time.time(), True, (time.perf_counter() - started) * 1000, None)
+        except Exception as exc:
+            result = ProbeResult(time.time(), False, (time.perf_counter() - started) * 1000, str(exc))
+        with self._lock:
+            self.history.append(result)
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.probe_once)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def status_async(self) -> Dict[str, Any]:
+        """
+        status() for async endpoints: the first probe, if none ran yet, runs in a thread.
+        """
+        if not self.history:
+            await asyncio.to_thread(self.probe_once)
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Health payload from the cached probes. Probes synchronously only if none ran yet
+        (e.g. the app was started without its lifespan).
+        """
+        with self._lock:
+            results: List[ProbeResult] = list(self.history)
+        if not results:
+            results = [self.probe_once()]
+        last = results[-1]
+        age = max(time.time() - last.checked_at, 0.0)
+        stale = age > self.stale_after
+        db_status = "ok" if last.ok and not stale else ("stale" if last.ok else "error")
+
+        latencies = sorted(r.latency_ms for r in results if r.ok)
+        return {
+            "status": "ok" if db_status == "ok" else "degraded",
+            "uptime_check": "ok",
+            "db": {
+                "status": db_status,
+                "latency_ms": round(last.latency_ms, 2),
+                "error": last.error,
+                "checked_at": datetime.fromtimestamp(last.checked_at, timezone.utc).isoformat(timespec="seconds"),
+                "age_s": round(age, 3),
+            },
+            "db_history": {
+                "probes": len(results),
+                "failures": sum(1 for r in results if not r.ok),
+                "latency_ms_p50": round(latencies[len(latencies) // 2], 2) if latencies else None,
+                "latency_ms_max": round(latencies[-1], 2) if latencies else None,
+                "recent_latency_ms": [round(r.latency_ms, 2) for r in results[-10:]],
+            },
+            "pool": pool_stats(self.engine),
+            "rule_caches": rule_cache_status(),
+        }
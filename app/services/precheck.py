@@ -0,0 +1,192 @@
+# C:\Users\monti\Projects\DashValidator\app\services\precheck.py
+from __future__ import annotations
+
+import codecs
+import os
+import re
+from collections import Counter
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.validators import _parse_clock, _parse_service_date
+
+# Most body bytes a precheck reads, whatever the row count
+PRECHECK_MAX_BYTES = int(os.getenv("PRECHECK_MAX_BYTES", str(1024 * 1024)))
+# Data rows sampled after the header row by default
+PRECHECK_DEFAULT_ROWS = 100
+# Bytes of multipart preamble (boundaries, part headers, form fields) tolerated before the file
+_MAX_PREAMBLE = 64 * 1024
+
+_BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_FILENAME = re.compile(r'filename="([^"]*)"', re.IGNORECASE)
+_INTEGER = re.compile(r"-?\d+")
+_DECIMAL = re.compile(r"-?\d+[.,]\d+")
+# "1 234,56 $", "12,00$", "1,234.56"
+_AMOUNT = re.compile(r"-?\d[\d \xa0\u202f.,]*\s*\$?|-?\$\s*\d[\d,.]*")
+
+# Expected kind of the columns the validators parse; a mismatch is reported as a warning
+EXPECTED_KINDS: Dict[str, Tuple[str, ...]] = {
+    "Date de Service": ("date",),
+    "Début": ("time",),
+    "Fin": ("time",),
+    "Unités": ("integer", "decimal"),
+    "Montant Preliminaire": ("integer", "decimal", "amount"),
+    "Montant payé": ("integer", "decimal", "amount"),
+}
+
+
+class Sample(NamedTuple):
+    data: bytes              # start of the file: the header row and whole sampled rows
+    complete: bool           # True when the whole file fit in the sample
+    filename: Optional[str]
+    bytes_read: int          # request body bytes consumed
+
+
+def _line_end(buf: bytes, max_lines: int) -> Optional[int]:
+    """
+    Offset just past the `max_lines`-th newline of buf, or None if it has fewer lines.
+    """
+    pos = -1
+    for _ in range(max_lines):
+        pos = buf.find(b"\n", pos + 1)
+        if pos < 0:
+            return None
+    return pos + 1
+
+
+def sample_bytes(data: bytes, max_lines: int, complete: bool) -> Sample:
+    """
+    Sample of an in-memory (or already received) file.
+    """
+    end = _line_end(data, max_lines)
+    if end is not None and end < len(data):
+        return Sample(data[:end], False, None, end)
+    return Sample(data, complete, None, len(data))
+
+
+async def read_sample(
+    stream: AsyncIterator[bytes],
+    content_type: str,
+    max_lines: int,
+    max_bytes: int = PRECHECK_MAX_BYTES,
+) -> Sample:
+    """
+    Read a request body only until it holds `max_lines` lines of the uploaded file (or
+    `max_bytes`), then stop: the rest of the body is never received.
+
+    Accepts a raw CSV body or multipart/form-data, in which case the first part with a
+    filename is sampled.
+    """
+    match = _BOUNDARY.search(content_type or "") if "multipart/" in (content_type or "").lower() else None
+    delimiter = b"\r\n--" + match.group(1).encode("latin-1") if match else None
+    buf = bytearray()
+    read = 0
+    filename: Optional[str] = None
+    in_file = delimiter is None
+    async for chunk in stream:
+        read += len(chunk)
+        buf += chunk
+        while not in_file:
+            # Next part: "--boundary\r\n<headers>\r\n\r\n<content>"
+            start = buf.find(delimiter[2:])
+            headers_end = buf.find(b"\r\n\r\n", start) if start >= 0 else -1
+            if headers_end < 0:
+                if len(buf) > _MAX_PREAMBLE:
+                    raise ValueError("No file part found at the start of the multipart body.")
+                break
+            part_headers = bytes(buf[start:headers_end]).decode("utf-8", errors="replace")
+            del buf[:headers_end + 4]
+            name = _FILENAME.search(part_headers)
+            if name:
+                filename = name.group(1)
+                in_file = True
+        if not in_file:
+            continue
+        if delimiter is not None:
+            end = buf.find(delimiter)
+            if end >= 0:
+                # Closing boundary already received: the whole file is in the buffer
+                return sample_bytes(bytes(buf[:end]), max_lines, True)._replace(filename=filename, bytes_read=read)
+        if _line_end(buf, max_lines) is not None or len(buf) >= max_bytes:
+            return sample_bytes(bytes(buf[:max_bytes]), max_lines, False)._replace(filename=filename, bytes_read=read)
+    if not in_file:
+        raise ValueError("No file part found in the multipart body.")
+    return sample_bytes(bytes(buf), max_lines, True)._replace(filename=filename, bytes_read=read)
+
+
+def decode_sample(sample: Sample) -> Tuple[str, str]:
+    """
+    (text, encoding) of a sample: 'utf-8-sig', 'utf-8', or 'cp1252' for files that are not
+    valid UTF-8 (Excel "CSV" exports on Windows). A trailing partial line is dropped.
+    """
+    data = sample.data
+    if not sample.complete:
+        cut = data.rfind(b"\n")
+        data = data[:cut + 1] if cut >= 0 else data
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace"), "utf-8-sig"
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace"), "cp1252"
+
+
+def value_kind(value: str) -> str:
+    """
+    Kind of one CSV value: empty, integer, decimal, amount, date, time or text.
+    """
+    s = value.strip()
+    if not s:
+        return "empty"
+    if _INTEGER.fullmatch(s):
+        return "integer"
+    if _DECIMAL.fullmatch(s):
+        return "decimal"
+    if (":" in s or "h" in s.lower()) and _parse_clock(s) is not None:
+        return "time"
+    if _parse_service_date(s) is not None:
+        return "date"
+    if _AMOUNT.fullmatch(s):
+        return "amount"
+    return "text"
+
+
+def _column_kind(kinds: Counter) -> str:
+    kinds.pop("empty", None)
+    if not kinds:
+        return "empty"
+    if len(kinds) == 1:
+        return next(iter(kinds))
+    if set(kinds) <= {"integer", "decimal"}:
+        return "decimal"
+    if set(kinds) <= {"integer", "decimal", "amount"}:
+        return "amount"
+    return "mixed"
+
+
+def sniff_column_types(headers: Sequence[str], rows: Sequence[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Kind of each column over the sampled rows ('mixed' when the values disagree).
+    """
+    return {h: _column_kind(Counter(value_kind(row.get(h) or "") for row in rows)) for h in headers}
+
+
+def check_column_types(column_types: Dict[str, str], rows: Sequence[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Warnings for known columns whose sampled values do not parse as the validators expect.
+    """
+    warnings: List[Dict[str, str]] = []
+    for column, expected in EXPECTED_KINDS.items():
+        found = column_types.get(column)
+        if found is None or found == "empty" or found in expected:
+            continue
+        example = next(
+            (row[column] for row in rows if value_kind(row.get(column) or "") not in expected + ("empty",)), ""
+        )
+        warnings.append({
+            "rule": "column_type",
+            "message": f"Column '{column}' looks like {found}, expected {' or '.join(expected)} (e.g. '{example}')",
+            "column": column,
+            "expected": "/".join(expected),
+            "found": found,
+        })
+    return warnings
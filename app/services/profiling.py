@@ -0,0 +1,248 @@
+# C:\Users\monti\Projects\DashValidator\app\services\profiling.py
+from __future__ import annotations
+
+import cProfile
+import hmac
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+FORMATS = ("collapsed", "pstats")
+OUTPUTS = ("file", "attachment")
+
+
+class StackSampler:
+    """
+    Sampling profiler: a background thread records the stack of every other thread each
+    `interval` seconds and aggregates them as collapsed stacks ("outer;inner count"), the input
+    format of flamegraph.pl and speedscope. Unlike cProfile it also sees work running in
+    threadpools, at the cost of including whatever else the worker is doing at the time.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> bytes:
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Session:
+    """
+    One profiled request: cProfile (pstats output) or StackSampler (collapsed output).
+    """
+
+    def __init__(self, fmt: str, interval: float):
+        self.format = fmt
+        self._profile = cProfile.Profile() if fmt == "pstats" else None
+        self._sampler = StackSampler(interval) if fmt == "collapsed" else None
+
+    def start(self) -> None:
+        if self._profile is not None:
+            self._profile.enable()
+        else:
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        else:
+            self._sampler.stop()
+
+    def dump(self) -> bytes:
+        if self._profile is not None:
+            # Same bytes as Profile.dump_stats(): load with pstats.Stats(path)
+            self._profile.create_stats()
+            return marshal.dumps(self._profile.stats)
+        return self._sampler.collapsed()
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def profiling_options_from_env() -> Optional[Dict[str, Any]]:
+    """
+    ProfilingMiddleware options from PROFILING_TOKEN / PROFILING_ENABLED / PROFILE_DIR /
+    PROFILE_SAMPLE_INTERVAL_MS, or None when profiling is not configured at all.
+    """
+    token = os.getenv("PROFILING_TOKEN") or None
+    allow_without_token = _env_flag("PROFILING_ENABLED")
+    if not token and not allow_without_token:
+        return None
+    return {
+        "token": token,
+        "allow_without_token": allow_without_token,
+        "directory": os.getenv("PROFILE_DIR", "profiles"),
+        "sample_interval": float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000,
+    }
+
+
+def diagnostics_allowed(token: Optional[str]) -> bool:
+    """
+    Whether a request may turn on process-wide diagnostics such as ?memory=true (tracemalloc
+    slows every request of the worker): same rules as profiling, with the token sent in the
+    X-Profiling-Token header.
+    """
+    options = profiling_options_from_env()
+    if options is None:
+        return False
+    if options["token"]:
+        return bool(token) and hmac.compare_digest(token.encode("utf-8"), options["token"].encode("utf-8"))
+    return options["allow_without_token"]
+
+
+def _first(values: Dict[str, List[str]], name: str) -> Optional[str]:
+    found = values.get(name)
+    return found[0] if found else None
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single /ingest or /metrics/* request on demand.
+
+    A request opts in with the `X-Profile` header or `?profile=` query parameter, whose value
+    must equal PROFILING_TOKEN. With PROFILING_ENABLED=1 (staging) any non-empty value works.
+    Options, as headers or query parameters:
+
+        X-Profile-Format / profile_format   collapsed (sampling, default) or pstats (cProfile)
+        X-Profile-Output / profile_output   file (default): written to PROFILE_DIR, file name
+                                            in the X-Profile-File response header
+                                            attachment: the profile replaces the response body;
+                                            the endpoint's status is in X-Profiled-Status
+
+    Parsing and validation run in threadpools, which only the sampler sees. cProfile only
+    sees the event loop thread, and it slows every request served on that loop while it runs:
+    pstats is for profiling the async parts. Only one request per worker is profiled at a
+    time (409 otherwise). Register the middleware only when profiling is configured, so that
+    unprofiled deployments pay nothing.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: Optional[str] = None,
+        allow_without_token: bool = False,
+        directory: str = "profiles",
+        sample_interval: float = 0.005,
+        prefixes: Tuple[str, ...] = ("/ingest", "/metrics/"),
+    ):
+        self.app = app
+        self.token = token
+        self.allow_without_token = allow_without_token
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.prefixes = prefixes
+        self._busy = threading.Lock()
+
+    def _authorized(self, value: str) -> bool:
+        if self.token:
+            return hmac.compare_digest(value.encode("utf-8"), self.token.encode("utf-8"))
+        return self.allow_without_token
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        requested = headers.get("x-profile") or _first(query, "profile")
+        if not requested:
+            await self.app(scope, receive, send)
+            return
+        if not self._authorized(requested):
+            await JSONResponse(status_code=403, content={"detail": "Invalid profiling token."})(scope, receive, send)
+            return
+
+        fmt = headers.get("x-profile-format") or _first(query, "profile_format") or "collapsed"
+        output = headers.get("x-profile-output") or _first(query, "profile_output") or "file"
+        if fmt not in FORMATS or output not in OUTPUTS:
+            detail = f"profile_format must be one of {FORMATS}, profile_output one of {OUTPUTS}."
+            await JSONResponse(status_code=400, content={"detail": detail})(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            detail = "Another request is being profiled on this worker; retry later."
+            await JSONResponse(status_code=409, content={"detail": detail})(scope, receive, send)
+            return
+
+        try:
+            await self._profiled(scope, receive, send, fmt, output)
+        finally:
+            self._busy.release()
+
+    async def _profiled(self, scope: Scope, receive: Receive, send: Send, fmt: str, output: str) -> None:
+        endpoint = scope["path"].strip("/").replace("/", "_") or "root"
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        extension = "pstats" if fmt == "pstats" else "txt"
+        filename = f"{endpoint}-{stamp}-{uuid.uuid4().hex[:8]}.{extension}"
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if output == "attachment":
+                # Swallow the endpoint's own response; the profile is sent instead
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                return
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-file", filename.encode("latin-1"))]
+            await send(message)
+
+        session = _Session(fmt, self.sample_interval)
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.stop()
+            data = session.dump()
+            if output == "file":
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, filename), "wb") as f:
+                    f.write(data)
+
+        if output == "attachment":
+            response = Response(
+                content=data,
+                media_type="application/octet-stream" if fmt == "pstats" else "text/plain; charset=utf-8",
+                headers={
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                    "X-Profiled-Status": str(status_code),
+                },
+            )
+            await response(scope, receive, send)
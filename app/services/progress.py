@@ -0,0 +1,249 @@
+# C:\Users\monti\Projects\DashValidator\app\services\progress.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Union
+
+# Finished jobs stay visible this long, so a stream opened late still gets the final state
+PROGRESS_KEEP_SECONDS = 120.0
+# Jobs publish their counters here so a stream served by another worker can follow them;
+# every worker must see the same directory (like UPLOAD_DIR). Empty: this process only.
+PROGRESS_DIR = os.getenv("PROGRESS_DIR", "progress")
+# Shortest interval between two writes of a job's file (finishing always writes)
+_PUBLISH_SECONDS = 0.5
+# Files left behind by workers that died mid-job
+_FILE_TTL_SECONDS = 24 * 3600.0
+# Rough split of an /ingest run between parsing and validation, used for percent and ETA
+_PARSE_SHARE = 0.4
+
+_JOB_ID = re.compile(r"[A-Za-z0-9_-]{8,64}")
+
+
+class Progress:
+    """
+    Counters of one long-running job (an /ingest request or a chunked upload).
+
+    Parse and validate loops update them in batches (every few thousand rows, every rule step
+    or shard) with plain attribute stores, no locking: readers only need a recent view.
+    Streams poll snapshot() at their own pace. With a directory, the snapshot is also written
+    to <directory>/<id>.json, at most every _PUBLISH_SECONDS and when the job finishes.
+    """
+
+    def __init__(self, job_id: str, kind: str, directory: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.directory = directory
+        self._published = 0.0
+        self.stage = "receiving"
+        self.bytes_total: Optional[int] = None
+        self.bytes_read = 0
+        self.rows_expected: Optional[int] = None
+        self.rows_parsed = 0
+        self.units_total = 0     # validation steps (serial) or shard tasks (sharded)
+        self.units_done = 0
+        self.errors = 0
+        self.status: Optional[int] = None  # HTTP status once finished
+        self.started = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    # ---- writers (job side) --------------------------------------------
+
+    def parsed(self, rows: int, bytes_read: Optional[int] = None) -> None:
+        self.stage = "parsing"
+        self.rows_parsed = rows
+        if bytes_read is not None:
+            self.bytes_read = bytes_read
+        self._publish()
+
+    def validation_started(self, units: int) -> None:
+        self.stage = "validating"
+        self.units_total = units
+        self.units_done = 0
+        self.errors = 0
+        self._publish()
+
+    def unit_done(self, errors: int) -> None:
+        self.units_done += 1
+        self.errors += errors
+        self._publish()
+
+    def finish(self, status: int, errors: Optional[int] = None) -> None:
+        if errors is not None:
+            self.errors = errors
+        self.status = status
+        self.stage = "done" if status < 400 else "failed"
+        self.finished_at = time.monotonic()
+        self._publish(force=True)
+
+    def _publish(self, force: bool = False) -> None:
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._published < _PUBLISH_SECONDS:
+            return
+        self._published = now
+        path = os.path.join(self.directory, f"{self.id}.json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        snapshot = self.snapshot()
+        try:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+            except FileNotFoundError:
+                # Created by the first job that publishes, not at import (CLI, scripts)
+                os.makedirs(self.directory, exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # progress is best effort: never fail the job over it
+
+    # ---- readers (stream side) -----------------------------------------
+
+    def _parse_fraction(self) -> Optional[float]:
+        if self.stage in ("validating", "done"):
+            return 1.0
+        if self.rows_expected:
+            return min(self.rows_parsed / self.rows_expected, 1.0)
+        if self.bytes_total:
+            return min(self.bytes_read / self.bytes_total, 1.0)
+        return None
+
+    def fraction(self) -> Optional[float]:
+        if self.stage == "done":
+            return 1.0
+        parse = self._parse_fraction()
+        if parse is None:
+            return None
+        validate = self.units_done / self.units_total if self.units_total else 0.0
+        return _PARSE_SHARE * parse + (1 - _PARSE_SHARE) * validate
+
+    def snapshot(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started
+        fraction = self.fraction()
+        eta = None
+        if fraction and self.finished_at is None:
+            eta = round(elapsed * (1 - fraction) / fraction, 1)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "stage": self.stage,
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "rows_parsed": self.rows_parsed,
+            "rows_expected": self.rows_expected,
+            "validation_done": self.units_done,
+            "validation_total": self.units_total,
+            "errors": self.errors,
+            "percent": round(fraction * 100, 1) if fraction is not None else None,
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": eta,
+            "status": self.status,
+        }
+
+
+class PublishedProgress:
+    """
+    A job running in another worker, read back from the file it publishes.
+    """
+
+    def __init__(self, path: str, snapshot: Dict[str, Any]):
+        self.path = path
+        self._snapshot = snapshot
+
+    @property
+    def finished_at(self) -> Optional[float]:
+        return None if self._snapshot.get("status") is None else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._snapshot = json.load(f)
+        except (OSError, ValueError):
+            pass  # being replaced, or purged: keep the last state read
+        return self._snapshot
+
+
+class ProgressRegistry:
+    """
+    Jobs by id. Ids may be chosen by the client (so it can open the stream before the upload
+    starts) or generated. Jobs of this process are tracked in memory; with a directory, jobs
+    of other workers sharing it are found through their published files.
+    """
+
+    def __init__(self, keep_seconds: float = PROGRESS_KEEP_SECONDS, directory: Optional[str] = PROGRESS_DIR):
+        self.keep_seconds = keep_seconds
+        self.directory = directory or None
+        self._jobs: Dict[str, Progress] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    @staticmethod
+    def valid_id(job_id: str) -> bool:
+        return bool(_JOB_ID.fullmatch(job_id))
+
+    def start(self, kind: str, job_id: Optional[str] = None) -> Progress:
+        """
+        Register a job. Raises ValueError for a malformed id or one that is still running.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        if not self.valid_id(job_id):
+            raise ValueError("progress_id must be 8-64 characters of A-Z, a-z, 0-9, '_' or '-'.")
+        now = time.monotonic()
+        with self._lock:
+            for jid in [j for j, p in self._jobs.items() if p.finished_at and now - p.finished_at > self.keep_seconds]:
+                del self._jobs[jid]
+                self._remove_file(jid)
+            current = self._jobs.get(job_id)
+            if current is not None and current.finished_at is None:
+                raise ValueError(f"Job {job_id} is already running.")
+            progress = Progress(job_id, kind, self.directory)
+            self._jobs[job_id] = progress
+        self._expire_files()
+        return progress
+
+    def get(self, job_id: str) -> Optional[Union[Progress, PublishedProgress]]:
+        progress = self._jobs.get(job_id)
+        if progress is not None or self.directory is None or not self.valid_id(job_id):
+            return progress
+        path = self._path(job_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return PublishedProgress(path, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._remove_file(job_id)
+
+    def _remove_file(self, job_id: str) -> None:
+        if self.directory is not None:
+            try:
+                os.remove(self._path(job_id))
+            except OSError:
+                pass
+
+    def _expire_files(self) -> None:
+        if self.directory is None:
+            return
+        cutoff = time.time() - _FILE_TTL_SECONDS
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+
+PROGRESS = ProgressRegistry()
@@ -0,0 +1,267 @@
+# C:\Users\monti\Projects\DashValidator\app\services\rule_cache.py
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, List, NamedTuple, Optional, Set, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.services.rule_snapshot import SnapshotWatcher, build_snapshot, get_snapshot_watcher
+from app.services.rule_versions import current_version
+from app.services.stats import record_cache
+from app.validators import FrequencyLimit, load_frequency_limits, load_required_companion_map
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Seconds a loaded rule set is served before the next request checks the rule-set version
+RULE_CACHE_TTL = float(os.getenv("RULE_CACHE_TTL", "60"))
+# Deadline of one DB rule load, and the circuit breaker around it: open after RULE_DB_FAILURES
+# consecutive failures or timeouts, try the DB again after RULE_DB_RESET_SECONDS
+RULE_DB_TIMEOUT = float(os.getenv("RULE_DB_TIMEOUT_MS", "1500")) / 1000
+RULE_DB_FAILURES = int(os.getenv("RULE_DB_FAILURES", "3"))
+RULE_DB_RESET_SECONDS = float(os.getenv("RULE_DB_RESET_SECONDS", "30"))
+# Local last-known-good snapshot, rewritten after DB reloads and used while the DB is down.
+# Empty disables it.
+RULE_LKG_PATH = os.getenv("RULE_LKG_PATH", "rules.lkg")
+
+
+class RulesUnavailable(RuntimeError):
+    """The database is unreachable and no last-known-good snapshot exists."""
+
+
+class RuleCache(Generic[T]):
+    """
+    Time-bounded cache of one DB-driven rule set, shared by all requests of a worker.
+
+    Once the TTL expires, the next request opens a session from the given factory and, under a
+    lock, reads the rule-set version (app.services.rule_versions): the loader only runs when it
+    changed, or on first use, invalidate() or a database without version stamps. A burst of
+    uploads therefore triggers a single check. Cached values are shared: callers must treat
+    them as read-only.
+    """
+
+    def __init__(self, name: str, loader: Callable[[Session], T], ttl: float = RULE_CACHE_TTL):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._loaded_at: Optional[float] = None
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    @property
+    def fresh(self) -> bool:
+        return self._fresh()
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def get(self, session_factory: Callable[[], Session]) -> T:
+        if self._fresh():
+            self.hits += 1
+            record_cache(self.name, 1, 0)
+            return self._value
+        with self._lock:
+            if not self._fresh():
+                with session_factory() as db:
+                    version = current_version(db)
+                    if self._loaded_at is not None and version is not None and version == self._version:
+                        self.revalidations += 1
+                        record_cache(self.name, 1, 0)
+                    else:
+                        self._value = self.loader(db)
+                        self.misses += 1
+                        record_cache(self.name, 0, 1)
+                self._version = version
+                self._loaded_at = time.monotonic()
+            else:
+                self.hits += 1
+                record_cache(self.name, 1, 0)
+            return self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._version = None
+
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def status(self) -> Dict[str, Any]:
+        age = self.age_seconds()
+        return {
+            "age_s": round(age, 3) if age is not None else None,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "version": self._version,
+        }
+
+
+def _load_companions(db: Session) -> Dict[str, Set[str]]:
+    return dict(load_required_companion_map(db))
+
+
+COMPANION_RULES: RuleCache[Dict[str, Set[str]]] = RuleCache("required_companions", _load_companions)
+FREQUENCY_RULES: RuleCache[List[FrequencyLimit]] = RuleCache("frequency_limits", load_frequency_limits)
+
+RULE_CACHES: Dict[str, RuleCache] = {cache.name: cache for cache in (COMPANION_RULES, FREQUENCY_RULES)}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. Closed: calls go through. After `failures` failures in
+    a row it opens and allow() refuses calls for `reset_after` seconds, then lets a single trial
+    call through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, name: str, failures: int, reset_after: float):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self.opens = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._consecutive, "opens": self.opens}
+
+
+class LastKnownGood:
+    """
+    Rule snapshot (app.services.rule_snapshot format) on local disk, rewritten in the background
+    whenever the rules were reloaded from the DB, and read back only when the DB is unavailable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watcher = SnapshotWatcher(path)
+        self._saved_version: Optional[int] = None
+
+    def save(self, session_factory: Callable[[], Session], rule_version: Optional[int]) -> None:
+        if rule_version is not None and rule_version == self._saved_version:
+            return
+        try:
+            with session_factory() as db:
+                build_snapshot(db, self.path)
+            self._saved_version = rule_version
+        except Exception as exc:
+            logger.warning("Could not write last-known-good rules to %s: %s", self.path, exc)
+
+    def status(self) -> Dict[str, Any]:
+        return self.watcher.status()
+
+
+class RuleSet(NamedTuple):
+    companion_map: Dict[str, Set[str]]
+    frequency_limits: List[FrequencyLimit]
+    source: str               # "snapshot", "database" or "last_known_good"
+    version: Optional[str]    # snapshot version, when loaded from a snapshot
+
+
+RULE_DB_BREAKER = CircuitBreaker("rules_db", RULE_DB_FAILURES, RULE_DB_RESET_SECONDS)
+LAST_KNOWN_GOOD: Optional[LastKnownGood] = LastKnownGood(RULE_LKG_PATH) if RULE_LKG_PATH else None
+# Runs DB rule loads (so a hung connection cannot outlive RULE_DB_TIMEOUT in the request) and
+# last-known-good writes
+_RULE_LOADER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rule-loader")
+
+
+def _load_from_db(session_factory: Callable[[], Session]) -> RuleSet:
+    return RuleSet(
+        COMPANION_RULES.get(session_factory),
+        FREQUENCY_RULES.get(session_factory),
+        "database",
+        None,
+    )
+
+
+def _misses() -> int:
+    return sum(cache.misses for cache in RULE_CACHES.values())
+
+
+def load_rule_set(session_factory: Callable[[], Session]) -> RuleSet:
+    """
+    Rules for one validation run: from the shared snapshot file when RULE_SNAPSHOT_PATH is set
+    and readable (see app.services.rule_snapshot), else from the per-worker DB caches.
+
+    DB loads are bounded by RULE_DB_TIMEOUT and guarded by RULE_DB_BREAKER. When a load fails,
+    times out or the breaker is open, the last-known-good snapshot is used instead; raises
+    RulesUnavailable when there is none.
+    """
+    watcher = get_snapshot_watcher()
+    snapshot = watcher.current() if watcher is not None else None
+    if snapshot is not None:
+        return RuleSet(snapshot.companion_map, snapshot.frequency_limits, "snapshot", snapshot.version)
+
+    if all(cache.fresh for cache in RULE_CACHES.values()):
+        return _load_from_db(session_factory)  # served from memory, no DB round trip
+
+    if RULE_DB_BREAKER.allow():
+        misses = _misses()
+        try:
+            rule_set = _RULE_LOADER.submit(_load_from_db, session_factory).result(timeout=RULE_DB_TIMEOUT)
+        except Exception as exc:
+            RULE_DB_BREAKER.record_failure()
+            logger.warning("Loading rules from the database failed (%s): %s", type(exc).__name__, exc)
+        else:
+            RULE_DB_BREAKER.record_success()
+            if LAST_KNOWN_GOOD is not None and _misses() != misses:
+                _RULE_LOADER.submit(LAST_KNOWN_GOOD.save, session_factory, COMPANION_RULES.version)
+            return rule_set
+
+    snapshot = LAST_KNOWN_GOOD.watcher.current() if LAST_KNOWN_GOOD is not None else None
+    if snapshot is None:
+        raise RulesUnavailable("Rules could not be loaded from the database and no last-known-good snapshot exists.")
+    return RuleSet(snapshot.companion_map, snapshot.frequency_limits, "last_known_good", snapshot.version)
+
+
+def rule_cache_status() -> Dict[str, Dict[str, Any]]:
+    status = {name: cache.status() for name, cache in RULE_CACHES.items()}
+    status["database_breaker"] = RULE_DB_BREAKER.status()
+    if LAST_KNOWN_GOOD is not None:
+        status["last_known_good"] = LAST_KNOWN_GOOD.status()
+    watcher = get_snapshot_watcher()
+    if watcher is not None:
+        status["snapshot"] = watcher.status()
+    return status
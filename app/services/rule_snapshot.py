@@ -0,0 +1,212 @@
+# C:\Users\monti\Projects\DashValidator\app\services\rule_snapshot.py
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.validators import (
+    FREQUENCY_RULE_CODE,
+    FrequencyLimit,
+    load_required_companion_map,
+    parse_frequency_limits,
+    rules,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stored in the SQLite header (PRAGMA user_version): readers refuse other formats
+SNAPSHOT_FORMAT = 2
+# Upper bound of the file mapped into each worker; pages are shared through the OS page cache
+_MMAP_BYTES = 256 * 1024 * 1024
+
+
+def build_snapshot(db: Session, path: str) -> str:
+    """
+    Compile the DB-driven rules (companion codes, active rule configs including the header
+    rule, code catalog) into a read-only SQLite file at `path`, then atomically replace any previous snapshot.
+
+    The version is a digest of the content, so rebuilding unchanged rules yields the same
+    version. Returns it.
+    """
+    companions = sorted(
+        (code, req) for code, required in load_required_companion_map(db).items() for req in required
+    )
+    rule_rows = sorted(
+        (r.code, r.config_json)
+        for r in db.execute(rules.select().where(rules.c.is_active == True))  # noqa: E712
+    )
+    # Late import: readers of snapshots (and the offline CLI) run without DATABASE_URL
+    from app.models import Code
+
+    codes = Code.__table__
+    code_rows = sorted(
+        (r.code, r.id, r.name, r.description, bool(r.is_active))
+        for r in db.execute(select(codes.c.code, codes.c.id, codes.c.name, codes.c.description, codes.c.is_active))
+    )
+    digest = hashlib.sha256(json.dumps([companions, rule_rows, code_rows]).encode("utf-8"))
+    version = digest.hexdigest()[:16]
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+            CREATE TABLE companions (code TEXT NOT NULL, requires_code TEXT NOT NULL);
+            CREATE TABLE rules (code TEXT PRIMARY KEY, config_json TEXT) WITHOUT ROWID;
+            CREATE TABLE codes (
+                code TEXT PRIMARY KEY, id INTEGER NOT NULL, name TEXT NOT NULL, description TEXT,
+                is_active INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        conn.execute(f"PRAGMA user_version = {SNAPSHOT_FORMAT}")
+        conn.executemany("INSERT INTO companions VALUES (?, ?)", companions)
+        conn.executemany("INSERT INTO rules VALUES (?, ?)", rule_rows)
+        conn.executemany("INSERT INTO codes VALUES (?, ?, ?, ?, ?)", code_rows)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", version),
+            ("created_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    # Readers keep their open (old) file; new opens see the new one. POSIX semantics: on
+    # Windows the replace fails while a worker has the snapshot open.
+    os.replace(tmp, path)
+    return version
+
+
+class RuleSnapshot:
+    """
+    Read-only view of a snapshot file. The small rule maps (and the raw rule configs, header
+    rule included: see app.services.header_rule) are materialized on open; the code catalog
+    stays in the memory-mapped file and is queried on demand (see app.services.code_search).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        uri = Path(path).absolute().as_uri() + "?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            fmt = conn.execute("PRAGMA user_version").fetchone()[0]
+            if fmt != SNAPSHOT_FORMAT:
+                raise RuntimeError(f"Rule snapshot {path} has format {fmt}, expected {SNAPSHOT_FORMAT}.")
+            conn.execute(f"PRAGMA mmap_size = {_MMAP_BYTES}")
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            companion_map: Dict[str, Set[str]] = {}
+            for code, req in conn.execute("SELECT code, requires_code FROM companions"):
+                companion_map.setdefault(code, set()).add(req)
+            configs = dict(conn.execute("SELECT code, config_json FROM rules"))
+        except Exception:
+            conn.close()
+            raise
+        self._conn = conn
+        self._lock = threading.Lock()
+        self.version: str = meta["version"]
+        self.created_at: str = meta["created_at"]
+        self.companion_map = companion_map
+        self.rule_configs: Dict[str, Optional[str]] = configs
+        self.frequency_limits: List[FrequencyLimit] = parse_frequency_limits(configs.get(FREQUENCY_RULE_CODE))
+
+    def codes_with_prefix(
+        self, prefix: str, limit: int, active_only: bool = True
+    ) -> List[Tuple[int, str, str, Optional[str], bool]]:
+        """
+        (id, code, name, description, is_active) of the codes starting with `prefix`, in code
+        order like CodePrefixIndex.search: a range scan of the primary key in the mapped file.
+        """
+        sql = "SELECT id, code, name, description, is_active FROM codes WHERE code >= ?"
+        params: List[Any] = [prefix]
+        if prefix:
+            sql += " AND code < ?"
+            params.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if active_only:
+            sql += " AND is_active"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY code LIMIT ?", params).fetchall()
+        return [(r[0], r[1], r[2], r[3], bool(r[4])) for r in rows]
+
+
+class SnapshotWatcher:
+    """
+    Serves the current RuleSnapshot of a path and swaps to a new one when the file is replaced
+    (inode, mtime or size changed), checking with os.stat at most every `check_interval` seconds.
+    A snapshot that fails to open is logged and the previous one stays in use.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[RuleSnapshot] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = float("-inf")
+        self.swaps = 0
+
+    def current(self) -> Optional[RuleSnapshot]:
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            self._checked_at = time.monotonic()
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return self._snapshot
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if signature != self._signature:
+                try:
+                    # In-flight requests keep their reference to the previous snapshot
+                    self._snapshot = RuleSnapshot(self.path)
+                    self.swaps += 1
+                except Exception as exc:
+                    logger.warning("Could not open rule snapshot %s: %s", self.path, exc)
+                self._signature = signature
+            return self._snapshot
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "version": snapshot.version if snapshot else None,
+            "created_at": snapshot.created_at if snapshot else None,
+            "swaps": self.swaps,
+        }
+
+
+_watcher: Optional[SnapshotWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_snapshot_watcher() -> Optional[SnapshotWatcher]:
+    """
+    Process-wide SnapshotWatcher for RULE_SNAPSHOT_PATH.
+    Returns None when the variable is unset: rules are then loaded from the database.
+    """
+    global _watcher
+    path = os.getenv("RULE_SNAPSHOT_PATH")
+    if not path:
+        return None
+    with _watcher_lock:
+        if _watcher is None or _watcher.path != path:
+            _watcher = SnapshotWatcher(path, float(os.getenv("RULE_SNAPSHOT_CHECK_SECONDS", "1")))
+        return _watcher
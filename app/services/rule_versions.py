@@ -0,0 +1,53 @@
+# C:\Users\monti\Projects\DashValidator\app\services\rule_versions.py
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+# Most changes returned by one changes_since() call
+MAX_CHANGES = 1000
+
+
+class RuleChangeRow(NamedTuple):
+    version: int
+    table_name: str
+    row_id: int
+    operation: str        # I | U | D
+    changed_at: Optional[datetime]
+
+
+def current_version(db: Session) -> Optional[int]:
+    """
+    Current rule-set version: a primary-key read of the single rule_set_version row, bumped by
+    the triggers of migration e8b41f6d9a27 on every change to rules / required_companion_codes.
+    Returns None when the database predates that migration; callers then reload unconditionally.
+    """
+    from app.models import RuleSetVersion  # app.models needs DATABASE_URL at import
+
+    table = RuleSetVersion.__table__
+    try:
+        return db.execute(select(table.c.version).where(table.c.id == 1)).scalar()
+    except DBAPIError:
+        db.rollback()
+        return None
+
+
+def changes_since(db: Session, version: int, limit: int = MAX_CHANGES) -> List[RuleChangeRow]:
+    """
+    Changes that produced versions after `version`, oldest first. A result of exactly `limit`
+    rows may be partial: call again from the last version returned.
+    """
+    from app.models import RuleChange
+
+    table = RuleChange.__table__
+    rows = db.execute(
+        select(table.c.version, table.c.table_name, table.c.row_id, table.c.operation, table.c.changed_at)
+        .where(table.c.version > version)
+        .order_by(table.c.version)
+        .limit(limit)
+    )
+    return [RuleChangeRow(*r) for r in rows]
@@ -0,0 +1,331 @@
+# C:\Users\monti\Projects\DashValidator\app\services\stats.py
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stage durations range from microseconds (delimiter sniffing) to minutes (huge validations)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+# Peak memory per stage: 1 MB .. 8 GB
+BYTES_BUCKETS: Tuple[float, ...] = tuple(float(2 ** n * 1024 * 1024) for n in range(0, 14))
+# Memory per input row: 64 B .. 64 KB
+PER_ROW_BUCKETS: Tuple[float, ...] = tuple(float(2 ** n) for n in range(6, 17))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus semantics). Not locked: the registry holds the lock.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StatsRegistry:
+    """
+    Process-local counters, histograms and callback gauges, rendered in the Prometheus text format.
+    Each uvicorn worker has its own registry; scrape every worker (or aggregate downstream).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[LabelKey, float]]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def gauge(self, name: str, fn: Callable[[], Dict[LabelKey, float]], help_text: str = "") -> None:
+        """
+        Register a gauge computed at scrape time. fn returns {label key: value};
+        use label_key(...) to build keys, or {(): value} for an unlabeled gauge.
+        """
+        self._gauges[name] = fn
+        if help_text:
+            self._help[name] = help_text
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def _header(name: str, kind: str) -> None:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                _header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_render_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                _header(name, "histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_render_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_render_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{_render_labels(key)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{_render_labels(key)} {hist.count}")
+        for name, fn in sorted(self._gauges.items()):
+            try:
+                values = fn()
+            except Exception:
+                continue  # a broken gauge must not break the scrape
+            _header(name, "gauge")
+            for key, value in values.items():
+                lines.append(f"{name}{_render_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+STATS = StatsRegistry()
+STATS.describe("dash_stage_seconds", "Duration of each pipeline stage.")
+STATS.describe("dash_rows_processed_total", "CSV data rows parsed.")
+STATS.describe("dash_bytes_ingested_total", "Upload bytes read.")
+STATS.describe("dash_validation_errors_total", "Validation errors reported, by rule.")
+STATS.describe("dash_db_pool_checkouts_total", "Connections checked out of the SQLAlchemy pool.")
+STATS.describe("dash_cache_lookups_total", "Lookups in memoization caches, by cache and result.")
+STATS.describe("dash_stage_peak_bytes", "Peak traced Python memory per stage (memory-tracked requests only).")
+STATS.describe("dash_bytes_per_row", "Request peak traced memory divided by input rows.")
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+# MEMORY_TRACKING=1 tracks every request; otherwise only those asking for it (?memory=true)
+MEMORY_TRACKING_ALWAYS = _env_flag("MEMORY_TRACKING")
+# Requests peaking above this log their top allocation sites (0 disables)
+MEMORY_ALERT_BYTES = int(float(os.getenv("MEMORY_ALERT_MB", "512")) * 1024 * 1024)
+
+
+class _TracemallocSession:
+    """
+    tracemalloc is process-wide and slows allocation down, so it only runs while at least one
+    tracked request is in flight. Concurrent tracked requests share it: their per-stage peaks
+    include each other's allocations, which is acceptable for catching regressions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+        self._owned = False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owned = True
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._owned:
+                tracemalloc.stop()
+                self._owned = False
+
+
+_TRACEMALLOC = _TracemallocSession()
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def label_key(**labels: str) -> LabelKey:
+    return _label_key(labels)
+
+
+class StageTimer:
+    """
+    Time the steps of one request:
+
+        timer = StageTimer("ingest")
+        with timer.stage("parse"):
+            ...
+        timer.as_meta()  -> {"parse": 12.3, ...} in milliseconds
+
+    Every stage is also recorded in the dash_stage_seconds histogram.
+
+    With track_memory=True (or MEMORY_TRACKING=1), each stage also records its peak traced
+    memory above the request's starting point; see memory_meta(). Set `rows` once the input
+    is parsed, and make sure close() runs on error paths (finish() calls it).
+    """
+
+    def __init__(self, endpoint: str, registry: StatsRegistry = STATS, track_memory: bool = False):
+        self.endpoint = endpoint
+        self.registry = registry
+        self.stages: Dict[str, float] = {}
+        self.track_memory = track_memory or MEMORY_TRACKING_ALWAYS
+        self.peak_bytes: Dict[str, int] = {}
+        self.rows: Optional[int] = None
+        self._alerted = False
+        self._tracing = self.track_memory
+        if self.track_memory:
+            _TRACEMALLOC.acquire()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self._tracing:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            self.registry.observe("dash_stage_seconds", elapsed, endpoint=self.endpoint, stage=name)
+            if self._tracing:
+                self._record_peak(name)
+
+    def _record_peak(self, name: str) -> None:
+        peak = max(tracemalloc.get_traced_memory()[1] - self._baseline, 0)
+        self.peak_bytes[name] = max(self.peak_bytes.get(name, 0), peak)
+        self.registry.observe("dash_stage_peak_bytes", peak, buckets=BYTES_BUCKETS, endpoint=self.endpoint, stage=name)
+        if MEMORY_ALERT_BYTES and peak > MEMORY_ALERT_BYTES and not self._alerted:
+            self._alerted = True
+            # What is still alive at the end of the offending stage
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            logger.warning(
+                "%s stage '%s' peaked at %.1f MB (budget %.1f MB). Top allocation sites:\n%s",
+                self.endpoint, name, peak / 1e6, MEMORY_ALERT_BYTES / 1e6,
+                "\n".join(f"  {stat}" for stat in top),
+            )
+
+    def finish(self) -> float:
+        total = time.perf_counter() - self._started
+        self.registry.observe("dash_stage_seconds", total, endpoint=self.endpoint, stage="total")
+        if self._tracing and self.rows and self.peak_bytes:
+            self.registry.observe(
+                "dash_bytes_per_row", max(self.peak_bytes.values()) / self.rows,
+                buckets=PER_ROW_BUCKETS, endpoint=self.endpoint,
+            )
+        self.close()
+        return total
+
+    def close(self) -> None:
+        """
+        Stop memory tracing for this request. Safe to call more than once.
+        """
+        if self._tracing:
+            self._tracing = False
+            _TRACEMALLOC.release()
+
+    def memory_meta(self) -> Dict[str, Any]:
+        """
+        Peak traced bytes per stage, overall peak, bytes per input row and current RSS.
+        """
+        peak = max(self.peak_bytes.values(), default=0)
+        return {
+            "peak_bytes_by_stage": dict(self.peak_bytes),
+            "peak_bytes": peak,
+            "bytes_per_row": round(peak / self.rows, 1) if self.rows else None,
+            "rss_bytes": _rss_bytes(),
+        }
+
+    def as_meta(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """
+        Value for a Server-Timing response header (shown by browser dev tools).
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+def pool_stats(engine) -> Dict[str, int]:
+    """
+    Occupancy of a SQLAlchemy QueuePool (size, checkedout, overflow, checkedin).
+    Pools without these counters (e.g. SQLite's StaticPool) report what they have.
+    """
+    pool = engine.pool
+    values: Dict[str, int] = {}
+    for stat in ("size", "checkedout", "overflow", "checkedin"):
+        fn = getattr(pool, stat, None)
+        if callable(fn):
+            values[stat] = fn()
+    return values
+
+
+def instrument_engine(engine, registry: StatsRegistry = STATS) -> None:
+    """
+    Count pool checkouts and expose pool occupancy as gauges.
+    """
+    from sqlalchemy import event
+
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        registry.inc("dash_db_pool_checkouts_total")
+
+    event.listen(engine, "checkout", _on_checkout)
+
+    def _pool_gauges() -> Dict[LabelKey, float]:
+        return {label_key(stat=stat): value for stat, value in pool_stats(engine).items()}
+
+    registry.gauge("dash_db_pool", _pool_gauges, "SQLAlchemy pool occupancy.")
+
+
+def record_cache(cache: str, hits: int, misses: int, registry: StatsRegistry = STATS) -> None:
+    if hits:
+        registry.inc("dash_cache_lookups_total", hits, cache=cache, result="hit")
+    if misses:
+        registry.inc("dash_cache_lookups_total", misses, cache=cache, result="miss")
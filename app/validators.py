@@ -6,6 +6,11 @@ Centralized validators for CSV ingestion.
 Contains:
 1) Required headers validation
 2) Required companion codes validation (DB-backed via table: required_companion_codes)
+3) Cross-file duplicate claims (persistent fingerprint index, see app/services/claim_index.py)
+4) In-file duplicate lines (exact, or same key with a different amount)
+5) Amount format and per-invoice reconciliation (Montant Preliminaire vs Montant payé)
+6) Overlapping service intervals (Début/Fin) per doctor per day
+7) Frequency limits per patient and code (DB-backed via rules.config_json, code 'frequency_limit')
 
 Usage pattern from your ingest flow (example):
 
@@ -35,11 +40,25 @@ Usage pattern from your ingest flow (example):
 Return format: List[Dict[str, str]] of validation errors.
 """
 
-from typing import Dict, Iterable, List, Sequence, Set, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Set, Tuple
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import chain, islice
+from multiprocessing import shared_memory
+from operator import itemgetter
+import hashlib
+import heapq
+import json
+import multiprocessing
+import threading
+import zlib
 from sqlalchemy.orm import Session
 from sqlalchemy import Table, Column, Integer, String, Boolean, Text, DateTime, MetaData
 
+from app.services.amounts import AmountParser, format_cents
+
 # --- DB reflection for required_companion_codes (no need to touch your models) ---
 metadata = MetaData()
 required_companion_codes = Table(
@@ -53,6 +72,21 @@ required_companion_codes = Table(
     Column("created_at", DateTime(timezone=True)),
     Column("updated_at", DateTime(timezone=True)),
 )
+# Only the columns the validators read from the rules table
+rules = Table(
+    "rules",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String, nullable=False),
+    Column("is_active", Boolean, nullable=False),
+    Column("config_json", Text),
+)
+
+def _numbered(rows: Iterable[Dict[str, str]], row_numbers: Optional[Sequence[int]] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Pair rows with their 1-based data row number. Shards pass the numbers from the full file.
+    """
+    return enumerate(rows, start=1) if row_numbers is None else zip(row_numbers, rows)
 
 # --------------------------
 # Rule 1: Required Headers
@@ -99,6 +133,7 @@ def validate_required_companions(
     facture_field: str = "Facture",
     doctor_field: str = "Doctor Info",
     code_field: str = "Code",
+    row_numbers: Optional[Sequence[int]] = None,
 ) -> List[Dict[str, str]]:
     """
     For each invoice (Facture)+doctor, if a code is present but its required companions are not,
@@ -108,14 +143,17 @@ def validate_required_companions(
     if not required_map:
         return errors
 
-    # Group rows by (invoice, doctor)
+    # Group rows by (invoice, doctor), remembering the group's first row
     by_invoice_doctor: Dict[Tuple[str, str], List[Dict[str, str]]] = defaultdict(list)
-    for row in rows:
-        by_invoice_doctor[(row.get(facture_field, ""), row.get(doctor_field, ""))].append(row)
+    first_row: Dict[Tuple[str, str], int] = {}
+    for i, row in _numbered(rows, row_numbers):
+        key = (row.get(facture_field, ""), row.get(doctor_field, ""))
+        by_invoice_doctor[key].append(row)
+        first_row.setdefault(key, i)
 
     for (facture, doctor), group in by_invoice_doctor.items():
         codes_here = {r.get(code_field, "") for r in group if r.get(code_field)}
-        for code in list(codes_here):
+        for code in sorted(codes_here):
             if code in required_map:
                 must_have = required_map[code]
                 missing = sorted([c for c in must_have if c not in codes_here])
@@ -123,15 +161,697 @@ def validate_required_companions(
                     errors.append({
                         "rule": "required_companion_code",
                         "message": f"Code {code} requires: {', '.join(missing)} on the same invoice/doctor.",
+                        "row": str(first_row[(facture, doctor)]),
                         "facture": facture,
                         "doctor": doctor,
                         "codes_present": ", ".join(sorted(codes_here)),
                     })
     return errors
 
+# ------------------------------------------
+# Rule 3: Cross-file duplicate claims
+# ------------------------------------------
+# Fields that identify one billed line across exports
+CLAIM_KEY_FIELDS: Tuple[str, ...] = ("Facture", "#", "ID RAMQ", "Date de Service", "Code")
+
+class FingerprintIndex(Protocol):
+    def lookup(self, fingerprints: Iterable[int]) -> Dict[int, str]: ...
+    def add(self, fingerprints: Iterable[int], source: str) -> int: ...
+
+def claim_fingerprint(row: Dict[str, str], key_fields: Sequence[str] = CLAIM_KEY_FIELDS) -> int:
+    """
+    Stable signed 64-bit fingerprint of a line's key fields (fits an SQLite INTEGER).
+    Values are trimmed and joined with a unit separator so ("1", "23") != ("12", "3").
+    """
+    joined = "\x1f".join((row.get(f) or "").strip() for f in key_fields)
+    digest = hashlib.blake2b(joined.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def validate_cross_file_duplicates(
+    rows: Iterable[Dict[str, str]],
+    index: FingerprintIndex,
+    source: str,
+    key_fields: Sequence[str] = CLAIM_KEY_FIELDS,
+    record: bool = True,
+) -> List[Dict[str, str]]:
+    """
+    Flag lines already billed in a *different* export, using a persistent fingerprint index.
+    An export is identified by `source` (a label, e.g. the file name) plus a digest of its
+    claim lines: re-validating the same export is safe, while two exports that share a file
+    name still see each other's lines. With record=True, this file's new fingerprints are
+    added to the index afterwards.
+    """
+    # fingerprint -> (row number, facture, code) of its first occurrence in this file.
+    # claim_fingerprint() is inlined here: this loop runs once per line of every upload.
+    blake2b = hashlib.blake2b
+    first_seen: Dict[int, Tuple[int, str, str]] = {}
+    for i, row in enumerate(rows, start=1):
+        joined = "\x1f".join([(row.get(f) or "").strip() for f in key_fields])
+        if not joined.strip("\x1f"):
+            continue  # blank line
+        fp = int.from_bytes(blake2b(joined.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+        if fp not in first_seen:
+            first_seen[fp] = (i, row.get("Facture", ""), row.get("Code", ""))
+
+    # Order-independent: a re-sorted export is the same export
+    content = hashlib.blake2b(array("q", sorted(first_seen)).tobytes(), digest_size=8).hexdigest()
+    source = f"{source}#{content}"
+
+    known = index.lookup(first_seen.keys())
+    errors: List[Dict[str, str]] = []
+    for fp, (row_no, facture, code) in first_seen.items():
+        prior = known.get(fp)
+        if prior is not None and prior != source:
+            errors.append({
+                "rule": "duplicate_claim",
+                "message": f"Line already billed in another export ({prior}).",
+                "row": str(row_no),
+                "facture": facture,
+                "code": code,
+                "previous_source": prior,
+            })
+
+    if record:
+        index.add((fp for fp in first_seen if fp not in known), source)
+    return errors
+
+# ------------------------------------------
+# Rule 4: In-file duplicate lines
+# ------------------------------------------
+def validate_duplicate_lines(
+    rows: Iterable[Dict[str, str]],
+    key_fields: Sequence[str] = CLAIM_KEY_FIELDS,
+    amount_field: str = "Montant Preliminaire",
+    parser: Optional[AmountParser] = None,
+    row_numbers: Optional[Sequence[int]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Single pass over the rows, keeping one small entry per distinct key (never the rows).
+    Lines sharing every key field are duplicates; "exact" when all amounts match,
+    "amount_mismatch" when the same line was billed with different amounts.
+    With a parser, amounts are compared as cents ("1 234,50" == "1234,5").
+    One error per duplicated key, listing every row number involved.
+    """
+    # key -> (first row number, first amount)
+    seen: Dict[Tuple[str, ...], Tuple[int, str]] = {}
+    # key -> [row numbers], [distinct amounts] (only for keys seen more than once)
+    dups: Dict[Tuple[str, ...], Tuple[List[int], Set[str]]] = {}
+
+    for i, row in _numbered(rows, row_numbers):
+        key = tuple([(row.get(f) or "").strip() for f in key_fields])
+        if not any(key):
+            continue  # blank line
+        amount = (row.get(amount_field) or "").strip()
+        if parser is not None and amount:
+            cents = parser.cents(amount)
+            if cents is not None:
+                amount = format_cents(cents)
+        first = seen.get(key)
+        if first is None:
+            seen[key] = (i, amount)
+            continue
+        entry = dups.get(key)
+        if entry is None:
+            entry = dups[key] = ([first[0]], {first[1]})
+        entry[0].append(i)
+        entry[1].add(amount)
+
+    errors: List[Dict[str, str]] = []
+    for key, (row_numbers, amounts) in sorted(dups.items(), key=lambda kv: kv[1][0][0]):
+        fields = dict(zip(key_fields, key))
+        rows_txt = ", ".join(str(n) for n in row_numbers)
+        if len(amounts) == 1:
+            kind, message = "exact", f"Line appears {len(row_numbers)} times (rows {rows_txt})."
+        else:
+            kind = "amount_mismatch"
+            message = (
+                f"Line appears {len(row_numbers)} times with different amounts "
+                f"({', '.join(sorted(amounts))}) (rows {rows_txt})."
+            )
+        errors.append({
+            "rule": "duplicate_line",
+            "kind": kind,
+            "message": message,
+            "rows": rows_txt,
+            "facture": fields.get("Facture", ""),
+            "code": fields.get("Code", ""),
+            "key": " | ".join(key),
+        })
+    return errors
+
+# ------------------------------------------
+# Rule 5: Amount format and reconciliation
+# ------------------------------------------
+PRELIMINARY_FIELD = "Montant Preliminaire"
+PAID_FIELD = "Montant payé"
+
+def amount_parser_for(rows: Sequence[Dict[str, str]], field: str = PRELIMINARY_FIELD) -> AmountParser:
+    """
+    Detect the file's number format once, from the first few hundred amount values.
+    """
+    return AmountParser.from_samples(row.get(field, "") for row in islice(rows, 500))
+
+def reconcile_amounts(
+    rows: Iterable[Dict[str, str]],
+    parser: AmountParser,
+    preliminary_field: str = PRELIMINARY_FIELD,
+    paid_field: str = PAID_FIELD,
+    facture_field: str = "Facture",
+    doctor_field: str = "Doctor Info",
+    tolerance_cents: int = 0,
+    totals: Optional[Dict[str, Any]] = None,
+    row_numbers: Optional[Sequence[int]] = None,
+) -> List[Dict[str, str]]:
+    """
+    One pass that parses both amount columns and:
+    - reports values that are not valid amounts (amount_format)
+    - reports invoices whose paid total exceeds the preliminary total (amount_reconciliation)
+    - if `totals` is given, fills it with cents totals for the file, per doctor and per invoice
+    """
+    errors: List[Dict[str, str]] = []
+    # facture -> [preliminary, paid, lines, first row, doctor]
+    by_invoice: Dict[str, List[Any]] = {}
+    # doctor -> [preliminary, paid, lines]
+    by_doctor: Dict[str, List[int]] = {}
+    cents = parser.cents
+
+    for i, row in _numbered(rows, row_numbers):
+        facture = row.get(facture_field, "")
+        doctor = row.get(doctor_field, "")
+        values = []
+        for field in (preliminary_field, paid_field):
+            raw = row.get(field) or ""
+            value = cents(raw) if raw else None
+            if value is None:
+                if raw.strip():
+                    errors.append({
+                        "rule": "amount_format",
+                        "message": f"'{raw}' is not a valid amount in column {field}.",
+                        "row": str(i),
+                        "field": field,
+                        "value": raw,
+                        "facture": facture,
+                        "doctor": doctor,
+                    })
+                value = 0
+            values.append(value)
+        prelim, paid = values
+
+        inv = by_invoice.get(facture)
+        if inv is None:
+            inv = by_invoice[facture] = [0, 0, 0, i, doctor]
+        inv[0] += prelim
+        inv[1] += paid
+        inv[2] += 1
+
+        doc = by_doctor.get(doctor)
+        if doc is None:
+            doc = by_doctor[doctor] = [0, 0, 0]
+        doc[0] += prelim
+        doc[1] += paid
+        doc[2] += 1
+
+    for facture, (prelim, paid, lines, first_row, doctor) in by_invoice.items():
+        if facture and paid - prelim > tolerance_cents:
+            errors.append({
+                "rule": "amount_reconciliation",
+                "message": (
+                    f"Invoice {facture}: {PAID_FIELD} total {format_cents(paid)} exceeds "
+                    f"{PRELIMINARY_FIELD} total {format_cents(prelim)}."
+                ),
+                "row": str(first_row),
+                "facture": facture,
+                "doctor": doctor,
+                "preliminary_total": format_cents(prelim),
+                "paid_total": format_cents(paid),
+            })
+
+    if totals is not None:
+        def _summary(prelim: int, paid: int, lines: int) -> Dict[str, int]:
+            return {"preliminary_cents": prelim, "paid_cents": paid, "lines": lines}
+
+        totals["file"] = _summary(
+            sum(v[0] for v in by_doctor.values()),
+            sum(v[1] for v in by_doctor.values()),
+            sum(v[2] for v in by_doctor.values()),
+        )
+        totals["by_doctor"] = {d: _summary(*v) for d, v in by_doctor.items()}
+        totals["by_invoice"] = {f: _summary(*v[:3]) for f, v in by_invoice.items()}
+    return errors
+
+# ------------------------------------------
+# Rule 6: Overlapping service intervals
+# ------------------------------------------
+def _parse_clock(value: str) -> Optional[int]:
+    """
+    'HH:MM', 'HH:MM:SS' or 'HHhMM' -> seconds since midnight. None if not a time.
+    """
+    parts = value.strip().lower().replace("h", ":").split(":")
+    if not 2 <= len(parts) <= 3 or not all(p.isdigit() for p in parts):
+        return None
+    h, m = int(parts[0]), int(parts[1])
+    sec = int(parts[2]) if len(parts) == 3 else 0
+    if h > 24 or m > 59 or sec > 59:
+        return None
+    return h * 3600 + m * 60 + sec
+
+def validate_service_overlaps(
+    rows: Iterable[Dict[str, str]],
+    date_field: str = "Date de Service",
+    start_field: str = "Début",
+    end_field: str = "Fin",
+    doctor_field: str = "Doctor Info",
+    max_pairs_per_group: int = 1000,
+    row_numbers: Optional[Sequence[int]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Report every pair of overlapping [Début, Fin) intervals for the same doctor and day.
+    Each group is sorted by start and swept with a min-heap of active end times, so the cost
+    is O(n log n) plus one step per listed pair; pairs past max_pairs_per_group are counted
+    from the size of the active set without being visited. Times are parsed once per distinct string;
+    an end before its start is read as crossing midnight. Touching intervals do not overlap.
+    """
+    clock: Dict[str, Optional[int]] = {}
+    groups: Dict[Tuple[str, str], List[Tuple[int, int, int]]] = defaultdict(list)
+    for i, row in _numbered(rows, row_numbers):
+        raw_start = row.get(start_field) or ""
+        raw_end = row.get(end_field) or ""
+        if raw_start not in clock:
+            clock[raw_start] = _parse_clock(raw_start)
+        if raw_end not in clock:
+            clock[raw_end] = _parse_clock(raw_end)
+        start, end = clock[raw_start], clock[raw_end]
+        if start is None or end is None:
+            continue
+        if end < start:
+            end += 86400
+        groups[(row.get(doctor_field, ""), (row.get(date_field) or "").strip())].append((start, end, i))
+
+    def _hhmm(seconds: int) -> str:
+        return f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}"
+
+    errors: List[Dict[str, str]] = []
+    for (doctor, day), intervals in groups.items():
+        intervals.sort()
+        active: List[Tuple[int, int, int]] = []  # (end, start, row)
+        reported = 0
+        total = 0
+        for start, end, row_no in intervals:
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            total += len(active)
+            # Past the cap, overlaps are only counted: no sort or walk of the active set
+            listed = min(len(active), max_pairs_per_group - reported)
+            if listed > 0:
+                for a_end, a_start, a_row in heapq.nsmallest(listed, active, key=lambda a: (a[1], a[2])):
+                    reported += 1
+                    errors.append({
+                        "rule": "service_overlap",
+                        "message": (
+                            f"Doctor {doctor} on {day}: {_hhmm(a_start)}-{_hhmm(a_end)} (row {a_row}) "
+                            f"overlaps {_hhmm(start)}-{_hhmm(end)} (row {row_no})."
+                        ),
+                        "rows": f"{a_row}, {row_no}",
+                        "doctor": doctor,
+                        "date": day,
+                    })
+            heapq.heappush(active, (end, start, row_no))
+        if total > reported:
+            errors.append({
+                "rule": "service_overlap",
+                "message": f"Doctor {doctor} on {day}: {total - reported} more overlapping pair(s) not listed.",
+                "row": str(min(iv[2] for iv in intervals)),
+                "doctor": doctor,
+                "date": day,
+            })
+    return errors
+
+# ------------------------------------------
+# Rule 7: Frequency limits (DB-backed)
+# ------------------------------------------
+FREQUENCY_RULE_CODE = "frequency_limit"
+FREQUENCY_WINDOWS = ("day", "week", "month", "periode", "sliding")
+
+class FrequencyLimit(NamedTuple):
+    code: str
+    max_units: float
+    window: str           # one of FREQUENCY_WINDOWS
+    days: int = 1         # width of a sliding window, in days
+
+def load_frequency_limits(db: Session) -> List[FrequencyLimit]:
+    """
+    Loads the 'frequency_limit' rule config, e.g.:
+      {"limits": [{"code": "15802", "max": 1, "window": "day"},
+                  {"code": "00103", "max": 2, "window": "sliding", "days": 7}]}
+    Returns [] when the rule is missing or inactive. Raises RuntimeError on a malformed config.
+    """
+    row = db.execute(
+        rules.select().where(rules.c.code == FREQUENCY_RULE_CODE)
+    ).fetchone()
+    if row is None or not row.is_active:
+        return []
+    return parse_frequency_limits(row.config_json)
+
+def parse_frequency_limits(config_json: Optional[str]) -> List[FrequencyLimit]:
+    """
+    Parse the 'frequency_limit' rule's config_json (see load_frequency_limits).
+    """
+    if not config_json:
+        return []
+    try:
+        config = json.loads(config_json)
+    except Exception as e:
+        raise RuntimeError(f"Rule '{FREQUENCY_RULE_CODE}' config_json is invalid: {e}")
+
+    limits: List[FrequencyLimit] = []
+    for entry in config.get("limits", []):
+        window = entry.get("window", "day")
+        if window not in FREQUENCY_WINDOWS or "code" not in entry or "max" not in entry:
+            raise RuntimeError(f"Rule '{FREQUENCY_RULE_CODE}' has a malformed limit: {entry}")
+        limits.append(FrequencyLimit(str(entry["code"]), float(entry["max"]), window, int(entry.get("days", 1))))
+    return limits
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y")
+
+def _parse_service_date(value: str) -> Optional[date]:
+    s = value.strip()[:10]
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _parse_units(value: str) -> float:
+    try:
+        units = float((value or "").strip().replace(",", "."))
+    except ValueError:
+        return 1.0
+    return units if units > 0 else 1.0
+
+def validate_frequency_limits(
+    rows: Iterable[Dict[str, str]],
+    limits: Sequence[FrequencyLimit],
+    patient_field: str = "Patient",
+    code_field: str = "Code",
+    date_field: str = "Date de Service",
+    units_field: str = "Unités",
+    period_field: str = "Periode",
+    max_rows_listed: int = 20,
+    row_numbers: Optional[Sequence[int]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Enforce "code X at most N units per patient per window" in a single pass.
+    Tumbling windows (day, ISO week, month, Periode) keep one counter per
+    (patient, code, window); sliding windows keep the events of limited codes only and are
+    checked with a two-pointer sweep at the end. Rows of unlimited codes cost one dict miss.
+    """
+    errors: List[Dict[str, str]] = []
+    if not limits:
+        return errors
+
+    by_code: Dict[str, List[FrequencyLimit]] = defaultdict(list)
+    for limit in limits:
+        by_code[limit.code].append(limit)
+
+    dates: Dict[str, Optional[date]] = {}
+    # (limit, patient, window key) -> [units, row numbers]
+    counters: Dict[Tuple[FrequencyLimit, str, str], List[Any]] = {}
+    # (limit, patient) -> [(day ordinal, units, row)]
+    events: Dict[Tuple[FrequencyLimit, str], List[Tuple[int, float, int]]] = defaultdict(list)
+
+    for i, row in _numbered(rows, row_numbers):
+        code_limits = by_code.get((row.get(code_field) or "").strip())
+        if not code_limits:
+            continue
+        patient = (row.get(patient_field) or "").strip()
+        raw_date = row.get(date_field) or ""
+        if raw_date not in dates:
+            dates[raw_date] = _parse_service_date(raw_date)
+        day = dates[raw_date]
+        if not patient or day is None:
+            continue
+        units = _parse_units(row.get(units_field, ""))
+
+        for limit in code_limits:
+            if limit.window == "sliding":
+                events[(limit, patient)].append((day.toordinal(), units, i))
+                continue
+            if limit.window == "day":
+                window = day.isoformat()
+            elif limit.window == "week":
+                iso = day.isocalendar()
+                window = f"{iso[0]}-W{iso[1]:02d}"
+            elif limit.window == "month":
+                window = day.strftime("%Y-%m")
+            else:
+                window = f"Periode {(row.get(period_field) or '').strip()}"
+            counter = counters.get((limit, patient, window))
+            if counter is None:
+                counter = counters[(limit, patient, window)] = [0.0, []]
+            counter[0] += units
+            if len(counter[1]) < max_rows_listed:
+                counter[1].append(i)
+
+    violations: List[Tuple[int, Dict[str, str]]] = []
+
+    def _violation(limit: FrequencyLimit, patient: str, window: str, units: float, row_numbers: List[int]) -> None:
+        violations.append((row_numbers[0], {
+            "rule": "frequency_limit",
+            "message": (
+                f"Code {limit.code} billed {units:g} unit(s) for patient {patient} in {window} "
+                f"(max {limit.max_units:g})."
+            ),
+            "rows": ", ".join(str(n) for n in row_numbers),
+            "patient": patient,
+            "code": limit.code,
+            "window": window,
+        }))
+
+    for (limit, patient, window), (units, row_numbers) in counters.items():
+        if units > limit.max_units:
+            _violation(limit, patient, window, units, row_numbers)
+
+    for (limit, patient), evts in events.items():
+        evts.sort()
+        left = 0
+        total = 0.0
+        in_violation = False
+        for right, (day_ord, units, _) in enumerate(evts):
+            total += units
+            while day_ord - evts[left][0] >= limit.days:
+                total -= evts[left][1]
+                left += 1
+            if total > limit.max_units:
+                if not in_violation:
+                    first_day = date.fromordinal(evts[left][0]).isoformat()
+                    window = f"{limit.days} day(s) from {first_day}"
+                    row_numbers = [e[2] for e in evts[left:right + 1]][:max_rows_listed]
+                    _violation(limit, patient, window, total, row_numbers)
+                in_violation = True
+            else:
+                in_violation = False
+
+    violations.sort(key=lambda v: v[0])
+    errors.extend(err for _, err in violations)
+    return errors
+
 # --------------------------
 # Orchestrator
 # --------------------------
+class ValidationProgress(Protocol):
+    """
+    Receives progress from run_all_validations (see app.services.progress.Progress).
+    """
+    def validation_started(self, units: int) -> None: ...
+    def unit_done(self, errors: int) -> None: ...
+
+class _Step(NamedTuple):
+    """
+    A row-level rule as run by the orchestrator.
+    shard_field: rows sharing this column's value are always validated in the same shard
+    fields: the columns the rule reads (all that is shipped to worker processes)
+    """
+    name: str
+    func: Callable[..., List[Dict[str, str]]]
+    shard_field: str
+    fields: Tuple[str, ...]
+    kwargs: Dict[str, Any]
+
+def _first_row(error: Dict[str, str]) -> int:
+    ref = error.get("row") or error.get("rows") or "0"
+    return int(ref.split(",", 1)[0])
+
+def _run_steps(
+    steps: Sequence[_Step],
+    rows: Sequence[Dict[str, str]],
+    row_numbers: Optional[Sequence[int]],
+    collect_totals: bool,
+    progress: Optional[ValidationProgress] = None,
+) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, Any]]:
+    """
+    Run steps over one set of rows. Top-level so process pools can pickle it.
+    """
+    results: Dict[str, List[Dict[str, str]]] = {}
+    totals: Dict[str, Any] = {}
+    for step in steps:
+        kwargs = dict(step.kwargs)
+        if step.func is reconcile_amounts and collect_totals:
+            kwargs["totals"] = totals
+        errors = step.func(rows=rows, row_numbers=row_numbers, **kwargs)
+        # Canonical order, identical for the serial path and merged shards
+        errors.sort(key=_first_row)
+        results[step.name] = errors
+        if progress is not None:
+            progress.unit_done(len(errors))
+    return results, totals
+
+def _merge_amount_totals(target: Dict[str, Any], part: Dict[str, Any]) -> None:
+    keys = ("preliminary_cents", "paid_cents", "lines")
+    if not part:
+        return
+    file_totals = target.setdefault("file", dict.fromkeys(keys, 0))
+    for k in keys:
+        file_totals[k] += part["file"][k]
+    by_doctor = target.setdefault("by_doctor", {})
+    for doctor, summary in part["by_doctor"].items():
+        merged = by_doctor.setdefault(doctor, dict.fromkeys(keys, 0))
+        for k in keys:
+            merged[k] += summary[k]
+    # Invoices never span shards (amount steps shard on Facture)
+    target.setdefault("by_invoice", {}).update(part["by_invoice"])
+
+# Workers start from a fork server (spawn where unavailable, e.g. Windows): forking a
+# threaded uvicorn worker could copy locks held by other threads
+_POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+if _POOL_CONTEXT.get_start_method() == "forkserver":
+    _POOL_CONTEXT.set_forkserver_preload([__name__])
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    # Called from threadpool threads: concurrent requests must not create two pools
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_POOL_CONTEXT)
+            _pool_workers = workers
+        return _pool
+
+# Separates the values in the buffer shared with shard workers
+_SEPARATOR = "\x00"
+
+def _encode_values(rows: Sequence[Dict[str, str]], fields: Tuple[str, ...]) -> Optional[bytes]:
+    """
+    The rows' values of `fields`, row by row, NUL-separated and UTF-8 encoded: one pass over
+    the rows, whatever the number of shard fields. None if a value itself contains a NUL.
+    """
+    try:
+        if len(fields) < 2:
+            raise TypeError  # itemgetter would return bare values, not tuples
+        joined = _SEPARATOR.join(chain.from_iterable(map(itemgetter(*fields), rows)))
+    except (KeyError, TypeError):
+        # Missing columns or non-string values: slower, tolerant path
+        joined = _SEPARATOR.join(row.get(f) or "" for row in rows for f in fields)
+    if joined.count(_SEPARATOR) != len(rows) * len(fields) - 1:
+        return None
+    return joined.encode("utf-8", "surrogatepass")
+
+def _shard_of(value: str, workers: int) -> int:
+    # Stable across processes, unlike hash() of a str
+    return zlib.crc32(value.encode("utf-8", "surrogatepass")) % workers
+
+def _run_shard(
+    steps: Sequence[_Step],
+    buffer_name: str,
+    size: int,
+    fields: Tuple[str, ...],
+    workers: int,
+    shard: int,
+    collect_totals: bool,
+) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, Any]]:
+    """
+    One shard worker: read the shared values, keep the rows whose shard_field hashes to
+    `shard` (per step group) and run the steps on them. Top-level so process pools can pickle it.
+    """
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        values = bytes(buffer.buf[:size]).decode("utf-8", "surrogatepass").split(_SEPARATOR)
+    finally:
+        buffer.close()
+    columns = {f: values[j::len(fields)] for j, f in enumerate(fields)}
+    del values
+
+    results: Dict[str, List[Dict[str, str]]] = {}
+    totals: Dict[str, Any] = {}
+    for shard_field in dict.fromkeys(step.shard_field for step in steps):
+        field_steps = [step for step in steps if step.shard_field == shard_field]
+        step_fields = tuple(dict.fromkeys(f for step in field_steps for f in step.fields))
+        keys = columns[shard_field]
+        owner = {value: _shard_of(value, workers) for value in set(keys)}
+        picked = [i for i, value in enumerate(keys) if owner[value] == shard]
+        rows = [{f: columns[f][i] for f in step_fields} for i in picked]
+        part, part_totals = _run_steps(field_steps, rows, [i + 1 for i in picked], collect_totals)
+        results.update(part)
+        totals.update(part_totals)
+    return results, totals
+
+def _run_steps_sharded(
+    steps: Sequence[_Step],
+    rows: Sequence[Dict[str, str]],
+    workers: int,
+    collect_totals: bool,
+    progress: Optional[ValidationProgress] = None,
+) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, Any]]:
+    """
+    Run the steps on a process pool, `workers` shards per shard_field. The parent only writes
+    the columns the steps read to shared memory, once; each worker partitions them itself
+    (rows sharing a shard_field value land in the same shard). Errors carry file row numbers
+    and are re-sorted into the canonical order, so the output equals the serial path's.
+    """
+    fields = tuple(dict.fromkeys(f for step in steps for f in step.fields))
+    data = _encode_values(rows, fields)
+    if data is None:
+        # NUL inside a value cannot go through the shared buffer: validate in-process
+        if progress is not None:
+            progress.validation_started(len(steps))
+        return _run_steps(steps, rows, None, collect_totals, progress)
+
+    pool = _get_pool(workers)
+    size = len(data)
+    # The segment may be larger than asked (page rounding): workers read `size` bytes
+    buffer = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        buffer.buf[:size] = data
+        del data
+        futures = [
+            pool.submit(_run_shard, steps, buffer.name, size, fields, workers, k, collect_totals)
+            for k in range(workers)
+        ]
+        results: Dict[str, List[Dict[str, str]]] = {step.name: [] for step in steps}
+        totals: Dict[str, Any] = {}
+        if progress is not None:
+            progress.validation_started(len(futures))
+        for future in futures:
+            part, part_totals = future.result()
+            for name, errors in part.items():
+                results[name].extend(errors)
+            _merge_amount_totals(totals, part_totals)
+            if progress is not None:
+                progress.unit_done(sum(len(errors) for errors in part.values()))
+    finally:
+        buffer.close()
+        buffer.unlink()
+    for errors in results.values():
+        errors.sort(key=_first_row)
+    return results, totals
+
 def run_all_validations(
     rows: Iterable[Dict[str, str]],
     headers: Sequence[str],
@@ -140,24 +860,84 @@ def run_all_validations(
     facture_field: str = "Facture",
     doctor_field: str = "Doctor Info",
     code_field: str = "Code",
+    claim_index: Optional[FingerprintIndex] = None,
+    source: str = "upload",
+    record_claims: bool = False,
+    amount_totals: Optional[Dict[str, Any]] = None,
+    frequency_limits: Sequence[FrequencyLimit] = (),
+    patient_field: str = "Patient",
+    workers: int = 1,
+    parallel_min_rows: int = 50_000,
+    parser: Optional[AmountParser] = None,
+    progress: Optional[ValidationProgress] = None,
 ) -> List[Dict[str, str]]:
     """
     Run all validations and return a combined list of errors.
+    Cross-file duplicate detection only runs when a claim_index is given; the file's lines
+    are recorded in it only with record_claims (the caller accepted the file for billing).
+    Pass a dict as amount_totals to receive the file/doctor/invoice totals.
+
+    With workers > 1 (and at least parallel_min_rows rows), row-level rules run sharded on a
+    process pool; file-level rules and the cross-file index still run once, here.
+    Errors are listed rule by rule, each rule's errors ordered by their first row.
+    The amount parser is detected from the rows unless one is given.
+    A progress sink is told about each finished rule step (or shard).
     """
     all_errors: List[Dict[str, str]] = []
+    rows = rows if isinstance(rows, Sequence) else list(rows)
+    parser = parser or amount_parser_for(rows)
+
+    amount_fields = (facture_field, doctor_field, PRELIMINARY_FIELD, PAID_FIELD)
+    steps = [
+        # 2) Required companion codes
+        _Step("companions", validate_required_companions, facture_field,
+              (facture_field, doctor_field, code_field),
+              dict(required_map=required_companion_map, facture_field=facture_field,
+                   doctor_field=doctor_field, code_field=code_field)),
+        # 3) In-file duplicate lines (the key includes Facture)
+        _Step("duplicates", validate_duplicate_lines, facture_field,
+              CLAIM_KEY_FIELDS + (PRELIMINARY_FIELD,),
+              dict(parser=parser)),
+        # 4) Amount format and reconciliation
+        _Step("amounts", reconcile_amounts, facture_field, amount_fields,
+              dict(parser=parser, facture_field=facture_field, doctor_field=doctor_field)),
+        # 5) Overlapping service intervals
+        _Step("overlaps", validate_service_overlaps, doctor_field,
+              (doctor_field, "Date de Service", "Début", "Fin"),
+              dict(doctor_field=doctor_field)),
+        # 6) Frequency limits
+        _Step("frequency", validate_frequency_limits, patient_field,
+              (patient_field, code_field, "Date de Service", "Unités", "Periode"),
+              dict(limits=frequency_limits, patient_field=patient_field, code_field=code_field)),
+    ]
+    # Nothing to do without DB-backed rules; don't ship rows for them
+    steps = [
+        step for step in steps
+        if not (step.name == "companions" and not required_companion_map)
+        and not (step.name == "frequency" and not frequency_limits)
+    ]
+
+    collect_totals = amount_totals is not None
+    if workers > 1 and len(rows) >= parallel_min_rows:
+        results, totals = _run_steps_sharded(steps, rows, workers, collect_totals, progress)
+    else:
+        if progress is not None:
+            progress.validation_started(len(steps))
+        results, totals = _run_steps(steps, rows, None, collect_totals, progress)
+    if collect_totals:
+        amount_totals.update(totals)
 
     # 1) Required headers
     all_errors.extend(validate_required_headers(headers=headers, required_headers=required_headers))
 
-    # 2) Required companion codes
-    all_errors.extend(
-        validate_required_companions(
-            rows=rows,
-            required_map=required_companion_map,
-            facture_field=facture_field,
-            doctor_field=doctor_field,
-            code_field=code_field,
-        )
-    )
+    # 2) - 6) Row-level rules
+    for step in steps:
+        all_errors.extend(results[step.name])
+
+    # 7) Cross-file duplicate claims
+    if claim_index is not None:
+        all_errors.extend(validate_cross_file_duplicates(
+            rows=rows, index=claim_index, source=source, record=record_claims,
+        ))
 
     return all_errors
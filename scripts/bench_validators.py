@@ -0,0 +1,162 @@
+"""
+Micro-benchmarks for the parsing and validation hot paths.
+
+    python -m scripts.bench_validators --sizes 10000,1000000 --label v0.4 --output bench/v0.4.json
+    python -m scripts.bench_validators --sizes 10000 --compare bench/v0.4.json
+
+For each size a synthetic file (scripts.generate_billing_csv) is generated once, then every
+benchmark is run --repeat times and the best time is kept. Results are written as JSON so two
+versions can be compared with --compare. The default sizes include 10M rows: that run holds
+the parsed rows in memory and needs a host with tens of GB of RAM.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# The ingest router imports app.database, which requires a URL; nothing here connects to it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.routers.ingest import REQUIRED_HEADERS, _detect_delimiter, _read_csv  # noqa: E402
+from app.routers.metrics import _parse_date_to_yyyy_mm_dd  # noqa: E402
+from app.services.header_rule import validate_headers  # noqa: E402
+from app.validators import validate_required_companions  # noqa: E402
+from scripts.generate_billing_csv import (  # noqa: E402
+    DEFAULT_CODES,
+    DEFAULT_COMPANIONS,
+    parse_companions,
+    parse_weights,
+    write_csv,
+)
+
+HEADER_RULE_PARAMS = {
+    "required_headers": REQUIRED_HEADERS,
+    "delimiter": ";",
+    "ignore_extras": True,
+    "case_insensitive": True,
+    "trim_whitespace": True,
+}
+
+
+def _git_version() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_size(size: int, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    buf = io.StringIO()
+    write_csv(
+        buf,
+        delimiter=";",
+        rows=size,
+        invoices=max(size // 4, 1),
+        doctors=200,
+        patients=50_000,
+        codes=parse_weights(DEFAULT_CODES),
+        companions=parse_companions(DEFAULT_COMPANIONS),
+        violation_rate=0.05,
+        seed=seed,
+    )
+    text = buf.getvalue()
+    del buf
+
+    delimiter, _ = _detect_delimiter(text)
+    headers, rows = _read_csv(text, delimiter=delimiter)
+    dates = [row["Date de Service"] for row in rows]
+    companion_map = {k: set(v) for k, v in parse_companions(DEFAULT_COMPANIONS).items()}
+    header_calls = 1000
+
+    benchmarks: Dict[str, Callable[[], Any]] = {
+        "_detect_delimiter": lambda: _detect_delimiter(text),
+        "_read_csv": lambda: _read_csv(text, delimiter=delimiter),
+        "validate_required_companions": lambda: validate_required_companions(rows, companion_map),
+        "validate_headers": lambda: [validate_headers(headers, HEADER_RULE_PARAMS) for _ in range(header_calls)],
+        "_parse_date_to_yyyy_mm_dd": lambda: [_parse_date_to_yyyy_mm_dd(d) for d in dates],
+    }
+
+    results = []
+    for name, fn in benchmarks.items():
+        seconds = _best_of(fn, repeat)
+        # validate_headers doesn't depend on the row count: report time per call instead
+        items = header_calls if name == "validate_headers" else size
+        result = {
+            "function": name,
+            "rows": size,
+            "bytes": len(text.encode("utf-8")) if name in ("_detect_delimiter", "_read_csv") else None,
+            "seconds": round(seconds, 6),
+            "items_per_s": round(items / seconds, 1) if seconds else None,
+        }
+        results.append(result)
+        print(f"{size:>10,} rows  {name:<30} {seconds:9.4f}s  {result['items_per_s']:>14,.0f} items/s", file=sys.stderr)
+    return results
+
+
+def compare(current: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["function"], r["rows"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared to {baseline_path} (ratio > 1 means slower now):", file=sys.stderr)
+    for r in current:
+        old = baseline.get((r["function"], r["rows"]))
+        if old and old["seconds"]:
+            ratio = r["seconds"] / old["seconds"]
+            flag = "  <-- regression" if ratio > 1.10 else ""
+            print(f"{r['rows']:>10,} rows  {r['function']:<30} x{ratio:5.2f}{flag}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark parsing and validation hot paths")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="Comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default=None, help="Version label stored in the results (default: git describe)")
+    parser.add_argument("--output", default=None, help="JSON results path (default: bench/<label>.json)")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    label = args.label or _git_version() or "unversioned"
+    results: List[Dict[str, Any]] = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        results.extend(bench_size(size, args.repeat, args.seed))
+        gc.collect()
+
+    output = args.output or os.path.join("bench", f"{label}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "label": label,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Compile the DB-driven rules into the shared snapshot file read by every API worker.
+
+    python -m scripts.build_rule_snapshot --output /var/lib/dash/rules.snapshot
+
+Run it after changing rules, companion codes or the code catalog. Workers started with
+RULE_SNAPSHOT_PATH pointing at the same file swap to the new snapshot within
+RULE_SNAPSHOT_CHECK_SECONDS, without reloading anything from the database.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+from app.database import ReadSessionLocal
+from app.services.rule_snapshot import build_snapshot
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the shared rule snapshot file")
+    parser.add_argument(
+        "--output",
+        default=os.getenv("RULE_SNAPSHOT_PATH"),
+        help="Snapshot path (default: RULE_SNAPSHOT_PATH)",
+    )
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output is required when RULE_SNAPSHOT_PATH is not set")
+
+    with ReadSessionLocal() as db:
+        version = build_snapshot(db, args.output)
+    print(f"Rule snapshot {args.output} written (version {version}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Set-based delta sync shared by the reference-data importers (codes, contexts, establishments).
+
+    result = sync_catalog(engine, "codes", path, Code.__table__, "code", parse_row, check_headers)
+
+A sync is skipped entirely when the file's SHA-256 matches the sync_manifests entry of the
+catalog. Otherwise the stored (key, content_hash) pairs are prefetched with one query, each chunk
+of CSV rows is hashed and only new or changed rows are written, with one batched
+INSERT ... ON CONFLICT (key) DO UPDATE per chunk. Rows missing from the file are deactivated in
+bulk (is_active = False) when the table has that column, and only counted otherwise.
+Everything, manifest included, runs in a single transaction.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Table, bindparam, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import SyncManifest
+
+DEFAULT_CHUNK_SIZE = 5000
+# Keys per UPDATE ... WHERE key IN (...) when deactivating
+_DEACTIVATE_BATCH = 500
+
+HASH_COLUMN = "content_hash"
+
+
+@dataclass
+class ImportResult:
+    total: int = 0        # CSV rows read, including skipped ones
+    skipped: int = 0      # incomplete rows (parse_row returned None)
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deactivated: int = 0  # active rows missing from the file, now is_active = False
+    missing: int = 0      # rows missing from the file in tables without is_active (kept as is)
+    file_unchanged: bool = False
+
+    @property
+    def diff_size(self) -> int:
+        return self.inserted + self.updated + self.deactivated
+
+    def summary(self) -> str:
+        if self.file_unchanged:
+            return "File unchanged since last sync: nothing to do."
+        text = (f"Processed: {self.total} | Inserted: {self.inserted} | Updated: {self.updated}"
+                f" | Unchanged: {self.unchanged} | Deactivated: {self.deactivated}")
+        if self.missing:
+            text += f" | Missing from file (kept): {self.missing}"
+        return text + f" | Diff: {self.diff_size} row(s)"
+
+
+def row_hash(row: Dict[str, Any], columns: Sequence[str]) -> str:
+    """
+    Hash of a row's values. NULL and "" hash the same, as the importers always treated them.
+    """
+    parts = ("" if row[col] is None else str(row[col]) for col in columns)
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _upsert_statement(conn: Connection, table: Table, key: str, columns: Sequence[str]):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[key]],
+        set_={col: stmt.excluded[col] for col in columns if col != key},
+    )
+
+
+def _write(conn: Connection, table: Table, key: str, columns: Sequence[str],
+           new_rows: List[Dict[str, Any]], changed_rows: List[Dict[str, Any]]) -> None:
+    upsert = _upsert_statement(conn, table, key, columns)
+    if upsert is not None:
+        if new_rows or changed_rows:
+            conn.execute(upsert, new_rows + changed_rows)
+        return
+
+    # Other dialects: plain batched INSERT and UPDATE
+    if new_rows:
+        conn.execute(table.insert(), new_rows)
+    if changed_rows:
+        stmt = (
+            update(table)
+            .where(table.c[key] == bindparam("_key"))
+            .values({col: bindparam(col) for col in columns if col != key})
+        )
+        conn.execute(stmt, [dict(row, _key=row[key]) for row in changed_rows])
+
+
+def _deactivate(conn: Connection, table: Table, key: str, keys: List[Any]) -> None:
+    # Clearing the hash makes a row that comes back in a later file count as changed
+    for start in range(0, len(keys), _DEACTIVATE_BATCH):
+        batch = keys[start:start + _DEACTIVATE_BATCH]
+        conn.execute(
+            update(table).where(table.c[key].in_(batch)).values({"is_active": False, HASH_COLUMN: None})
+        )
+
+
+def upsert_rows(
+    conn: Connection,
+    table: Table,
+    key: str,
+    rows: Iterable[Optional[Dict[str, Any]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    deactivate_missing: bool = False,
+) -> ImportResult:
+    """
+    Insert or update `rows` (dicts of column values; None for a skipped CSV row) keyed on the
+    unique column `key`, comparing content hashes with the stored ones. When a key repeats in
+    the input, the last row wins. With deactivate_missing, stored rows absent from `rows` are
+    deactivated (or counted as missing when the table has no is_active column).
+    """
+    result = ImportResult()
+    has_active = "is_active" in table.c
+    prefetch = [table.c[key], table.c[HASH_COLUMN]] + ([table.c.is_active] if has_active else [])
+    stored: Dict[Any, Optional[str]] = {}
+    active: Dict[Any, bool] = {}
+    for r in conn.execute(select(*prefetch)):
+        stored[r[0]] = r[1]
+        active[r[0]] = bool(r[2]) if has_active else True
+    seen = set()
+    columns: Optional[List[str]] = None
+
+    for chunk in _chunks(rows, chunk_size):
+        result.total += len(chunk)
+        parsed = [row for row in chunk if row is not None]
+        result.skipped += len(chunk) - len(parsed)
+        if not parsed:
+            continue
+        if columns is None:
+            columns = list(parsed[0]) + [HASH_COLUMN]
+
+        new_rows: Dict[Any, Dict[str, Any]] = {}
+        changed_rows: Dict[Any, Dict[str, Any]] = {}
+        for row in parsed:
+            k = row[key]
+            digest = row_hash(row, columns[:-1])
+            seen.add(k)
+            if k not in stored:
+                result.inserted += 1
+            elif stored[k] == digest:
+                result.unchanged += 1
+                continue
+            else:
+                result.updated += 1
+            is_new = k not in stored or k in new_rows
+            stored[k] = digest
+            (new_rows if is_new else changed_rows)[k] = dict(row, **{HASH_COLUMN: digest})
+
+        _write(conn, table, key, columns, list(new_rows.values()), list(changed_rows.values()))
+
+    if deactivate_missing:
+        gone = [k for k in stored if k not in seen and active.get(k, False)]
+        if has_active:
+            _deactivate(conn, table, key, gone)
+            result.deactivated = len(gone)
+        else:
+            result.missing = len(gone)
+    return result
+
+
+def sync_catalog(
+    engine: Engine,
+    catalog: str,
+    path: str,
+    table: Table,
+    key: str,
+    parse_row: Callable[[Dict[str, str]], Optional[Dict[str, Any]]],
+    check_headers: Callable[[List[str]], None],
+    force: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> ImportResult:
+    """
+    Delta-sync one catalog CSV into `table` and record the file in sync_manifests.
+    check_headers raises ValueError on an unexpected header row.
+    """
+    sha256 = file_sha256(path)
+    manifests = SyncManifest.__table__
+    with engine.begin() as conn:
+        previous = conn.execute(
+            select(manifests.c.file_sha256).where(manifests.c.catalog == catalog)
+        ).scalar()
+        if previous == sha256 and not force:
+            return ImportResult(file_unchanged=True)
+
+        # utf-8-sig tolerates a BOM in the header
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            check_headers(list(reader.fieldnames or []))
+            result = upsert_rows(
+                conn, table, key, (parse_row(row) for row in reader),
+                chunk_size=chunk_size, deactivate_missing=True,
+            )
+
+        entry = {
+            "catalog": catalog,
+            "file_sha256": sha256,
+            "row_count": result.total,
+            "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        if previous is None:
+            conn.execute(manifests.insert(), entry)
+        else:
+            conn.execute(manifests.update().where(manifests.c.catalog == catalog), entry)
+    return result
+
+
+def parse_args(description: str, default_path: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("path", nargs="?", default=default_path, help="Catalog CSV file")
+    parser.add_argument("--force", action="store_true", help="Sync even if the file is unchanged since the last sync")
+    return parser.parse_args()
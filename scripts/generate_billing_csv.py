@@ -0,0 +1,172 @@
+"""
+Generate synthetic RAMQ billing exports for benchmarks and load tests.
+
+    python -m scripts.generate_billing_csv --rows 1000000 --output /tmp/billing_1m.csv
+
+Invoices get a doctor, a patient and a service date; their lines get consecutive
+Début/Fin slots and codes drawn from --codes. When an invoice contains a code that has a
+companion (--companions), the companion is added unless the invoice is picked as a
+violation (--violation-rate).
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+HEADERS = [
+    "#", "Facture", "ID RAMQ", "Date de Service", "Début", "Fin", "Periode",
+    "Lieu de pratique", "Secteur d'activité", "Diagnostic", "Code", "Unités",
+    "Règle", "Élément de contexte", "Montant Preliminaire", "Montant payé",
+    "Doctor Info", "Patient",
+]
+
+DEFAULT_CODES = "19928:0.35,15802:0.15,19957:0.10,00103:0.15,08857:0.15,09150:0.10"
+DEFAULT_COMPANIONS = "15802:19957"
+
+
+def parse_weights(spec: str) -> List[Tuple[str, float]]:
+    """
+    '19928:0.35,15802:0.15' -> [('19928', 0.35), ('15802', 0.15)]
+    """
+    pairs = []
+    for item in spec.split(","):
+        code, _, weight = item.strip().partition(":")
+        pairs.append((code, float(weight or 1)))
+    return pairs
+
+
+def parse_companions(spec: str) -> Dict[str, List[str]]:
+    """
+    '15802:19957,15803:19957+19958' -> {'15802': ['19957'], '15803': ['19957', '19958']}
+    """
+    companions: Dict[str, List[str]] = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        code, _, required = item.partition(":")
+        companions[code] = required.split("+")
+    return companions
+
+
+def _amount(cents: int) -> str:
+    """
+    Quebec export format: '1 234,56 $'
+    """
+    whole, frac = divmod(cents, 100)
+    return f"{whole:,}".replace(",", " ") + f",{frac:02d} $"
+
+
+def generate_rows(
+    rows: int,
+    invoices: int,
+    doctors: int,
+    patients: int,
+    codes: Sequence[Tuple[str, float]],
+    companions: Dict[str, List[str]],
+    violation_rate: float,
+    start: date = date(2025, 1, 6),
+    seed: Optional[int] = None,
+) -> Iterator[List[str]]:
+    rng = random.Random(seed)
+    code_values = [c for c, _ in codes]
+    code_weights = [w for _, w in codes]
+    prices = {c: rng.randrange(1500, 25000) for c in code_values}
+    for required in companions.values():
+        for c in required:
+            prices.setdefault(c, rng.randrange(1500, 25000))
+    lines_per_invoice = max(rows // max(invoices, 1), 1)
+    # Next free minute per (doctor, day) so generated intervals don't overlap
+    next_slot: Dict[Tuple[int, int], int] = {}
+
+    produced = 0
+    invoice_no = 0
+    while produced < rows:
+        invoice_no += 1
+        doctor = rng.randrange(doctors)
+        patient = rng.randrange(patients)
+        day = rng.randrange(90)
+        service_date = (start + timedelta(days=day)).isoformat()
+        periode = str(day // 14 + 1)
+
+        n = min(lines_per_invoice, rows - produced)
+        invoice_codes = rng.choices(code_values, code_weights, k=n)
+        if rng.random() >= violation_rate:
+            for c in list(invoice_codes):
+                for required in companions.get(c, ()):
+                    if required not in invoice_codes and len(invoice_codes) < rows - produced:
+                        invoice_codes.append(required)
+
+        for line, code in enumerate(invoice_codes, start=1):
+            slot = next_slot.get((doctor, day), 8 * 60)
+            length = rng.choice((10, 15, 20, 30))
+            next_slot[(doctor, day)] = slot + length
+            begin, end = slot % 1440, (slot + length) % 1440
+            prelim = prices[code]
+            paid = prelim if rng.random() < 0.9 else 0
+            yield [
+                str(line),
+                f"F{invoice_no:09d}",
+                f"R{invoice_no:09d}{line:02d}",
+                service_date,
+                f"{begin // 60:02d}:{begin % 60:02d}",
+                f"{end // 60:02d}:{end % 60:02d}",
+                periode,
+                f"{50000 + doctor % 500}",
+                "Cabinet",
+                "V70",
+                code,
+                "1",
+                "",
+                "",
+                _amount(prelim),
+                _amount(paid) if paid else "",
+                f"Dr {doctor:05d}",
+                f"PAT{patient:08d}",
+            ]
+            produced += 1
+
+
+def write_csv(out: TextIO, delimiter: str = ";", **kwargs) -> int:
+    writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(HEADERS)
+    count = 0
+    for row in generate_rows(**kwargs):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic RAMQ billing CSV")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--invoices", type=int, default=None, help="Default: rows / 4")
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--codes", default=DEFAULT_CODES, help="code:weight,...")
+    parser.add_argument("--companions", default=DEFAULT_COMPANIONS, help="code:required[+required],...")
+    parser.add_argument("--violation-rate", type=float, default=0.05, help="Share of invoices missing a companion")
+    parser.add_argument("--delimiter", default=";")
+    parser.add_argument("--encoding", default="utf-8-sig", help="e.g. utf-8, utf-8-sig, latin-1")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    with open(args.output, "w", encoding=args.encoding, newline="") as out:
+        count = write_csv(
+            out,
+            delimiter=args.delimiter,
+            rows=args.rows,
+            invoices=args.invoices or max(args.rows // 4, 1),
+            doctors=args.doctors,
+            patients=args.patients,
+            codes=parse_weights(args.codes),
+            companions=parse_companions(args.companions),
+            violation_rate=args.violation_rate,
+            seed=args.seed,
+        )
+    print(f"Wrote {count} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-﻿import csv
-import os
+﻿import os
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from app.database import get_engine
 from app.models import Code
+from scripts.bulk_import import parse_args, sync_catalog
 
 CSV_PATH = r"C:\Users\monti\Projects\DashValidator\data\codes.csv"
 
@@ -12,56 +12,34 @@ def parse_bool(val: str | None) -> bool:
         return False
     return str(val).strip().lower() in {"1", "true", "yes", "y"}
 
+def parse_row(row: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    code_val = (row.get("code") or "").strip()
+    name_val = (row.get("name") or "").strip()
+    if not code_val or not name_val:
+        # Skip incomplete lines
+        return None
+    return {
+        "code": code_val,
+        "name": name_val,
+        "description": row.get("description") or None,
+        "is_active": parse_bool(row.get("is_active")),
+    }
+
+def check_headers(fieldnames: List[str]) -> None:
+    required = {"code", "name", "description", "is_active"}
+    if set(fieldnames) != required:
+        raise ValueError(f"CSV headers must be exactly: {sorted(required)}; got: {fieldnames}")
+
 def main() -> None:
+    args = parse_args("Sync the billing code catalog", CSV_PATH)
     load_dotenv()
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
         raise RuntimeError("DATABASE_URL not set in .env")
-    engine = create_engine(db_url, pool_pre_ping=True)
-
-    inserted = 0
-    updated = 0
-    total = 0
-
-    with open(CSV_PATH, "r", encoding="utf-8-sig", newline="") as f, Session(engine) as session:
-        reader = csv.DictReader(f)
-        required = {"code", "name", "description", "is_active"}
-        if set(reader.fieldnames or []) != required:
-            raise ValueError(f"CSV headers must be exactly: {sorted(required)}; got: {reader.fieldnames}")
-
-        for row in reader:
-            total += 1
-            code_val = (row.get("code") or "").strip()
-            name_val = (row.get("name") or "").strip()
-            desc_val = row.get("description") or None
-            active_val = parse_bool(row.get("is_active"))
+    engine = get_engine(db_url)
 
-            if not code_val or not name_val:
-                # Skip incomplete lines
-                continue
-
-            existing = session.query(Code).filter_by(code=code_val).first()
-            if existing:
-                changed = False
-                if existing.name != name_val:
-                    existing.name = name_val
-                    changed = True
-                if (existing.description or "") != (desc_val or ""):
-                    existing.description = desc_val
-                    changed = True
-                if existing.is_active != active_val:
-                    existing.is_active = active_val
-                    changed = True
-                if changed:
-                    updated += 1
-            else:
-                session.add(Code(code=code_val, name=name_val, description=desc_val, is_active=active_val))
-                inserted += 1
-
-        session.commit()
-
-    print(f"Processed: {total} rows | Inserted: {inserted} | Updated: {updated}")
+    result = sync_catalog(engine, "codes", args.path, Code.__table__, "code", parse_row, check_headers, force=args.force)
+    print(result.summary())
 
 if __name__ == "__main__":
     main()
-
@@ -1,9 +1,9 @@
-﻿import csv
-import os
+﻿import os
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from app.database import get_engine
 from app.models import Establishment
+from scripts.bulk_import import parse_args, sync_catalog
 
 CSV_PATH = r"C:\Users\monti\Projects\DashValidator\data\establishments.csv"
 
@@ -12,62 +12,39 @@ def parse_bool(val: str | None) -> bool:
         return False
     return str(val).strip().lower() in {"1", "true", "yes", "y"}
 
+def parse_row(row: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    number = (row.get("number") or "").strip()
+    name = (row.get("name") or "").strip()
+    if not number or not name:
+        # skip incomplete rows
+        return None
+    return {
+        "number": number,
+        "name": name,
+        "city": (row.get("city") or "").strip() or None,
+        "region_code": (row.get("region_code") or "").strip() or None,
+        "is_active": parse_bool(row.get("is_active")),
+    }
+
+def check_headers(fieldnames: List[str]) -> None:
+    required = ["number", "name", "city", "region_code", "is_active"]
+    if fieldnames != required:
+        raise ValueError(f"CSV headers must be exactly: {required}; got: {fieldnames}")
+
 def main() -> None:
+    args = parse_args("Sync the establishment registry", CSV_PATH)
     load_dotenv()
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
         raise RuntimeError("DATABASE_URL not set in .env")
-    engine = create_engine(db_url, pool_pre_ping=True)
-
-    inserted = 0
-    updated = 0
-    total = 0
-
-    # Use utf-8-sig to tolerate BOM in header
-    with open(CSV_PATH, "r", encoding="utf-8-sig", newline="") as f, Session(engine) as session:
-        reader = csv.DictReader(f)
-        required = ["number", "name", "city", "region_code", "is_active"]
-        if [*reader.fieldnames] != required:
-            raise ValueError(f"CSV headers must be exactly: {required}; got: {reader.fieldnames}")
-
-        for row in reader:
-            total += 1
-            number = (row.get("number") or "").strip()
-            name = (row.get("name") or "").strip()
-            city = (row.get("city") or "").strip() or None
-            region_code = (row.get("region_code") or "").strip() or None
-            is_active = parse_bool(row.get("is_active"))
-
-            if not number or not name:
-                # skip incomplete rows
-                continue
-
-            existing = session.query(Establishment).filter_by(number=number).first()
-            if existing:
-                changed = False
-                if existing.name != name:
-                    existing.name = name; changed = True
-                if (existing.city or "") != (city or ""):
-                    existing.city = city; changed = True
-                if (existing.region_code or "") != (region_code or ""):
-                    existing.region_code = region_code; changed = True
-                if existing.is_active != is_active:
-                    existing.is_active = is_active; changed = True
-                if changed:
-                    updated += 1
-            else:
-                session.add(Establishment(
-                    number=number,
-                    name=name,
-                    city=city,
-                    region_code=region_code,
-                    is_active=is_active
-                ))
-                inserted += 1
-
-        session.commit()
-
-    print(f"Processed: {total} | Inserted: {inserted} | Updated: {updated}")
+    engine = get_engine(db_url)
+
+    # ON CONFLICT (number) relies on the unique index from migration 9b2e4f7a1c3d
+    result = sync_catalog(
+        engine, "establishments", args.path, Establishment.__table__, "number",
+        parse_row, check_headers, force=args.force,
+    )
+    print(result.summary())
 
 if __name__ == "__main__":
     main()
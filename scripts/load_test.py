@@ -0,0 +1,310 @@
+"""
+End-to-end load test for the FastAPI app (app/main.py).
+
+    python -m scripts.load_test --duration 60 --concurrency 16 --upload-rows 200000 --workers 2
+
+Creates a throwaway SQLite database seeded with reference data and rules, starts uvicorn on it,
+then drives mixed traffic (large /ingest uploads, /metrics uploads, /codes reads, /health probes)
+from a thread pool. Reports p50/p95/p99 latency, throughput, status codes and the peak server
+RSS seen while each endpoint had requests in flight. Linux only for RSS (/proc).
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts.generate_billing_csv import (
+    DEFAULT_CODES,
+    DEFAULT_COMPANIONS,
+    parse_companions,
+    parse_weights,
+    write_csv,
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_database(db_url: str) -> None:
+    """
+    Create the tables the app reads and seed codes, contexts, establishments and rules.
+    """
+    # app.database reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = db_url
+    from sqlalchemy import text
+    from app.database import Base, get_engine
+    from app import models
+    from app.validators import metadata as validator_metadata
+
+    engine = get_engine(db_url)
+    Base.metadata.create_all(engine)
+    validator_metadata.create_all(engine)
+    with engine.begin() as conn:
+        for code, _ in parse_weights(DEFAULT_CODES):
+            conn.execute(
+                models.Code.__table__.insert(),
+                {"code": code, "name": f"Code {code}", "description": "Load test", "is_active": True},
+            )
+        conn.execute(models.Context.__table__.insert(), {"key": "after_hours", "value": "Y", "description": "Load test"})
+        for n in range(500):
+            conn.execute(
+                models.Establishment.__table__.insert(),
+                {"number": str(50000 + n), "name": f"Clinique {n}", "city": "Québec", "region_code": "03", "is_active": True},
+            )
+        for code, required in parse_companions(DEFAULT_COMPANIONS).items():
+            for req in required:
+                conn.execute(
+                    text("INSERT INTO required_companion_codes (code, requires_code, active) VALUES (:c, :r, 1)"),
+                    {"c": code, "r": req},
+                )
+        conn.execute(
+            text("INSERT INTO rules (code, is_active, config_json) VALUES ('frequency_limit', 1, :cfg)"),
+            {"cfg": json.dumps({"limits": [{"code": "00103", "max": 1, "window": "day"}]})},
+        )
+    engine.dispose()
+
+
+def make_upload(rows: int, seed: int) -> bytes:
+    buf = io.StringIO()
+    write_csv(
+        buf,
+        delimiter=";",
+        rows=rows,
+        invoices=max(rows // 4, 1),
+        doctors=200,
+        patients=50_000,
+        codes=parse_weights(DEFAULT_CODES),
+        companions=parse_companions(DEFAULT_COMPANIONS),
+        violation_rate=0.05,
+        seed=seed,
+    )
+    return buf.getvalue().encode("utf-8")
+
+
+def _multipart(filename: str, data: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+    ).encode("utf-8")
+    return head + data + f"\r\n--{boundary}--\r\n".encode("utf-8"), f"multipart/form-data; boundary={boundary}"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_bytes(pids: List[int]) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+def _server_pids(root_pid: int) -> List[int]:
+    """
+    uvicorn --workers N forks worker processes; include every descendant of the root.
+    """
+    pids = [root_pid]
+    try:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                    children.setdefault(ppid, []).append(int(entry))
+                except (OSError, ValueError, IndexError):
+                    continue
+        queue = [root_pid]
+        while queue:
+            for child in children.get(queue.pop(), []):
+                pids.append(child)
+                queue.append(child)
+    except OSError:
+        pass
+    return pids
+
+
+class Recorder:
+    """
+    Thread-safe latency/status recorder with in-flight tracking for RSS attribution.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.peak_rss: Dict[str, int] = defaultdict(int)
+
+    def start(self, endpoint: str) -> None:
+        with self.lock:
+            self.in_flight[endpoint] += 1
+
+    def finish(self, endpoint: str, status: str, seconds: float) -> None:
+        with self.lock:
+            self.in_flight[endpoint] -= 1
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def sample_rss(self, rss: int) -> None:
+        with self.lock:
+            for endpoint, n in self.in_flight.items():
+                if n > 0 and rss > self.peak_rss[endpoint]:
+                    self.peak_rss[endpoint] = rss
+
+
+def _request(url: str, data: Optional[bytes] = None, content_type: Optional[str] = None, timeout: float = 300) -> str:
+    req = urllib.request.Request(url, data=data, method="POST" if data is not None else "GET")
+    if content_type:
+        req.add_header("Content-Type", content_type)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return str(resp.status)
+    except urllib.error.HTTPError as e:
+        e.read()
+        return str(e.code)
+    except Exception as e:
+        return type(e).__name__
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(k, len(sorted_values) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the DashValidator API")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--upload-rows", type=int, default=100_000, help="Rows per /ingest upload")
+    parser.add_argument("--metrics-rows", type=int, default=20_000, help="Rows per /metrics upload")
+    parser.add_argument("--mix", default="ingest:1,metrics:2,codes:5,health:5", help="endpoint:weight,...")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--keep-db", action="store_true", help="Keep the temporary directory")
+    parser.add_argument("--output", default=None, help="Write the report as JSON too")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dash-load-")
+    db_url = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    seed_database(db_url)
+    print(f"Seeded {db_url}", file=sys.stderr)
+
+    ingest_body, ingest_type = _multipart("load.csv", make_upload(args.upload_rows, seed=1))
+    metrics_body, metrics_type = _multipart("metrics.csv", make_upload(args.metrics_rows, seed=2))
+    print(f"Upload sizes: ingest {len(ingest_body) / 1e6:.1f} MB, metrics {len(metrics_body) / 1e6:.1f} MB", file=sys.stderr)
+
+    port = args.port or _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_URL=db_url)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env=env,
+    )
+    try:
+        deadline = time.time() + 30
+        while _request(f"{base}/health", timeout=2) != "200":
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("Server did not become healthy")
+            time.sleep(0.2)
+
+        endpoints = {
+            "ingest": lambda: _request(f"{base}/ingest", ingest_body, ingest_type),
+            "metrics": lambda: _request(f"{base}/metrics/unique-patients-by-day", metrics_body, metrics_type),
+            "codes": lambda: _request(f"{base}/codes/"),
+            "health": lambda: _request(f"{base}/health"),
+        }
+        mix = [(name, float(weight)) for name, weight in (item.split(":") for item in args.mix.split(","))]
+        names = [name for name, _ in mix]
+        weights = [weight for _, weight in mix]
+
+        recorder = Recorder()
+        stop = threading.Event()
+
+        def sampler() -> None:
+            while not stop.is_set():
+                recorder.sample_rss(_rss_bytes(_server_pids(server.pid)))
+                time.sleep(0.1)
+
+        def client(seed: int) -> None:
+            rng = random.Random(seed)
+            while not stop.is_set():
+                endpoint = rng.choices(names, weights)[0]
+                recorder.start(endpoint)
+                started = time.perf_counter()
+                status = endpoints[endpoint]()
+                recorder.finish(endpoint, status, time.perf_counter() - started)
+
+        sampler_thread = threading.Thread(target=sampler, daemon=True)
+        sampler_thread.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for n in range(args.concurrency):
+                pool.submit(client, n)
+            time.sleep(args.duration)
+            stop.set()
+        elapsed = time.perf_counter() - started
+        sampler_thread.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report: Dict[str, Any] = {"duration_s": round(elapsed, 2), "concurrency": args.concurrency,
+                              "workers": args.workers, "endpoints": {}}
+    print(f"\n{'endpoint':<10}{'count':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak RSS MB':>13}  statuses")
+    for name in names:
+        values = sorted(recorder.latencies.get(name, []))
+        stats = {
+            "count": len(values),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(_percentile(values, 50) * 1000, 1),
+            "p95_ms": round(_percentile(values, 95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 99) * 1000, 1),
+            "peak_rss_mb": round(recorder.peak_rss.get(name, 0) / 1e6, 1),
+            "statuses": dict(recorder.statuses.get(name, {})),
+        }
+        report["endpoints"][name] = stats
+        print(f"{name:<10}{stats['count']:>8}{stats['throughput_rps']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['peak_rss_mb']:>13}  {stats['statuses']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
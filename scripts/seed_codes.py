@@ -1,9 +1,8 @@
 ﻿import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 from app.models import Code
-from app.database import Base
+from app.database import Base, get_engine
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +11,7 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set in .env")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = get_engine(DATABASE_URL)
 
 # Create a new session
 with Session(engine) as session:
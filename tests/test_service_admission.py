@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.admission import MB, AdmissionController, ReservationRejected, reservation_grower
+
+
+def _controller(**overrides):
+    settings = dict(
+        max_upload_bytes=100 * MB,
+        memory_budget_bytes=100 * MB,
+        memory_factor=2.0,
+        concurrency={"ingest": 1, "precheck": 4, "upload": 4},
+        prefixes={"/ingest/precheck": "precheck", "/ingest/uploads": "upload", "/ingest": "ingest"},
+        read_limits={"precheck": 1 * MB, "upload": 1 * MB},
+    )
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def test_classify():
+    controller = _controller()
+    assert controller.classify("/ingest") == "ingest"
+    assert controller.classify("/ingest", "precheck=true") == "precheck"
+    assert controller.classify("/ingest", "precheck=false") == "ingest"
+    assert controller.classify("/ingest/precheck") == "precheck"
+    assert controller.classify("/ingest/uploads/abc/chunks/1") == "upload"
+    assert controller.classify("/ingest/uploads/abc/finalize") == "ingest"
+    assert controller.classify("/codes") is None
+
+
+def test_size_concurrency_and_budget():
+    controller = _controller()
+    assert controller.try_admit("ingest", 101 * MB)[1][0] == 413
+    assert controller.try_admit("ingest", 60 * MB)[1][0] == 413  # 120 MB once parsed
+    ticket, rejection = controller.try_admit("ingest", 10 * MB)
+    assert rejection is None and ticket.reserved_bytes == 20 * MB
+    assert controller.try_admit("ingest", 1 * MB)[1][0] == 429  # concurrency
+    # Read-limited classes reserve for what they read, not for the body
+    chunk, rejection = controller.try_admit("upload", None)
+    assert rejection is None and chunk.reserved_bytes == 2 * MB
+    controller.release(ticket)
+    controller.release(chunk)
+    assert controller.reserved_bytes == 0 and controller.in_flight["ingest"] == 0
+    assert controller.rejected == {413: 2, 429: 1}
+
+
+def test_held_bytes_count_against_the_budget():
+    controller = _controller()
+    held = [45 * MB]
+    controller.track(lambda: held[0])
+    assert controller.try_admit("ingest", 10 * MB)[1][0] == 429
+    held[0] = 0
+    assert controller.try_admit("ingest", 10 * MB)[1] is None
+
+
+def test_reservation_grows_with_decompressed_size():
+    controller = _controller()
+    ticket, _ = controller.try_admit("ingest", 1 * MB)
+    grow = reservation_grower(SimpleNamespace(admission_controller=controller, admission_ticket=ticket))
+    grow(10 * MB)
+    assert ticket.reserved_bytes == controller.reserved_bytes == 20 * MB
+    grow(5 * MB)  # never shrinks
+    assert ticket.reserved_bytes == 20 * MB
+    with pytest.raises(ReservationRejected) as excinfo:
+        grow(60 * MB)
+    assert excinfo.value.status_code == 413
+    controller.release(ticket)
+    assert controller.reserved_bytes == 0
+    assert reservation_grower(SimpleNamespace()) is None
+
+
+def test_growth_that_must_wait_gets_retry_after():
+    controller = _controller(concurrency={"ingest": 2})
+    first, _ = controller.try_admit("ingest", 20 * MB)
+    second, _ = controller.try_admit("ingest", 1 * MB)
+    grow = reservation_grower(SimpleNamespace(admission_controller=controller, admission_ticket=second))
+    with pytest.raises(ReservationRejected) as excinfo:
+        grow(40 * MB)
+    assert (excinfo.value.status_code, excinfo.value.retry_after) == (429, controller.retry_after_seconds)
+    assert controller.reserved_bytes == 42 * MB
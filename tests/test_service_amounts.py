@@ -0,0 +1,61 @@
+import pytest
+
+from app.services.amounts import ENGLISH, FRENCH, AmountParser, detect_amount_format, format_cents
+
+
+@pytest.mark.parametrize(
+    "raw, cents",
+    [
+        ("12,00 $", 1200),
+        ("1 234,56 $", 123456),
+        ("1\xa0234,56\xa0$", 123456),        # no-break space
+        ("1\u202f234,5", 123450),            # narrow no-break space
+        ("0,07", 7),
+        (",5", 50),
+        ("(10,00 $)", -1000),
+        ("10,00-", -1000),
+        ("-3", -300),
+        ("+3,10", 310),
+        ("1,005", 101),                      # more than two decimals: rounded half up
+    ],
+)
+def test_french_amounts(raw, cents):
+    assert AmountParser(FRENCH).cents(raw) == cents
+
+
+@pytest.mark.parametrize(
+    "raw, cents",
+    [
+        ("1,234.56", 123456),
+        ("$1,234.56", 123456),
+        ("12.5", 1250),
+        ("(0.99)", -99),
+    ],
+)
+def test_english_amounts(raw, cents):
+    assert AmountParser(ENGLISH).cents(raw) == cents
+
+
+@pytest.mark.parametrize("raw", ["", "   ", "$", "abc", "12,34,56", "1,2a", "١٢"])
+def test_blank_or_unparseable_is_none(raw):
+    assert AmountParser(FRENCH).cents(raw) is None
+
+
+def test_results_are_memoized():
+    parser = AmountParser(FRENCH)
+    for _ in range(3):
+        parser.cents("12,00 $")
+    assert (parser.misses, parser.hits) == (1, 2)
+
+
+def test_format_detection_votes():
+    assert detect_amount_format(["12,00 $", "1 234,56 $"]) is FRENCH
+    assert detect_amount_format(["12.00", "1,234.56"]) is ENGLISH
+    # A separator followed by three digits is ambiguous: no evidence, Quebec convention
+    assert detect_amount_format(["1,234", "5.000"]) is FRENCH
+    assert AmountParser.from_samples(["", "3.50"]).format is ENGLISH
+
+
+def test_format_cents():
+    assert format_cents(123456) == "1234.56"
+    assert format_cents(-5) == "-0.05"
@@ -0,0 +1,115 @@
+import hashlib
+
+import pytest
+
+from app.services.chunked_upload import ChunkRejected, UploadConflict, UploadNotFound, UploadStore
+
+
+class Recorder:
+    """Consumer that keeps what it was fed."""
+
+    def __init__(self):
+        self.data = b""
+        self.decompressed_bytes = 0
+
+    def feed(self, data):
+        self.data += data
+        self.decompressed_bytes += len(data)
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+CHUNKS = [b"Facture;Code\n", b"F1;15802\n", b"F2;15803\n"]
+
+
+def test_out_of_order_chunks_are_fed_in_order(tmp_path):
+    store = UploadStore(str(tmp_path), Recorder)
+    upload = store.create("a.csv")
+    upload.put_chunk(3, CHUNKS[2], _sha(CHUNKS[2]))
+    upload.put_chunk(2, CHUNKS[1], _sha(CHUNKS[1]))
+    assert upload.consumer.data == b""
+    status = upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))
+    assert upload.consumer.data == b"".join(CHUNKS)
+    assert status["received_chunks"] == [1, 2, 3]
+    assert status["next_chunk"] == 4
+    upload.finalize(3, _sha(b"".join(CHUNKS)))
+    assert upload.finalized
+
+
+def test_chunk_checksum_mismatch_is_rejected_and_not_stored(tmp_path):
+    upload = UploadStore(str(tmp_path), Recorder).create(None)
+    with pytest.raises(ChunkRejected, match="Checksum mismatch"):
+        upload.put_chunk(1, CHUNKS[0], _sha(b"something else"))
+    assert upload.status()["received_chunks"] == []
+
+
+def test_resent_chunk_must_match(tmp_path):
+    upload = UploadStore(str(tmp_path), Recorder).create(None)
+    upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))
+    upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))  # retry: no-op
+    assert upload.consumer.data == CHUNKS[0]
+    with pytest.raises(UploadConflict):
+        upload.put_chunk(1, CHUNKS[1], _sha(CHUNKS[1]))
+
+
+def test_finalize_checks_chunks_and_file_checksum(tmp_path):
+    upload = UploadStore(str(tmp_path), Recorder).create(None)
+    upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))
+    upload.put_chunk(3, CHUNKS[2], _sha(CHUNKS[2]))
+    with pytest.raises(ChunkRejected, match="Missing chunk"):
+        upload.finalize(3)
+    with pytest.raises(ChunkRejected, match="beyond total_chunks"):
+        upload.finalize(1)
+    upload.put_chunk(2, CHUNKS[1], _sha(CHUNKS[1]))
+    with pytest.raises(ChunkRejected, match="File checksum mismatch"):
+        upload.finalize(3, _sha(b"other file"))
+    upload.finalize(3)
+    with pytest.raises(UploadConflict):
+        upload.finalize(3)
+
+
+def test_another_worker_picks_up_the_chunks(tmp_path):
+    first, second = UploadStore(str(tmp_path), Recorder), UploadStore(str(tmp_path), Recorder)
+    upload = first.create("a.csv")
+    upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))
+    other = second.get(upload.id)
+    assert other.filename == "a.csv"
+    other.put_chunk(2, CHUNKS[1], _sha(CHUNKS[1]))
+    other.put_chunk(3, CHUNKS[2], _sha(CHUNKS[2]))
+    upload.finalize(3)
+    assert upload.consumer.data == b"".join(CHUNKS)
+    with pytest.raises(UploadConflict):
+        other.finalize(3)
+    first.discard(upload.id)
+    with pytest.raises(UploadNotFound):
+        other.refresh()
+
+
+def test_parse_ahead_stops_at_the_budget(tmp_path):
+    store = UploadStore(str(tmp_path), Recorder, parse_ahead_bytes=len(CHUNKS[0]))
+    upload = store.create(None)
+    for number, chunk in enumerate(CHUNKS, start=1):
+        upload.put_chunk(number, chunk, _sha(chunk), store.parse_allowance(upload))
+    assert upload.consumer.data == CHUNKS[0]
+    assert store.held_bytes() == len(CHUNKS[0])
+    # Finalize parses the rest
+    upload.finalize(3)
+    assert upload.consumer.data == b"".join(CHUNKS)
+
+
+def test_sweep_evicts_idle_uploads_but_keeps_their_chunks(tmp_path):
+    store = UploadStore(str(tmp_path), Recorder, idle_seconds=0)
+    upload = store.create(None)
+    upload.put_chunk(1, CHUNKS[0], _sha(CHUNKS[0]))
+    store.sweep()
+    assert store.held_bytes() == 0
+    resumed = store.get(upload.id)
+    assert resumed is not upload
+    assert resumed.status()["received_chunks"] == [1]
+
+
+def test_unknown_upload(tmp_path):
+    with pytest.raises(UploadNotFound):
+        UploadStore(str(tmp_path), Recorder).get("0" * 32)
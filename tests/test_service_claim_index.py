@@ -0,0 +1,55 @@
+from app.services.claim_index import ClaimIndex
+from app.validators import claim_fingerprint, validate_cross_file_duplicates
+
+
+def _line(facture, code="15802"):
+    return {"Facture": facture, "#": "1", "ID RAMQ": "R1", "Date de Service": "2025-01-01", "Code": code}
+
+
+def test_bloom_false_positive_falls_back_to_the_table(tmp_path):
+    index = ClaimIndex(str(tmp_path / "claims.db"))
+    index.add([1, 2], "a.csv")
+    # A fingerprint the filter wrongly reports as present: SQLite has the final word
+    index._bloom.add(3)
+    assert index.lookup([1, 3]) == {1: "a.csv"}
+    assert index.bloom_passed == 2
+
+
+def test_bloom_negatives_skip_sqlite(tmp_path):
+    index = ClaimIndex(str(tmp_path / "claims.db"))
+    index.add([1], "a.csv")
+    assert index.lookup([10, 11, 12]) == {}
+    assert (index.lookups, index.bloom_passed) == (3, 0)
+
+
+def test_fingerprints_added_by_another_process_are_found(tmp_path):
+    path = str(tmp_path / "claims.db")
+    first, second = ClaimIndex(path), ClaimIndex(path)
+    first.add([7], "a.csv")
+    assert second.lookup([7]) == {7: "a.csv"}
+
+
+def test_pruned_batches_make_a_stale_process_rebuild(tmp_path):
+    path = str(tmp_path / "claims.db")
+    writer, reader = ClaimIndex(path, batch_keep_seconds=0), ClaimIndex(path)
+    writer.add([1], "a.csv")
+    writer.add([2], "b.csv")  # deletes the first batch before the reader saw it
+    assert writer._conn.execute("SELECT COUNT(*) FROM claim_fingerprint_batches").fetchone()[0] == 1
+    assert reader.lookup([1, 2]) == {1: "a.csv", 2: "b.csv"}
+
+
+def test_cross_file_duplicates_flag_other_exports_only(tmp_path):
+    index = ClaimIndex(str(tmp_path / "claims.db"))
+    first = [_line("F1"), _line("F2")]
+    assert validate_cross_file_duplicates(first, index, "jan.csv") == []
+    # Re-validating the same export is not a duplicate of itself
+    assert validate_cross_file_duplicates(first, index, "jan.csv") == []
+
+    errors = validate_cross_file_duplicates([_line("F3"), _line("F2")], index, "feb.csv")
+    assert [(e["row"], e["facture"]) for e in errors] == [("2", "F2")]
+    assert errors[0]["previous_source"].startswith("jan.csv#")
+
+
+def test_fingerprint_keeps_field_boundaries():
+    assert claim_fingerprint({"Facture": "1", "#": "23"}) != claim_fingerprint({"Facture": "12", "#": "3"})
+    assert claim_fingerprint({"Facture": " F1 "}) == claim_fingerprint({"Facture": "F1"})
@@ -0,0 +1,75 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from app.services.compressed import (
+    CORRUPT_ARCHIVE_ERRORS,
+    ArchiveMemberError,
+    DecompressedSizeError,
+    open_decompressed,
+    open_text,
+)
+
+CSV = "Facture;Patient\nF1;P1\nF2;P2\n".encode("utf-8")
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_plain_file_is_returned_as_is():
+    fileobj = io.BytesIO(CSV)
+    stream, compression = open_decompressed(fileobj)
+    assert compression is None and stream is fileobj
+
+
+def test_gzip_and_single_member_zip_are_decompressed():
+    stream, compression = open_text(io.BytesIO(gzip.compress(b"\xef\xbb\xbf" + CSV)))
+    assert compression == "gzip"
+    assert stream.read() == CSV.decode("utf-8")  # BOM trimmed
+    stream, compression = open_text(_zip([("export.csv", CSV), ("__MACOSX/._export.csv", b"x")]))
+    assert compression == "zip"
+    assert stream.read() == CSV.decode("utf-8")
+
+
+@pytest.mark.parametrize("members", [[("a.csv", CSV), ("b.csv", CSV)], [("a.csv", CSV), ("dir/b.csv", CSV)]])
+def test_zip_must_hold_exactly_one_file(members):
+    with pytest.raises(ArchiveMemberError, match="exactly one CSV file"):
+        open_decompressed(_zip(members))
+    # Reported like a corrupt archive (400), not as a server error
+    assert issubclass(ArchiveMemberError, CORRUPT_ARCHIVE_ERRORS)
+
+
+def test_gzip_bomb_stops_at_the_limit():
+    bomb = gzip.compress(b"0" * 5_000_000)
+    stream, _ = open_decompressed(io.BytesIO(bomb), limit=1_000_000)
+    with pytest.raises(DecompressedSizeError):
+        while stream.read(64 * 1024):
+            pass
+
+
+def test_zip_declared_size_over_the_limit_is_refused_up_front():
+    with pytest.raises(DecompressedSizeError):
+        open_decompressed(_zip([("a.csv", b"0" * 2_000_000)]), limit=1_000_000)
+
+
+def test_on_read_sees_the_decompressed_count():
+    seen = []
+    stream, _ = open_decompressed(io.BytesIO(gzip.compress(CSV * 1000)), on_read=seen.append)
+    assert len(stream.read()) == len(CSV) * 1000
+    assert seen[-1] == len(CSV) * 1000
+    assert seen == sorted(seen)
+
+
+def test_truncated_gzip_is_a_corrupt_archive():
+    data = gzip.compress(CSV * 1000)
+    stream, _ = open_decompressed(io.BytesIO(data[: len(data) // 2]))
+    with pytest.raises(CORRUPT_ARCHIVE_ERRORS):
+        stream.read()
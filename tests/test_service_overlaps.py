@@ -0,0 +1,27 @@
+import time
+
+from app.validators import validate_service_overlaps
+
+
+def _rows(intervals, doctor="DrA", day="2025-01-01"):
+    return [
+        {"Doctor Info": doctor, "Date de Service": day, "Début": start, "Fin": end}
+        for start, end in intervals
+    ]
+
+
+def test_lists_overlapping_pairs():
+    errors = validate_service_overlaps(_rows([("08:00", "09:00"), ("08:30", "09:30"), ("09:30", "10:00")]))
+    assert [e["rows"] for e in errors] == ["1, 2"]
+
+
+def test_dense_group_past_the_cap_is_counted_not_walked():
+    n = 20_000
+    rows = _rows([("08:00:00", "20:00:00")] * n)
+    started = time.perf_counter()
+    errors = validate_service_overlaps(rows, max_pairs_per_group=100)
+    elapsed = time.perf_counter() - started
+    assert len(errors) == 101
+    assert errors[-1]["message"].endswith(f"{n * (n - 1) // 2 - 100} more overlapping pair(s) not listed.")
+    # Walking the active set for every interval took tens of seconds at this size
+    assert elapsed < 2.0